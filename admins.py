@@ -1,38 +1,169 @@
 """
-Список администраторов бота.
+Реестр администраторов бота.
 
 Администраторы имеют доступ к админ-панели через команду /admin.
-Для добавления нового админа - добавь его user_id и username в список ADMINS.
+Список хранится в таблице admins базы данных, а в памяти держится
+кэш (frozenset + dict), поэтому проверка is_admin выполняется за O(1).
+
+Управление без перезапуска бота (только для роли owner):
+    /admin add <user_id> [username] [role]
+    /admin remove <user_id>
+    /admin reload
 """
 
-# Список администраторов
-# Формат: (user_id, "username")
-ADMINS = [
-    (991411028, "conqu3st"),
-    (374996796, "DogXe7"),
-    (476915109, "no_username"),  # У этого пользователя нет username
+import logging
+
+import database
+from lifecycle import on_startup
+
+logger = logging.getLogger(__name__)
+
+# Роли администраторов
+ROLE_OWNER = "owner"  # Может добавлять и удалять админов
+ROLE_ADMIN = "admin"  # Доступ к админ-панели и уведомлениям
+ROLES = (ROLE_OWNER, ROLE_ADMIN)
+
+# Начальный список администраторов.
+# Используется только для заполнения пустой таблицы admins при первом запуске.
+# Формат: (user_id, "username", роль)
+DEFAULT_ADMINS = [
+    (991411028, "conqu3st", ROLE_OWNER),
+    (374996796, "DogXe7", ROLE_OWNER),
+    (476915109, "no_username", ROLE_OWNER),  # У этого пользователя нет username
 ]
 
+# Кэш администраторов: заменяется целиком при перезагрузке
+_admin_ids: frozenset = frozenset()
+_admins: dict[int, tuple[str, str]] = {}
+_loaded = False
+
+
+def reload_admins() -> int:
+    """
+    Перечитывает список админов из базы и атомарно заменяет кэш.
+    Если база не ответила, кэш остаётся прежним - админы не теряют доступ.
+
+    Returns:
+        Количество загруженных администраторов, None если прочитать базу не удалось
+    """
+    global _admin_ids, _admins, _loaded
+
+    database.seed_admins(DEFAULT_ADMINS)
+    rows = database.get_admins()
+    if rows is None:
+        logger.warning(f"⚠️ Список админов не перечитан, остаётся прежний ({len(_admins)})")
+        return None
+
+    admins = {user_id: (username, role) for user_id, username, role in rows}
+
+    # Сначала словарь, потом множество - is_admin всегда видит согласованные данные
+    _admins = admins
+    _admin_ids = frozenset(admins)
+    _loaded = True
+
+    logger.info(f"✅ Загружено админов: {len(admins)}")
+    return len(admins)
+
+
+def _ensure_loaded():
+    """Загружает кэш при первом обращении."""
+    if not _loaded:
+        reload_admins()
+
 
 def is_admin(user_id: int) -> bool:
     """
     Проверяет, является ли пользователь администратором.
-    
+
     Args:
         user_id: ID пользователя Telegram
-        
+
     Returns:
         True если пользователь админ, False иначе
     """
-    return any(admin[0] == user_id for admin in ADMINS)
+    _ensure_loaded()
+    return user_id in _admin_ids
+
+
+def is_owner(user_id: int) -> bool:
+    """
+    Проверяет, может ли пользователь управлять списком админов.
+
+    Args:
+        user_id: ID пользователя Telegram
+
+    Returns:
+        True если у пользователя роль owner
+    """
+    _ensure_loaded()
+    admin = _admins.get(user_id)
+    return admin is not None and admin[1] == ROLE_OWNER
+
+
+def get_admins() -> list[tuple[int, str, str]]:
+    """
+    Возвращает всех админов из кэша.
+
+    Returns:
+        Список кортежей (user_id, username, role)
+    """
+    _ensure_loaded()
+    return [(user_id, username, role) for user_id, (username, role) in _admins.items()]
 
 
 def get_admin_usernames() -> list[str]:
     """
     Возвращает список username всех админов.
-    
+
     Returns:
         Список username админов
     """
-    return [admin[1] for admin in ADMINS]
+    _ensure_loaded()
+    return [username for username, _ in _admins.values()]
+
+
+def add_admin(user_id: int, username: str, role: str = ROLE_ADMIN, added_by: int = None) -> bool:
+    """
+    Добавляет администратора в базу и перезагружает кэш.
+
+    Args:
+        user_id: ID пользователя Telegram
+        username: Username пользователя
+        role: Роль (owner или admin)
+        added_by: ID админа, который выполнил действие
+
+    Returns:
+        True если успешно
+    """
+    if role not in ROLES:
+        raise ValueError(f"Неизвестная роль: {role}")
+
+    if not database.add_admin(user_id, username, role, added_by):
+        return False
+
+    reload_admins()
+    return True
+
+
+def remove_admin(user_id: int) -> bool:
+    """
+    Удаляет администратора из базы и перезагружает кэш.
+
+    Args:
+        user_id: ID пользователя Telegram
+
+    Returns:
+        True если админ был удалён
+    """
+    if not database.remove_admin(user_id):
+        return False
+
+    reload_admins()
+    return True
+
 
+@on_startup("admins_cache", after=("db_migrations",))
+def _startup_load_admins(bot):
+    """Загружает кэш админов при запуске."""
+    if reload_admins() is None:
+        raise RuntimeError("Не удалось загрузить админов из базы")
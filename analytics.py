@@ -0,0 +1,179 @@
+"""
+Аналитика для админ-панели: весь дашборд за один проход по заявкам.
+
+Один GROUP BY по основной базе (клиент, менеджер, день, статус) даёт
+строки, из которых в памяти собираются все показатели:
+- заявки по статусам и сумма оплаченных;
+- топ клиентов по числу заявок и доля повторных клиентов;
+- заявки по менеджерам (handled_by);
+- распределение по дням (последние ANALYTICS_DAYS дней) и по месяцам.
+Месяцы из архива берутся из готовой сводной таблицы archived_months,
+архивы не открываются. Клиенты и менеджеры считаются по основной базе.
+
+Результат кэшируется на ANALYTICS_TTL секунд. Каждая новая заявка и смена
+статуса сбрасывают кэш (invalidate()), поэтому повторные нажатия
+«📊 Статистика» без новых заявок не обращаются к базе.
+"""
+
+import asyncio
+import logging
+import sqlite3
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+
+import database
+import metrics
+from config import ANALYTICS_TTL, ANALYTICS_DAYS, ANALYTICS_TOP
+from database import STATUS_PAID
+from validation import parse_amount
+
+logger = logging.getLogger(__name__)
+
+cache_total = metrics.counter("bot_analytics_cache_total", "Запросы дашборда: из кэша (hit) или с расчётом (miss)")
+compute_seconds = metrics.summary("bot_analytics_compute_seconds", "Время расчёта дашборда")
+
+# Кэш дашборда и поколение данных: invalidate() увеличивает поколение,
+# кэш годен, только если посчитан для текущего поколения
+_dashboard: dict = None
+_computed_at = 0.0
+_computed_generation = -1
+_generation = 0
+_lock: asyncio.Lock = None
+
+
+def _amount(text) -> float:
+    """Сумма заявки из текста («1 299,50», «150 ¥») тем же разбором, что при проверке; 0, если не разобрать."""
+    amount = parse_amount(text)
+    return amount if amount is not None else 0.0
+
+
+# ============================================================================
+# РАСЧЁТ
+# ============================================================================
+
+def compute_dashboard(days: int = ANALYTICS_DAYS, top: int = ANALYTICS_TOP) -> dict:
+    """
+    Считает дашборд одним агрегирующим проходом по таблице requests.
+
+    Args:
+        days: За сколько последних дней показывать распределение по дням
+        top: Сколько клиентов в топе
+
+    Returns:
+        dict с показателями (см. ключи в конце функции)
+    """
+    conn = sqlite3.connect(database.DB_NAME)
+    conn.create_function("amount_value", 1, _amount, deterministic=True)
+    try:
+        cursor = conn.cursor()
+
+        # Единственный проход по заявкам
+        groups = cursor.execute("""
+            SELECT user_id, MAX(username), handled_by, substr(created_at, 1, 10), status,
+                   COUNT(*), SUM(amount_value(amount))
+            FROM requests
+            GROUP BY user_id, handled_by, substr(created_at, 1, 10), status
+        """).fetchall()
+
+        # Сводные таблицы: архив по месяцам и пользователи бота
+        archived_months = cursor.execute("SELECT month, requests FROM archived_months").fetchall()
+        total_users, subscribed_users = cursor.execute(
+            "SELECT COUNT(*), COALESCE(SUM(subscribed), 0) FROM users"
+        ).fetchone()
+    finally:
+        conn.close()
+
+    by_status = Counter()
+    by_day = Counter()
+    by_month = Counter()
+    paid_amount = 0.0
+    customers: dict[int, list] = {}          # user_id -> [username, заявок, сумма]
+    managers = defaultdict(Counter)           # handled_by -> статус -> заявок
+
+    for user_id, username, handled_by, day, status, count, amount in groups:
+        by_status[status] += count
+        by_day[day] += count
+        by_month[day[:7]] += count
+        if status == STATUS_PAID:
+            paid_amount += amount or 0.0
+
+        customer = customers.setdefault(user_id, [username, 0, 0.0])
+        customer[1] += count
+        customer[2] += amount or 0.0
+        if username:
+            customer[0] = username
+
+        if handled_by is not None:
+            managers[handled_by][status] += count
+
+    for month, count in archived_months:
+        by_month[month] += count
+
+    today = datetime.now().date()
+    recent_days = [(today - timedelta(days=offset)).isoformat() for offset in range(days - 1, -1, -1)]
+    repeat_customers = sum(1 for _, count, _ in customers.values() if count > 1)
+    top_customers = sorted(customers.items(), key=lambda item: (-item[1][1], -item[1][2]))[:top]
+
+    return {
+        "total_requests": sum(by_status.values()) + sum(count for _, count in archived_months),
+        "archived_requests": sum(count for _, count in archived_months),
+        "by_status": dict(by_status),
+        "paid_amount": paid_amount,
+        "customers": len(customers),
+        "repeat_customers": repeat_customers,
+        "repeat_rate": repeat_customers / len(customers) if customers else 0.0,
+        "top_customers": [(user_id, username, count, amount) for user_id, (username, count, amount) in top_customers],
+        "managers": {handled_by: dict(statuses) for handled_by, statuses in managers.items()},
+        "by_day": [(day, by_day.get(day, 0)) for day in recent_days],
+        "by_month": sorted(by_month.items()),
+        "total_users": total_users,
+        "subscribed_users": subscribed_users,
+        "computed_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+
+# ============================================================================
+# КЭШ
+# ============================================================================
+
+def invalidate():
+    """Сбрасывает кэш: вызывается после сохранения заявки и смены статуса."""
+    global _generation
+    _generation += 1
+
+
+async def get_dashboard(force: bool = False) -> dict:
+    """
+    Дашборд из кэша или (если кэш сброшен или старше ANALYTICS_TTL) с расчётом в потоке.
+    Одновременные нажатия ждут один общий расчёт.
+
+    Args:
+        force: Пересчитать, даже если кэш свежий
+    """
+    global _dashboard, _computed_at, _computed_generation, _lock
+
+    if _lock is None:
+        _lock = asyncio.Lock()
+
+    async with _lock:
+        fresh = (
+            _dashboard is not None
+            and _computed_generation == _generation
+            and time.monotonic() - _computed_at < ANALYTICS_TTL
+        )
+        if fresh and not force:
+            cache_total.inc(result="hit")
+            return _dashboard
+
+        cache_total.inc(result="miss")
+        generation = _generation
+        started = time.perf_counter()
+        dashboard = await asyncio.to_thread(compute_dashboard)
+        elapsed = time.perf_counter() - started
+        compute_seconds.observe(elapsed)
+        logger.info(f"📊 Дашборд посчитан за {elapsed * 1000:.0f} мс")
+
+        # Если заявка пришла во время расчёта, поколение уже новое - кэш сразу устарел
+        _dashboard, _computed_at, _computed_generation = dashboard, time.monotonic(), generation
+        return dashboard
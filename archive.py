@@ -0,0 +1,278 @@
+"""
+Архивирование старых заявок по месяцам.
+
+Закрытые заявки (оплаченные и отменённые) старше ARCHIVE_AFTER_DAYS дней
+переносятся из основной базы в помесячные файлы archive/requests-YYYY-MM.db.
+Основная база остаётся маленькой: индексы, резервные копии и VACUUM
+работают только с актуальными заявками.
+
+Исторические выборки (get_requests_between, выгрузка /admin history)
+подключают нужные архивы через ATTACH на время запроса, поэтому
+вызывающему коду всё равно, где лежит заявка.
+
+Список архивов и число заявок в каждом хранится в таблице archived_months
+основной базы (для статистики не нужно открывать архивы).
+"""
+
+import asyncio
+import logging
+import os
+import sqlite3
+from datetime import datetime, timedelta
+
+import analytics
+import database
+import metrics
+import recent
+from config import ARCHIVE_DIR, ARCHIVE_AFTER_DAYS, ARCHIVE_INTERVAL, ARCHIVE_BATCH
+from database import STATUS_PAID, STATUS_CANCELLED
+from lifecycle import on_startup, on_shutdown
+from tracing import traced
+
+logger = logging.getLogger(__name__)
+
+# Статусы, которые можно архивировать (с заявкой больше не работают)
+CLOSED_STATUSES = (STATUS_PAID, STATUS_CANCELLED)
+
+# Колонки заявки в выборках (как в get_request, плюс курс)
+REQUEST_COLUMNS = (
+    "id", "user_id", "username", "amount", "link", "created_at", "status", "handled_by",
+    "taken_at", "paid_at", "cancelled_at", "rate", "quote_currency",
+)
+
+_task: asyncio.Task = None
+
+archived_total = metrics.counter("bot_archived_requests_total", "Заявки, перенесённые в архив")
+
+
+def archive_path(month: str, archive_dir: str = ARCHIVE_DIR) -> str:
+    """Файл архива месяца: archive/requests-2025-01.db."""
+    return os.path.join(archive_dir, f"requests-{month}.db")
+
+
+def _months_between(date_from: str, date_to: str) -> list[str]:
+    """Месяцы (YYYY-MM) диапазона дат YYYY-MM-DD включительно."""
+    year, month = int(date_from[:4]), int(date_from[5:7])
+    last = (int(date_to[:4]), int(date_to[5:7]))
+    months = []
+    while (year, month) <= last:
+        months.append(f"{year:04d}-{month:02d}")
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+def _ensure_archive_table(cursor):
+    """Создаёт таблицу requests в подключённом архиве arc по схеме основной базы."""
+    columns = list(cursor.execute("PRAGMA main.table_info(requests)"))
+    definitions = ", ".join(
+        f"{name} INTEGER PRIMARY KEY" if name == "id" else f"{name} {col_type}"
+        for _, name, col_type, *_ in columns
+    )
+    cursor.execute(f"CREATE TABLE IF NOT EXISTS arc.requests ({definitions})")
+
+    # Колонки, добавленные в основную базу после создания архива
+    existing = {row[1] for row in cursor.execute("PRAGMA arc.table_info(requests)")}
+    for _, name, col_type, *_ in columns:
+        if name not in existing:
+            cursor.execute(f"ALTER TABLE arc.requests ADD COLUMN {name} {col_type}")
+
+    return [name for _, name, *_ in columns]
+
+
+# ============================================================================
+# ПЕРЕНОС В АРХИВ
+# ============================================================================
+
+@traced()
+def archive_requests(older_than_days: int = ARCHIVE_AFTER_DAYS, archive_dir: str = ARCHIVE_DIR) -> dict:
+    """
+    Переносит закрытые заявки старше older_than_days дней в помесячные архивы.
+
+    Перенос идёт порциями по ARCHIVE_BATCH заявок, каждая порция - в два шага:
+    1. копия заявок в архив, транзакция фиксирует только файл архива;
+    2. удаление из основной базы тех заявок, которые уже есть в архиве,
+       и обновление счётчика archived_months - транзакция только основной базы.
+    Общая транзакция двух файлов в режиме WAL не атомарна при сбое, а так
+    каждый шаг атомарен сам по себе. Сбой между шагами оставляет заявку в обеих
+    базах; следующий запуск перезапишет копию (INSERT OR REPLACE по id) и
+    удалит её из основной. Запись в основную базу блокируется только на
+    время удаления.
+
+    В archived_months.requests прибавляется число реально удалённых из основной
+    базы заявок (они уже лежат в архиве), а не размер порции.
+
+    Returns:
+        dict месяц -> сколько заявок перенесено
+    """
+    cutoff = (datetime.now() - timedelta(days=older_than_days)).strftime("%Y-%m-%d %H:%M:%S")
+    placeholders = ", ".join("?" for _ in CLOSED_STATUSES)
+    where = f"status IN ({placeholders}) AND created_at < ?"
+    params = (*CLOSED_STATUSES, cutoff)
+
+    os.makedirs(archive_dir, exist_ok=True)
+    moved: dict[str, int] = {}
+
+    conn = sqlite3.connect(database.DB_NAME, isolation_level=None)
+    try:
+        cursor = conn.cursor()
+        months = [row[0] for row in cursor.execute(
+            f"SELECT DISTINCT substr(created_at, 1, 7) FROM requests WHERE {where}", params
+        )]
+
+        for month in months:
+            path = archive_path(month, archive_dir)
+            cursor.execute("ATTACH DATABASE ? AS arc", (path,))
+            try:
+                columns = ", ".join(_ensure_archive_table(cursor))
+                month_where = f"{where} AND substr(created_at, 1, 7) = ?"
+
+                while True:
+                    # Шаг 1: копия в архив (изменяется только файл архива)
+                    cursor.execute("BEGIN")
+                    try:
+                        ids = [row[0] for row in cursor.execute(
+                            f"SELECT id FROM main.requests WHERE {month_where} ORDER BY id LIMIT ?",
+                            (*params, month, ARCHIVE_BATCH)
+                        )]
+                        if not ids:
+                            cursor.execute("COMMIT")
+                            break
+
+                        id_list = ", ".join("?" for _ in ids)
+                        cursor.execute(
+                            f"INSERT OR REPLACE INTO arc.requests ({columns}) "
+                            f"SELECT {columns} FROM main.requests WHERE id IN ({id_list})", ids
+                        )
+                        cursor.execute("COMMIT")
+                    except Exception:
+                        cursor.execute("ROLLBACK")
+                        raise
+
+                    # Шаг 2: удаление из основной базы (изменяется только она)
+                    cursor.execute("BEGIN IMMEDIATE")
+                    try:
+                        cursor.execute(
+                            f"DELETE FROM main.requests WHERE id IN ({id_list}) AND {month_where} "
+                            f"AND id IN (SELECT id FROM arc.requests)",
+                            (*ids, *params, month)
+                        )
+                        count = cursor.rowcount
+
+                        updated_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                        cursor.execute("""
+                            INSERT INTO main.archived_months (month, path, requests, updated_at)
+                            VALUES (?, ?, ?, ?)
+                            ON CONFLICT(month) DO UPDATE SET
+                                requests = archived_months.requests + excluded.requests,
+                                updated_at = excluded.updated_at
+                        """, (month, path, count, updated_at))
+                        cursor.execute("COMMIT")
+                    except Exception:
+                        cursor.execute("ROLLBACK")
+                        raise
+
+                    if count:
+                        moved[month] = moved.get(month, 0) + count
+                        archived_total.inc(count)
+            finally:
+                cursor.execute("DETACH DATABASE arc")
+    finally:
+        conn.close()
+
+    if moved:
+        logger.info(f"🗄 В архив перенесено заявок: {sum(moved.values())} ({', '.join(sorted(moved))})")
+    return moved
+
+
+# ============================================================================
+# ИСТОРИЧЕСКИЕ ВЫБОРКИ
+# ============================================================================
+
+@traced()
+def get_archived_months() -> dict[str, tuple[str, int]]:
+    """
+    Список архивов.
+
+    Returns:
+        dict месяц -> (путь к файлу, количество заявок)
+    """
+    conn = sqlite3.connect(database.DB_NAME)
+    try:
+        rows = conn.execute("SELECT month, path, requests FROM archived_months").fetchall()
+    finally:
+        conn.close()
+    return {month: (path, count) for month, path, count in rows}
+
+
+@traced()
+def get_requests_between(date_from: str, date_to: str, limit: int = None) -> list[tuple]:
+    """
+    Заявки за период из основной базы и архивов (подключаются через ATTACH).
+
+    Args:
+        date_from: Начало периода, YYYY-MM-DD (включительно)
+        date_to: Конец периода, YYYY-MM-DD (включительно)
+        limit: Максимальное количество заявок (самые старые первыми)
+
+    Returns:
+        Список кортежей с колонками REQUEST_COLUMNS, по возрастанию id
+    """
+    columns = ", ".join(REQUEST_COLUMNS)
+    where = "created_at >= ? AND created_at < date(?, '+1 day')"
+    params = (date_from, date_to)
+
+    archives = get_archived_months()
+    months = [month for month in _months_between(date_from, date_to) if month in archives]
+
+    conn = sqlite3.connect(database.DB_NAME)
+    try:
+        cursor = conn.cursor()
+        rows = cursor.execute(f"SELECT {columns} FROM main.requests WHERE {where}", params).fetchall()
+
+        # Архивы подключаем по одному: лимит SQLite - 10 подключённых баз
+        for month in months:
+            path = archives[month][0]
+            if not os.path.exists(path):
+                logger.warning(f"⚠️ Файл архива {path} не найден")
+                continue
+            cursor.execute("ATTACH DATABASE ? AS arc", (path,))
+            try:
+                rows += cursor.execute(f"SELECT {columns} FROM arc.requests WHERE {where}", params).fetchall()
+            finally:
+                cursor.execute("DETACH DATABASE arc")
+    finally:
+        conn.close()
+
+    rows.sort(key=lambda row: row[0])
+    return rows[:limit] if limit else rows
+
+
+# ============================================================================
+# ХУКИ ЗАПУСКА И ОСТАНОВКИ
+# ============================================================================
+
+async def _archive_loop():
+    """Архивирование по расписанию (первый запуск - сразу после старта)."""
+    while True:
+        try:
+            if await asyncio.to_thread(archive_requests):
+                # Перенесённые заявки могли быть в буфере последних
+                recent.reload()
+                analytics.invalidate()
+        except Exception as e:
+            logger.error(f"❌ Ошибка архивирования заявок: {e}", exc_info=True)
+        await asyncio.sleep(ARCHIVE_INTERVAL)
+
+
+@on_startup("archive_schedule", after=("db_migrations",), required=False)
+async def _startup_archive(bot):
+    """Запускает архивирование по расписанию (если ARCHIVE_INTERVAL > 0)."""
+    global _task
+    if ARCHIVE_INTERVAL > 0:
+        _task = asyncio.create_task(_archive_loop())
+
+
+@on_shutdown("archive_schedule")
+async def _shutdown_archive(bot):
+    if _task is not None:
+        _task.cancel()
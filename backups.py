@@ -0,0 +1,218 @@
+"""
+Резервные копии базы заявок.
+
+Копия снимается онлайн через SQLite backup API за один шаг. База работает
+в режиме WAL, поэтому копирование - это обычная транзакция чтения: бот
+продолжает писать в базу, а копия получается согласованной на момент начала.
+(Копирование порциями страниц в WAL не годится: любая запись между шагами
+заставляет SQLite начинать копию заново, и при постоянной записи она не
+заканчивается.) Готовый снимок
+сжимается в backups/buff_requests-YYYYmmdd-HHMMSS.db.gz, старые снимки
+сверх BACKUP_KEEP удаляются.
+
+Помесячные архивы заявок (archive.py) копируются в backups/archive/ тем же
+способом - по одной копии на месяц, заново только если файл архива
+изменился после прошлой копии. Архивы копируются после основной базы:
+заявка сначала записывается в архив и только потом удаляется из основной,
+поэтому в паре «снимок + архивы» она не теряется.
+
+Копии снимаются по расписанию (BACKUP_INTERVAL) и по команде /admin backup.
+"""
+
+import asyncio
+import gzip
+import logging
+import os
+import shutil
+import sqlite3
+import time
+from datetime import datetime
+
+import archive
+import database
+import metrics
+from config import BACKUP_DIR, BACKUP_INTERVAL, BACKUP_KEEP
+from lifecycle import on_startup, on_shutdown
+
+logger = logging.getLogger(__name__)
+
+BACKUP_PREFIX = "buff_requests-"
+BACKUP_SUFFIX = ".db.gz"
+ARCHIVE_BACKUP_DIR = "archive"
+
+# Одновременно снимается только одна копия (расписание и команда админа)
+_lock = asyncio.Lock()
+_task: asyncio.Task = None
+
+backups_total = metrics.counter("bot_backups_total", "Резервные копии БД по результату")
+backup_duration = metrics.summary("bot_backup_duration_seconds", "Длительность резервного копирования БД")
+backup_last_success = metrics.gauge(
+    "bot_backup_last_success_timestamp", "Время последней успешной резервной копии (unix)"
+)
+
+
+def _snapshot(source_path: str, path: str) -> tuple[int, int]:
+    """
+    Копирует базу SQLite через backup API и сжимает копию в path (.gz).
+
+    Returns:
+        (размер несжатой копии в байтах, страниц)
+    """
+    raw_path = path[:-len(".gz")] + ".tmp"
+    progress = {"pages": 0}
+
+    def on_progress(status, remaining, total):
+        progress["pages"] = total
+
+    source = sqlite3.connect(source_path)
+    target = sqlite3.connect(raw_path)
+    try:
+        # Один шаг (pages=-1): в WAL он не блокирует запись и не перезапускается
+        source.backup(target, pages=-1, progress=on_progress)
+    finally:
+        target.close()
+        source.close()
+
+    try:
+        db_size = os.path.getsize(raw_path)
+        with open(raw_path, "rb") as src, gzip.open(path + ".part", "wb", compresslevel=6) as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        os.replace(path + ".part", path)
+    finally:
+        for leftover in (raw_path, path + ".part"):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+
+    return db_size, progress["pages"]
+
+
+def _backup_archives(target_dir: str) -> int:
+    """
+    Копирует помесячные архивы, изменившиеся после прошлой копии.
+
+    Returns:
+        Сколько архивов скопировано
+    """
+    archive_dir = os.path.join(target_dir, ARCHIVE_BACKUP_DIR)
+    os.makedirs(archive_dir, exist_ok=True)
+
+    copied = 0
+    for month, (path, _) in sorted(archive.get_archived_months().items()):
+        if not os.path.exists(path):
+            logger.warning(f"⚠️ Файл архива {path} не найден, копия не снята")
+            continue
+        copy_path = os.path.join(archive_dir, os.path.basename(path) + ".gz")
+        if os.path.exists(copy_path) and os.path.getmtime(copy_path) >= os.path.getmtime(path):
+            continue
+        _snapshot(path, copy_path)
+        copied += 1
+    return copied
+
+
+def _backup_to_file(target_dir: str) -> dict:
+    """
+    Снимает копию БД, сжимает её, удаляет лишние старые копии
+    и копирует изменившиеся архивы. Выполняется в отдельном потоке.
+
+    Returns:
+        dict: path, size (байт, сжатый файл), db_size (байт), pages, removed, archives
+    """
+    os.makedirs(target_dir, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    path = os.path.join(target_dir, f"{BACKUP_PREFIX}{stamp}{BACKUP_SUFFIX}")
+
+    db_size, pages = _snapshot(database.DB_NAME, path)
+
+    return {
+        "path": path,
+        "size": os.path.getsize(path),
+        "db_size": db_size,
+        "pages": pages,
+        "removed": rotate_backups(target_dir, BACKUP_KEEP),
+        "archives": _backup_archives(target_dir),
+    }
+
+
+def list_backups(target_dir: str = BACKUP_DIR) -> list[str]:
+    """Пути к копиям, от старых к новым (имя содержит время)."""
+    if not os.path.isdir(target_dir):
+        return []
+    return sorted(
+        os.path.join(target_dir, name)
+        for name in os.listdir(target_dir)
+        if name.startswith(BACKUP_PREFIX) and name.endswith(BACKUP_SUFFIX)
+    )
+
+
+def rotate_backups(target_dir: str, keep: int) -> int:
+    """
+    Удаляет старые копии, оставляя keep последних.
+
+    Returns:
+        Количество удалённых файлов
+    """
+    backups = list_backups(target_dir)
+    old = backups[:-keep] if keep > 0 else []
+    for path in old:
+        os.remove(path)
+    return len(old)
+
+
+async def create_backup(target_dir: str = BACKUP_DIR) -> dict:
+    """
+    Снимает резервную копию БД (в отдельном потоке, не блокируя бота).
+
+    Returns:
+        dict как у _backup_to_file плюс duration (секунды)
+
+    Raises:
+        Exception: если копирование не удалось (ошибка уже записана в лог)
+    """
+    async with _lock:
+        started = time.perf_counter()
+        try:
+            result = await asyncio.to_thread(_backup_to_file, target_dir)
+        except Exception as e:
+            backups_total.inc(result="error")
+            logger.error(f"❌ Резервная копия БД не создана: {e}", exc_info=True)
+            raise
+
+        result["duration"] = time.perf_counter() - started
+        backups_total.inc(result="ok")
+        backup_duration.observe(result["duration"])
+        backup_last_success.set(time.time())
+        logger.info(
+            f"💾 Резервная копия БД: {result['path']} "
+            f"({result['size'] / 1024:.0f} КБ, {result['duration']:.2f} с, удалено старых: {result['removed']}, "
+            f"скопировано архивов: {result['archives']})"
+        )
+        return result
+
+
+async def _backup_loop():
+    """Копии по расписанию."""
+    while True:
+        await asyncio.sleep(BACKUP_INTERVAL)
+        try:
+            await create_backup()
+        except Exception:
+            pass  # Уже записано в лог, попробуем в следующий раз
+
+
+# ============================================================================
+# ХУКИ ЗАПУСКА И ОСТАНОВКИ
+# ============================================================================
+
+@on_startup("backup_schedule", after=("db_migrations",), required=False)
+async def _startup_backups(bot):
+    """Запускает резервное копирование по расписанию (если BACKUP_INTERVAL > 0)."""
+    global _task
+    if BACKUP_INTERVAL > 0:
+        _task = asyncio.create_task(_backup_loop())
+        logger.info(f"✅ Резервные копии БД каждые {BACKUP_INTERVAL:g} с в {BACKUP_DIR}/")
+
+
+@on_shutdown("backup_schedule")
+async def _shutdown_backups(bot):
+    if _task is not None:
+        _task.cancel()
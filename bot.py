@@ -1,65 +1,96 @@
 """
 Основной файл бота BUFF Pay.
 
-Инициализирует бота, регистрирует обработчики и запускает polling.
+Инициализирует бота, выполняет хуки запуска (lifecycle.py),
+регистрирует обработчики и запускает polling.
 """
 
 import asyncio
 import logging
+import time
 from aiogram import Dispatcher, Router, F, Bot, types
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
-from aiogram.fsm.storage.memory import MemoryStorage
-from aiogram.filters import Command
+from aiogram.filters import Command, StateFilter
 
-from config import BOT_TOKEN
-from handlers import start, requests, admin, subscription
+import health
+import metrics
+from config import (
+    BOT_TOKEN, METRICS_HOST, METRICS_PORT, SHUTDOWN_DRAIN_TIMEOUT, FSM_STATE_FILE,
+    UPDATES_MAX_PENDING, check_config,
+)
+from handlers import start, requests, admin, subscription, broadcast
+from lifecycle import (
+    on_startup, on_shutdown, run_startup, run_shutdown, drain,
+    FirstUpdateMiddleware, InFlightMiddleware,
+)
+from middlewares.bot_api import BotApiMiddleware
+from middlewares.scheduler import ChatEventIsolation, UpdateSchedulerMiddleware
+from middlewares.throttling import ThrottlingMiddleware
+from middlewares.user_tracking import UserTrackingMiddleware
+from replay import UpdateRecorderMiddleware
+from storage import PersistentMemoryStorage
+from tracing import (
+    setup_tracing, UpdateTracingMiddleware, HandlerTracingMiddleware, ApiTracingMiddleware,
+)
 
-# Настройка логирования для отладки
+# Настройка логирования для отладки (trace_id - ID трассы апдейта, см. tracing.py)
+setup_tracing()
 logging.basicConfig(
     level=logging.DEBUG,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    format="%(asctime)s - %(name)s - %(levelname)s - [%(trace_id)s] %(message)s"
 )
 logger = logging.getLogger(__name__)
 
-# Проверяем что токен установлен
-if not BOT_TOKEN:
-    logger.error("❌ BOT_TOKEN не установлен!")
-    raise ValueError("BOT_TOKEN не найден в переменных окружения")
+# Сервер метрик (создаётся хуком запуска, если задан METRICS_PORT)
+_metrics_server = None
 
 
-async def main():
-    """
-    Основная функция запуска бота.
-    
-    Инициализирует диспетчер, регистрирует все обработчики
-    и запускает долгий поллинг для получения обновлений.
-    """
-    
-    logger.info("=" * 60)
-    logger.info("🚀 Инициализирую бота...")
-    logger.info("=" * 60)
-    
-    # Создаём экземпляр бота с параметрами
-    bot = Bot(
-        token=BOT_TOKEN,
-        default=DefaultBotProperties(parse_mode=ParseMode.HTML)
-    )
-    
-    # Получаем информацию о боте
+# ============================================================================
+# ХУКИ ЗАПУСКА И ОСТАНОВКИ
+# ============================================================================
+
+@on_startup("config_check")
+def _startup_config_check(bot: Bot):
+    """Проверяет конфигурацию и пишет предупреждения в лог."""
+    for warning in check_config():
+        logger.warning(f"⚠️  {warning}")
+
+
+@on_startup("get_me")
+async def _startup_get_me(bot: Bot):
+    """Проверяет токен и получает информацию о боте."""
     bot_info = await bot.get_me()
     logger.info(f"✅ Бот подключен: @{bot_info.username} (ID: {bot_info.id})")
+
+
+@on_startup("metrics_server", required=False)
+async def _startup_metrics_server(bot: Bot):
+    """Запускает HTTP-сервер метрик, если задан METRICS_PORT."""
+    global _metrics_server
+    if METRICS_PORT:
+        _metrics_server = await metrics.start_server(METRICS_HOST, int(METRICS_PORT))
+
+
+@on_shutdown("metrics_server")
+async def _shutdown_metrics_server(bot: Bot):
+    """Останавливает HTTP-сервер метрик."""
+    if _metrics_server is not None:
+        _metrics_server.close()
+        await _metrics_server.wait_closed()
+
+
+# ============================================================================
+# РЕГИСТРАЦИЯ ОБРАБОТЧИКОВ
+# ============================================================================
+
+def register_handlers(router: Router):
+    """
+    Регистрирует все обработчики сообщений и кнопок в router.
     
-    # Используем MemoryStorage для хранения состояния пользователей
-    storage = MemoryStorage()
-    
-    # Создаём диспетчер (он управляет обработчиками)
-    dp = Dispatcher(storage=storage)
-    
-    # Создаём Router для обработчиков
-    router = Router()
-    
-    logger.info("📝 Регистрирую обработчики...")
+    Args:
+        router: Router, в который добавляются обработчики
+    """
     
     # === СООБЩЕНИЯ (MESSAGE HANDLERS) ===
     
@@ -77,6 +108,20 @@ async def main():
     )
     logger.info("✅ Обработчик /admin зарегистрирован")
     
+    # Команда /broadcast (рассылка для админов)
+    router.message.register(
+        broadcast.broadcast_command,
+        Command("broadcast")
+    )
+    logger.info("✅ Обработчик /broadcast зарегистрирован")
+    
+    # Сообщение для рассылки (до общего обработчика заявок!)
+    router.message.register(
+        broadcast.broadcast_collect_message,
+        StateFilter(broadcast.BroadcastStates.waiting_for_message)
+    )
+    logger.info("✅ Обработчик сообщения рассылки зарегистрирован")
+    
     # Сбор данных заявки
     router.message.register(requests.collect_request_data)
     logger.info("✅ Обработчик сбора данных зарегистрирован")
@@ -125,6 +170,21 @@ async def main():
     )
     logger.info("✅ Обработчик 'Оформить заявку' зарегистрирован")
     
+    # Корзина: несколько товаров одним заказом
+    router.callback_query.register(
+        requests.button_cart,
+        F.data == "cart"
+    )
+    router.callback_query.register(
+        requests.button_cart_confirm,
+        F.data == "cart_confirm"
+    )
+    router.callback_query.register(
+        requests.button_cart_clear,
+        F.data == "cart_clear"
+    )
+    logger.info("✅ Обработчики корзины зарегистрированы")
+    
     # Назад в меню
     router.callback_query.register(
         start.button_back_to_start,
@@ -141,6 +201,20 @@ async def main():
     )
     logger.info("✅ Обработчик 'Статистика' зарегистрирован")
     
+    # Очередь открытых заявок
+    router.callback_query.register(
+        admin.button_admin_open,
+        F.data == "admin_open"
+    )
+    logger.info("✅ Обработчик 'Открытые заявки' зарегистрирован")
+    
+    # Смена статуса заявки (кнопки на уведомлениях)
+    router.callback_query.register(
+        admin.button_request_action,
+        F.data.startswith("req_")
+    )
+    logger.info("✅ Обработчик 'Статус заявки' зарегистрирован")
+    
     # Список заявок
     router.callback_query.register(
         admin.button_admin_requests,
@@ -169,26 +243,163 @@ async def main():
     )
     logger.info("✅ Обработчик 'Назад в админку' зарегистрирован")
     
+    # === РАССЫЛКИ ===
+    
+    # Запуск рассылки (копия / пересылка)
+    router.callback_query.register(
+        broadcast.button_broadcast_start,
+        F.data.startswith("broadcast_start:")
+    )
+    logger.info("✅ Обработчик 'Запуск рассылки' зарегистрирован")
+    
+    # Отмена подготовки рассылки
+    router.callback_query.register(
+        broadcast.button_broadcast_abort,
+        F.data == "broadcast_abort"
+    )
+    logger.info("✅ Обработчик 'Отмена рассылки' зарегистрирован")
+    
+    # Остановка идущей рассылки
+    router.callback_query.register(
+        broadcast.button_broadcast_cancel,
+        F.data.startswith("broadcast_cancel:")
+    )
+    logger.info("✅ Обработчик 'Остановка рассылки' зарегистрирован")
+    
+def create_dispatcher(storage, record: bool = True) -> Dispatcher:
+    """
+    Создаёт диспетчер со всеми middleware и обработчиками.
+    
+    Args:
+        storage: Хранилище состояний FSM
+        record: Записывать апдейты (если задан RECORD_DIR); replay.py передаёт False
+    """
+    
+    # Создаём диспетчер (он управляет обработчиками).
+    # Апдейты одного чата - строго по очереди: FSM читает состояние, когда подошла очередь
+    dp = Dispatcher(storage=storage, events_isolation=ChatEventIsolation())
+    if record:
+        # Запись апдейтов для replay.py - первой, чтобы попадали и отброшенные дальше
+        recorder = UpdateRecorderMiddleware.from_config()
+        if recorder is not None:
+            dp.update.outer_middleware(recorder)
+    dp.update.outer_middleware(FirstUpdateMiddleware())
+    dp.update.outer_middleware(health.LastUpdateMiddleware())
+    dp.update.outer_middleware(UpdateTracingMiddleware())
+    dp.update.outer_middleware(InFlightMiddleware())
+    # Разные чаты - параллельно, но не больше UPDATES_CONCURRENCY обработчиков
+    dp.update.outer_middleware(UpdateSchedulerMiddleware())
+    dp.update.outer_middleware(UserTrackingMiddleware())
+    
+    # Готовность (/health/ready): polling запущен и работает
+    dp.startup.register(health.polling_started)
+    dp.shutdown.register(health.polling_stopped)
+    
+    # Анти-флуд: отбрасываем лишние апдейты до обработчиков
+    throttling = ThrottlingMiddleware()
+    dp.message.outer_middleware(throttling)
+    dp.callback_query.outer_middleware(throttling)
+    
+    # Спан вокруг каждого обработчика
+    dp.message.middleware(HandlerTracingMiddleware())
+    dp.callback_query.middleware(HandlerTracingMiddleware())
+    
+    # Создаём Router для обработчиков
+    router = Router()
+    
+    logger.info("📝 Регистрирую обработчики...")
+    started = time.perf_counter()
+    register_handlers(router)
+    
     # Включаем router в диспетчер
     dp.include_router(router)
-    logger.info("✅ Все обработчики зарегистрированы успешно!\n")
+    logger.info(
+        f"✅ Все обработчики зарегистрированы успешно "
+        f"({(time.perf_counter() - started) * 1000:.1f} мс)\n"
+    )
+    return dp
+
+
+async def main():
+    """
+    Основная функция запуска бота.
+    
+    Выполняет хуки запуска (параллельно), регистрирует обработчики
+    и запускает долгий поллинг для получения обновлений.
+    """
     
-    print("\n" + "="*60)
-    print("💎 BUFF Pay Bot АКТИВЕН И ГОТОВ!")
-    print("="*60)
-    print("\n📱 Отправь /start боту в Telegram\n")
+    # Проверяем что токен установлен
+    if not BOT_TOKEN:
+        logger.error("❌ BOT_TOKEN не установлен!")
+        raise ValueError("BOT_TOKEN не найден в переменных окружения")
+    
+    logger.info("=" * 60)
+    logger.info("🚀 Инициализирую бота...")
+    logger.info("=" * 60)
+    
+    # Создаём экземпляр бота с параметрами
+    bot = Bot(
+        token=BOT_TOKEN,
+        default=DefaultBotProperties(parse_mode=ParseMode.HTML)
+    )
+    
+    # Спан на каждый запрос к Bot API (снаружи - чтобы включать повторы),
+    # затем повторы, RetryAfter и выключатели
+    bot.session.middleware(ApiTracingMiddleware())
+    bot.session.middleware(BotApiMiddleware())
+    
+    # Храним состояния в памяти, но сохраняем их в файл при остановке
+    storage = PersistentMemoryStorage(FSM_STATE_FILE)
+    storage.load()
+    
+    dp = create_dispatcher(storage)
     
     try:
-        # Запускаем поллинг
+        # Хуки запуска: миграции БД, прогрев, get_me, кэши, метрики
+        await run_startup(bot)
+        
+        # Фоновая очистка брошенных диалогов FSM
+        storage.start_sweeper(bot)
+        
+        print("\n" + "="*60)
+        print("💎 BUFF Pay Bot АКТИВЕН И ГОТОВ!")
+        print("="*60)
+        print("\n📱 Отправь /start боту в Telegram\n")
+        
+        # Запускаем поллинг.
+        # SIGINT/SIGTERM останавливают только получение апдейтов,
+        # сессию закрываем сами - после drain.
         logger.info("🔄 Начинаю polling...")
         await dp.start_polling(
             bot,
-            allowed_updates=dp.resolve_used_update_types()
+            allowed_updates=dp.resolve_used_update_types(),
+            handle_signals=True,
+            close_bot_session=False,
+            tasks_concurrency_limit=UPDATES_MAX_PENDING
         )
     except Exception as e:
-        logger.error(f"❌ Ошибка при polling: {e}", exc_info=True)
+        logger.error(f"❌ Ошибка при запуске или polling: {e}", exc_info=True)
     finally:
-        logger.info("❌ Бот остановлен")
+        logger.info("🛑 Останавливаю бота...")
+        
+        # 1. Ждём обработчики, которые уже начали работу
+        report = await drain(SHUTDOWN_DRAIN_TIMEOUT)
+        
+        # 2. Хуки остановки: сброс очередей, закрытие серверов
+        await run_shutdown(bot)
+        
+        # 3. Сохраняем незавершённые диалоги
+        storage.stop_sweeper()
+        try:
+            saved = storage.dump()
+        except Exception as e:
+            logger.error(f"❌ Не удалось сохранить состояния FSM: {e}", exc_info=True)
+            saved = 0
+        
+        logger.info(
+            f"❌ Бот остановлен: завершено обработчиков {report['drained']}, "
+            f"прервано {len(report['abandoned'])}, сохранено состояний FSM {saved}"
+        )
         await bot.session.close()
 
 
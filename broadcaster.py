@@ -0,0 +1,308 @@
+"""
+Движок рассылок для админов.
+
+Рассылка выполняется фоновой задачей:
+- пользователи читаются порциями по возрастанию ID (курсор хранится в БД),
+- общий ограничитель скорости держит темп ниже лимитов Telegram,
+- параллельных отправок не больше BROADCAST_CONCURRENCY,
+- на RetryAfter вся рассылка ждёт указанное Telegram время,
+- заблокировавшие бота пользователи удаляются из таблицы users,
+- прогресс сохраняется после каждой порции, поэтому после рестарта
+  рассылка продолжается с того же места (повторно может уйти не больше одной порции).
+
+Админ видит прогресс в одном сообщении, которое периодически редактируется.
+"""
+
+import asyncio
+import contextvars
+import logging
+import time
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter, TelegramForbiddenError, TelegramBadRequest
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+
+import database
+import metrics
+from config import BROADCAST_RATE, BROADCAST_CONCURRENCY, BROADCAST_BATCH_SIZE
+from lifecycle import on_startup, on_shutdown
+from users import forget_users
+
+logger = logging.getLogger(__name__)
+
+# Режимы рассылки
+MODE_COPY = "copy"        # Копия сообщения (без «Переслано от»)
+MODE_FORWARD = "forward"  # Пересылка
+
+# Как часто обновлять сообщение с прогрессом (секунды)
+PROGRESS_EDIT_INTERVAL = 3
+
+# Сколько раз повторять отправку одному пользователю после RetryAfter
+MAX_RETRIES = 3
+
+# Запущенные рассылки: broadcast_id -> (состояние, задача)
+_jobs: dict[int, tuple] = {}
+
+broadcast_messages_total = metrics.counter(
+    "bot_broadcast_messages_total", "Сообщения рассылок по результату"
+)
+
+
+class RateLimiter:
+    """
+    Общий ограничитель скорости: не больше rate отправок в секунду.
+    Умеет ставить все отправки на паузу (после RetryAfter).
+    """
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate
+        self._next_slot = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        """Ждёт свой слот на отправку."""
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def pause(self, seconds: float):
+        """Сдвигает все следующие слоты на seconds секунд вперёд."""
+        self._next_slot = max(self._next_slot, time.monotonic() + seconds)
+
+
+# Один ограничитель на все рассылки процесса
+_limiter = RateLimiter(BROADCAST_RATE)
+
+
+class BroadcastJob:
+    """Состояние одной выполняющейся рассылки."""
+
+    def __init__(self, bot: Bot, row):
+        (self.id, self.admin_id, self.source_chat_id, self.source_message_id, self.mode,
+         self.status, self.total, self.last_user_id, self.sent, self.failed, self.blocked,
+         self.status_chat_id, self.status_message_id) = row
+        self.bot = bot
+        self._blocked_ids: list[int] = []
+        self._last_edit = 0.0
+
+    async def _send_one(self, user_id: int) -> str:
+        """
+        Отправляет сообщение одному пользователю.
+
+        Returns:
+            sent, blocked или failed
+        """
+        for _ in range(MAX_RETRIES + 1):
+            await _limiter.wait()
+            try:
+                if self.mode == MODE_FORWARD:
+                    await self.bot.forward_message(user_id, self.source_chat_id, self.source_message_id)
+                else:
+                    await self.bot.copy_message(user_id, self.source_chat_id, self.source_message_id)
+                return "sent"
+            except TelegramRetryAfter as e:
+                logger.warning(f"⏳ Рассылка #{self.id}: RetryAfter {e.retry_after} с")
+                _limiter.pause(e.retry_after)
+            except TelegramForbiddenError:
+                return "blocked"
+            except TelegramBadRequest as e:
+                # chat not found / user is deactivated - тоже больше не пишем
+                if "chat not found" in str(e).lower() or "deactivated" in str(e).lower():
+                    return "blocked"
+                logger.debug(f"Рассылка #{self.id}: ошибка для {user_id}: {e}")
+                return "failed"
+            except Exception as e:
+                logger.debug(f"Рассылка #{self.id}: ошибка для {user_id}: {e}")
+                return "failed"
+        return "failed"
+
+    async def _send_batch(self, user_ids: list[int]):
+        """
+        Отправляет порцию с ограничением параллельности.
+
+        Курсор (last_user_id) и счётчики двигаются вместе и только по
+        непрерывному началу порции: если рассылку остановят посреди порции,
+        сохранится согласованный прогресс, и после продолжения уже учтённые
+        пользователи не будут посчитаны второй раз.
+        """
+        semaphore = asyncio.Semaphore(BROADCAST_CONCURRENCY)
+        results: dict[int, str] = {}
+        position = 0
+
+        def advance():
+            nonlocal position
+            while position < len(user_ids) and user_ids[position] in results:
+                user_id = user_ids[position]
+                result = results.pop(user_id)
+                if result == "sent":
+                    self.sent += 1
+                elif result == "blocked":
+                    self.blocked += 1
+                    self._blocked_ids.append(user_id)
+                else:
+                    self.failed += 1
+                self.last_user_id = user_id
+                position += 1
+
+        async def send(user_id: int):
+            async with semaphore:
+                result = await self._send_one(user_id)
+            broadcast_messages_total.inc(result=result)
+            results[user_id] = result
+            advance()
+
+        await asyncio.gather(*(send(user_id) for user_id in user_ids))
+
+    def progress_text(self) -> str:
+        """Текст сообщения с прогрессом."""
+        processed = self.sent + self.failed + self.blocked
+        titles = {
+            "running": "📣 <b>Рассылка идёт</b>",
+            "done": "✅ <b>Рассылка завершена</b>",
+            "cancelled": "⏹ <b>Рассылка остановлена</b>",
+        }
+        return f"""{titles.get(self.status, titles["running"])} #{self.id}
+
+📬 Обработано: {processed} из ~{self.total}
+✅ Доставлено: {self.sent}
+🚫 Заблокировали бота: {self.blocked}
+❌ Ошибок: {self.failed}"""
+
+    async def update_status_message(self, force: bool = False):
+        """Редактирует сообщение с прогрессом (не чаще PROGRESS_EDIT_INTERVAL)."""
+        if not self.status_message_id:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_edit < PROGRESS_EDIT_INTERVAL:
+            return
+        self._last_edit = now
+
+        markup = None
+        if self.status == "running":
+            keyboard = InlineKeyboardBuilder()
+            keyboard.button(text="⏹ Остановить", callback_data=f"broadcast_cancel:{self.id}")
+            markup = keyboard.as_markup()
+
+        try:
+            await self.bot.edit_message_text(
+                text=self.progress_text(),
+                chat_id=self.status_chat_id,
+                message_id=self.status_message_id,
+                reply_markup=markup,
+            )
+        except Exception as e:
+            # «message is not modified» и подобное - не критично
+            logger.debug(f"Не удалось обновить прогресс рассылки #{self.id}: {e}")
+
+    async def _save_progress(self):
+        """Сохраняет курсор и счётчики, удаляет заблокировавших пользователей."""
+        blocked_ids, self._blocked_ids = self._blocked_ids, []
+        await asyncio.to_thread(
+            database.update_broadcast_progress,
+            self.id, self.last_user_id, self.sent, self.failed, self.blocked,
+        )
+        if blocked_ids:
+            await asyncio.to_thread(database.delete_users, blocked_ids)
+            forget_users(blocked_ids)
+
+    async def run(self):
+        """Основной цикл рассылки."""
+        logger.info(f"📣 Рассылка #{self.id} запущена (с пользователя > {self.last_user_id})")
+        await self.update_status_message(force=True)
+
+        try:
+            while True:
+                user_ids = await asyncio.to_thread(
+                    database.get_user_ids_after, self.last_user_id, BROADCAST_BATCH_SIZE
+                )
+                if not user_ids:
+                    break
+
+                await self._send_batch(user_ids)
+                await self._save_progress()
+                await self.update_status_message()
+
+            self.status = "done"
+            await asyncio.to_thread(database.finish_broadcast, self.id, self.status)
+            logger.info(
+                f"✅ Рассылка #{self.id} завершена: доставлено {self.sent}, "
+                f"заблокировали {self.blocked}, ошибок {self.failed}"
+            )
+        except asyncio.CancelledError:
+            # Остановка бота или отмена админом: курсор и счётчики - по завершённому началу порции
+            await self._save_progress()
+            raise
+        finally:
+            await self.update_status_message(force=True)
+
+
+def start_broadcast(bot: Bot, broadcast_id: int) -> bool:
+    """
+    Запускает (или продолжает) рассылку фоновой задачей.
+
+    Args:
+        bot: Экземпляр бота
+        broadcast_id: ID рассылки в БД
+
+    Returns:
+        True если задача запущена
+    """
+    if broadcast_id in _jobs:
+        return False
+
+    row = database.get_broadcast(broadcast_id)
+    if row is None or row[5] != "running":
+        return False
+
+    job = BroadcastJob(bot, row)
+    # Задача живёт дольше обработчика админа: запускаем её в чистом контексте,
+    # иначе она унаследует его спан (tracing) и trace_id в логах
+    task = contextvars.Context().run(asyncio.create_task, job.run())
+    _jobs[broadcast_id] = (job, task)
+    task.add_done_callback(lambda _: _jobs.pop(broadcast_id, None))
+    return True
+
+
+async def cancel_broadcast(broadcast_id: int) -> bool:
+    """
+    Останавливает рассылку по запросу админа.
+
+    Returns:
+        True если рассылка шла и остановлена (завершённую не трогаем)
+    """
+    changed = await asyncio.to_thread(database.finish_broadcast, broadcast_id, "cancelled")
+    if not changed:
+        return False
+
+    running = _jobs.get(broadcast_id)
+    if running is not None:
+        job, task = running
+        job.status = "cancelled"
+        task.cancel()
+    return True
+
+
+# ============================================================================
+# ХУКИ ЗАПУСКА И ОСТАНОВКИ
+# ============================================================================
+
+@on_startup("broadcast_resume", after=("db_migrations", "get_me"), required=False)
+async def _startup_resume(bot: Bot):
+    """Продолжает рассылки, прерванные рестартом."""
+    for row in await asyncio.to_thread(database.get_running_broadcasts):
+        if start_broadcast(bot, row[0]):
+            logger.info(f"♻️ Рассылка #{row[0]} продолжена после рестарта")
+
+
+@on_shutdown("broadcast_stop")
+async def _shutdown_stop(bot: Bot):
+    """Останавливает рассылки; статус остаётся running, после рестарта они продолжатся."""
+    tasks = [task for _, task in _jobs.values()]
+    for task in tasks:
+        task.cancel()
+    if tasks:
+        await asyncio.gather(*tasks, return_exceptions=True)
+        logger.info(f"⏸ Рассылок поставлено на паузу до рестарта: {len(tasks)}")
@@ -2,12 +2,17 @@
 Конфигурация бота BUFF Pay.
 
 Загружает токен бота из переменных окружения.
-MANAGER_ID - опциональный параметр для отправки уведомлений.
+Менеджер, канал подписки и SUBSCRIPTION_CACHE_TTL здесь не читаются:
+они перечитываются без перезапуска, см. settings.py.
 """
 
 import os
 from dotenv import load_dotenv
 
+# Переменные окружения процесса до чтения .env: они важнее файла
+# (см. settings.py - перечитывание .env без перезапуска)
+PROCESS_ENV = dict(os.environ)
+
 # Загружаем переменные из .env файла (если он есть)
 load_dotenv()
 
@@ -15,19 +20,151 @@ load_dotenv()
 # Установлен через переменную окружения перед импортом
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 
-# ID менеджера для получения уведомлений (опционально)
-MANAGER_ID = os.getenv("MANAGER_ID")
+# Порт HTTP-сервера метрик (пусто - сервер не запускается)
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = os.getenv("METRICS_PORT")
+
+# Сколько секунд при остановке ждать уже начатые обработчики
+SHUTDOWN_DRAIN_TIMEOUT = float(os.getenv("SHUTDOWN_DRAIN_TIMEOUT", "10"))
+
+# Файл, куда при остановке сохраняются незавершённые диалоги (FSM)
+FSM_STATE_FILE = os.getenv("FSM_STATE_FILE", "fsm_state.json")
+
+# Анти-флуд: скорость пополнения (токенов в секунду) и размер «ведра» на пользователя
+THROTTLE_MESSAGE_RATE = float(os.getenv("THROTTLE_MESSAGE_RATE", "1"))
+THROTTLE_MESSAGE_BURST = float(os.getenv("THROTTLE_MESSAGE_BURST", "5"))
+THROTTLE_CALLBACK_RATE = float(os.getenv("THROTTLE_CALLBACK_RATE", "2"))
+THROTTLE_CALLBACK_BURST = float(os.getenv("THROTTLE_CALLBACK_BURST", "8"))
+THROTTLE_REQUEST_RATE = float(os.getenv("THROTTLE_REQUEST_RATE", "0.2"))
+THROTTLE_REQUEST_BURST = float(os.getenv("THROTTLE_REQUEST_BURST", "4"))
+
+# Как часто (в секундах) сбрасывать накопленные last_seen пользователей в БД
+USERS_FLUSH_INTERVAL = float(os.getenv("USERS_FLUSH_INTERVAL", "30"))
+
+# Рассылки: сообщений в секунду (лимит Telegram ~30), параллельных отправок, размер порции
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", "25"))
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", "5"))
+BROADCAST_BATCH_SIZE = int(os.getenv("BROADCAST_BATCH_SIZE", "50"))
+
+# Курсы юаня для предварительного расчёта: none (по умолчанию), file или cbr
+# (cbr - запросы к cbr-xml-daily.ru, включается только явно)
+RATES_PROVIDER = os.getenv("RATES_PROVIDER", "none").lower()
+# JSON-файл с курсами для RATES_PROVIDER=file: {"RUB": 12.9, "KZT": 68.4}
+RATES_FILE = os.getenv("RATES_FILE", "rates.json")
+# Как часто (в секундах) обновлять курсы в фоне
+RATES_REFRESH_INTERVAL = float(os.getenv("RATES_REFRESH_INTERVAL", "3600"))
+# Курсы старше этого (в секундах) не показываются клиенту; 0 - без ограничения
+RATES_MAX_AGE = float(os.getenv("RATES_MAX_AGE", "86400"))
+# Валюта расчёта, если по языку клиента её определить не удалось
+QUOTE_CURRENCY = os.getenv("QUOTE_CURRENCY", "RUB").upper()
+
+
+# Папка с текстами бота (locales/<язык>.json) и язык по умолчанию
+LOCALES_DIR = os.getenv("LOCALES_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "locales"))
+DEFAULT_LOCALE = os.getenv("DEFAULT_LOCALE", "ru").lower()
+
+# Запросы к Bot API: число попыток, задержки повтора (секунды),
+# максимальный RetryAfter, который ждём внутри запроса
+API_RETRY_ATTEMPTS = int(os.getenv("API_RETRY_ATTEMPTS", "3"))
+API_RETRY_BASE_DELAY = float(os.getenv("API_RETRY_BASE_DELAY", "0.5"))
+API_RETRY_MAX_DELAY = float(os.getenv("API_RETRY_MAX_DELAY", "5"))
+API_RETRY_AFTER_MAX = float(os.getenv("API_RETRY_AFTER_MAX", "10"))
+# Выключатель getChatMember: сбоев подряд до размыкания и сколько секунд он разомкнут
+API_BREAKER_FAILURES = int(os.getenv("API_BREAKER_FAILURES", "5"))
+API_BREAKER_RESET = float(os.getenv("API_BREAKER_RESET", "30"))
+
+# Обработка апдейтов: сколько обработчиков работает одновременно (апдейты одного
+# чата всё равно идут по очереди) и сколько апдейтов может ждать в памяти
+UPDATES_CONCURRENCY = int(os.getenv("UPDATES_CONCURRENCY", "32"))
+UPDATES_MAX_PENDING = int(os.getenv("UPDATES_MAX_PENDING", "1000"))
+
+# Брошенные диалоги FSM: срок жизни (секунды, 0 - бессрочно), отдельно для заявок,
+# как часто проверять и напоминать ли пользователю о сброшенном черновике заявки
+FSM_TTL = float(os.getenv("FSM_TTL", "86400"))
+FSM_REQUEST_TTL = float(os.getenv("FSM_REQUEST_TTL", "3600"))
+FSM_SWEEP_INTERVAL = float(os.getenv("FSM_SWEEP_INTERVAL", "300"))
+FSM_EXPIRED_NUDGE = os.getenv("FSM_EXPIRED_NUDGE", "1").lower() in ("1", "true", "yes")
+
+# Трассировка: файл для спанов (пусто - не писать), доля записываемых апдейтов,
+# размер файла до ротации и сколько старых файлов хранить
+TRACE_FILE = os.getenv("TRACE_FILE", "")
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.1"))
+TRACE_FILE_MAX_BYTES = int(os.getenv("TRACE_FILE_MAX_BYTES", str(10 * 1024 * 1024)))
+TRACE_FILE_BACKUPS = int(os.getenv("TRACE_FILE_BACKUPS", "3"))
+
+# Резервные копии БД: папка, интервал (секунды, 0 - только по команде /admin backup)
+# и сколько копий хранить
+BACKUP_DIR = os.getenv("BACKUP_DIR", "backups")
+BACKUP_INTERVAL = float(os.getenv("BACKUP_INTERVAL", "21600"))
+BACKUP_KEEP = int(os.getenv("BACKUP_KEEP", "14"))
+
+# Архив заявок: папка помесячных файлов, через сколько дней закрытые заявки
+# переносятся в архив, как часто проверять (секунды, 0 - не архивировать) и размер порции
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "90"))
+ARCHIVE_INTERVAL = float(os.getenv("ARCHIVE_INTERVAL", "86400"))
+ARCHIVE_BATCH = int(os.getenv("ARCHIVE_BATCH", "500"))
+
+# Сколько последних заявок держать в памяти для списка в админке
+RECENT_REQUESTS_SIZE = int(os.getenv("RECENT_REQUESTS_SIZE", "50"))
+
+# Окно (секунды), в котором такая же заявка (пользователь, ссылка, сумма) считается повтором
+IDEMPOTENCY_WINDOW = float(os.getenv("IDEMPOTENCY_WINDOW", "600"))
+
+# Допустимая сумма заявки в юанях
+AMOUNT_MIN = float(os.getenv("AMOUNT_MIN", "1"))
+AMOUNT_MAX = float(os.getenv("AMOUNT_MAX", "100000"))
+
+# Сколько товаров можно добавить в корзину (один заказ)
+CART_MAX_ITEMS = int(os.getenv("CART_MAX_ITEMS", "20"))
+
+# Запись апдейтов для replay.py: папка (пусто - не записывать), апдейтов в одном
+# сжатом сегменте и соль псевдонимов ID (пусто - случайная при каждом запуске)
+RECORD_DIR = os.getenv("RECORD_DIR", "")
+RECORD_SEGMENT_UPDATES = int(os.getenv("RECORD_SEGMENT_UPDATES", "10000"))
+RECORD_SALT = os.getenv("RECORD_SALT", "")
+
+# Проверки /health (на сервере метрик): период замера задержки цикла событий (секунды,
+# 0 - не замерять), допустимая задержка и сколько можно жить без апдейтов (0 - не проверять)
+HEALTH_LAG_INTERVAL = float(os.getenv("HEALTH_LAG_INTERVAL", "0.25"))
+HEALTH_MAX_LAG = float(os.getenv("HEALTH_MAX_LAG", "1.0"))
+HEALTH_MAX_UPDATE_AGE = float(os.getenv("HEALTH_MAX_UPDATE_AGE", "0"))
+
+# Диагностика блокировок цикла событий (замедляет бота!): включить (1/0), порог (секунды)
+# и файл отчёта, который пишется при остановке (пусто - только /admin blocking)
+BLOCKING_DETECTOR = os.getenv("BLOCKING_DETECTOR", "0").lower() in ("1", "true", "yes")
+BLOCKING_THRESHOLD = float(os.getenv("BLOCKING_THRESHOLD", "0.1"))
+BLOCKING_REPORT_FILE = os.getenv("BLOCKING_REPORT_FILE", "")
+
+# Файл с перезагружаемыми настройками (менеджер, канал) и как часто (секунды) проверять,
+# изменился ли он (0 - только по SIGHUP и /admin settings)
+SETTINGS_FILE = os.getenv("SETTINGS_FILE", ".env")
+SETTINGS_RELOAD_INTERVAL = float(os.getenv("SETTINGS_RELOAD_INTERVAL", "5"))
 
-# Username менеджера для отправки пользователю (опционально)
-MANAGER_USERNAME = os.getenv("MANAGER_USERNAME", "BuffinItMNG")
+# Аналитика в админке: сколько секунд хранить посчитанный дашборд (новые заявки
+# сбрасывают кэш сразу), за сколько дней показывать заявки по дням, размер топа клиентов
+ANALYTICS_TTL = float(os.getenv("ANALYTICS_TTL", "300"))
+ANALYTICS_DAYS = int(os.getenv("ANALYTICS_DAYS", "14"))
+ANALYTICS_TOP = int(os.getenv("ANALYTICS_TOP", "5"))
 
-# Канал для обязательной подписки
-# Формат: @BuffinIt (без https://t.me/)
-REQUIRED_CHANNEL = os.getenv("REQUIRED_CHANNEL", "@BuffinIt")
-# ID канала (можно получить через бота или API)
-# Для публичных каналов формат: @username
-REQUIRED_CHANNEL_ID = os.getenv("REQUIRED_CHANNEL_ID", "@BuffinIt")
+# Сколько пользователей помнить в кэше подписок (давно не заходившие вытесняются)
+SUBSCRIPTION_CACHE_SIZE = int(os.getenv("SUBSCRIPTION_CACHE_SIZE", "10000"))
 
-# Если MANAGER_ID не установлен, работаем без отправки менеджеру
-if not MANAGER_ID:
-    print("⚠️  MANAGER_ID не установлен. Уведомления менеджеру не будут отправляться.")
+def check_config() -> list[str]:
+    """
+    Проверяет конфигурацию и возвращает список предупреждений.
+    Вызывается при запуске бота, а не при импорте модуля.
+    
+    Returns:
+        Список текстов предупреждений (пустой если всё в порядке)
+    """
+    # settings импортирует config, поэтому импорт - здесь
+    import settings
+    
+    warnings = []
+    
+    # Если MANAGER_ID не установлен, работаем без отправки менеджеру
+    if settings.current().manager_id is None:
+        warnings.append("MANAGER_ID не установлен. Уведомления менеджеру не будут отправляться.")
+    
+    return warnings
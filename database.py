@@ -2,27 +2,70 @@
 Модуль для работы с базой данных заявок.
 
 Создает таблицу если её нет, сохраняет и получает заявки.
+Схема создаётся хуком запуска (см. lifecycle.py), а не при импорте.
 """
 
 import sqlite3
 import logging
 from datetime import datetime
 
+from lifecycle import on_startup
+from tracing import traced
+
 logger = logging.getLogger(__name__)
 
 # Имя файла базы данных
 DB_NAME = "buff_requests.db"
 
+# Статусы заявок
+STATUS_OPEN = "open"                # Новая, никто не взял
+STATUS_IN_PROGRESS = "in_progress"  # Менеджер/админ занимается
+STATUS_PAID = "paid"                # Оплачена
+STATUS_CANCELLED = "cancelled"      # Отменена
+
+# Заявки, с которыми ещё нужно работать (очередь менеджера)
+OPEN_STATUSES = (STATUS_OPEN, STATUS_IN_PROGRESS)
+
+# Действия над заявкой: действие -> (новый статус, из каких статусов можно, колонка времени)
+REQUEST_ACTIONS = {
+    "take": (STATUS_IN_PROGRESS, (STATUS_OPEN,), "taken_at"),
+    "paid": (STATUS_PAID, OPEN_STATUSES, "paid_at"),
+    "cancel": (STATUS_CANCELLED, OPEN_STATUSES, "cancelled_at"),
+}
+
+
+class DuplicateRequestError(Exception):
+    """Заявка (или заказ) с таким ключом идемпотентности уже сохранена."""
+
+    def __init__(self, request_id: int):
+        super().__init__(f"Заявка уже сохранена: #{request_id}")
+        self.request_id = request_id
+
+
+def _add_column_if_missing(cursor, table: str, column: str, definition: str):
+    """Добавляет колонку в существующую таблицу (простая миграция)."""
+    columns = {row[1] for row in cursor.execute(f"PRAGMA table_info({table})")}
+    if column not in columns:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        logger.info(f"🔧 Миграция: добавлена колонка {table}.{column}")
+
 
 def init_database():
     """
     Инициализирует базу данных.
     Создает таблицу requests если её нет.
+    
+    Raises:
+        Exception: схему создать не удалось (ошибка уже записана в лог) -
+            обязательный хук db_migrations прерывает запуск бота
     """
     try:
         conn = sqlite3.connect(DB_NAME)
         cursor = conn.cursor()
         
+        # WAL: читатели не блокируют запись (и наоборот)
+        cursor.execute("PRAGMA journal_mode=WAL")
+        
         # Создаем таблицу если её нет
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS requests (
@@ -35,6 +78,104 @@ def init_database():
             )
         """)
         
+        # Статус заявки и кто/когда её обработал
+        _add_column_if_missing(cursor, "requests", "status", "TEXT NOT NULL DEFAULT 'open'")
+        _add_column_if_missing(cursor, "requests", "handled_by", "INTEGER")
+        _add_column_if_missing(cursor, "requests", "taken_at", "TEXT")
+        _add_column_if_missing(cursor, "requests", "paid_at", "TEXT")
+        _add_column_if_missing(cursor, "requests", "cancelled_at", "TEXT")
+        
+        # Курс юаня, по которому клиенту показали расчёт
+        _add_column_if_missing(cursor, "requests", "rate", "REAL")
+        _add_column_if_missing(cursor, "requests", "quote_currency", "TEXT")
+        
+        # Ключ идемпотентности (см. idempotency.py): повтор заявки не создаёт вторую строку
+        _add_column_if_missing(cursor, "requests", "idempotency_key", "TEXT")
+        cursor.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_requests_idempotency
+            ON requests (idempotency_key)
+            WHERE idempotency_key IS NOT NULL
+        """)
+        
+        # Заказ из нескольких товаров (корзина): у каждой заявки заказа общий order_id
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS orders (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                username TEXT,
+                items INTEGER NOT NULL,
+                created_at TEXT NOT NULL,
+                idempotency_key TEXT UNIQUE
+            )
+        """)
+        _add_column_if_missing(cursor, "requests", "order_id", "INTEGER")
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_requests_order
+            ON requests (order_id)
+            WHERE order_id IS NOT NULL
+        """)
+        
+        # Частичный индекс только по открытым заявкам: очередь менеджера
+        # остаётся быстрой, сколько бы закрытых заявок ни накопилось
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_requests_open
+            ON requests (id)
+            WHERE status IN ('open', 'in_progress')
+        """)
+        
+        # Таблица администраторов (роль: owner или admin)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS admins (
+                user_id INTEGER PRIMARY KEY,
+                username TEXT,
+                role TEXT NOT NULL DEFAULT 'admin',
+                added_by INTEGER,
+                added_at TEXT NOT NULL
+            )
+        """)
+        
+        # Все пользователи бота (subscribed: 1/0, NULL - ещё не проверяли)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS users (
+                user_id INTEGER PRIMARY KEY,
+                username TEXT,
+                first_seen TEXT NOT NULL,
+                last_seen TEXT NOT NULL,
+                subscribed INTEGER
+            )
+        """)
+        
+        # Рассылки админов. last_user_id - курсор, с которого продолжать после рестарта
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS broadcasts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                admin_id INTEGER NOT NULL,
+                source_chat_id INTEGER NOT NULL,
+                source_message_id INTEGER NOT NULL,
+                mode TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'running',
+                total INTEGER NOT NULL DEFAULT 0,
+                last_user_id INTEGER NOT NULL DEFAULT 0,
+                sent INTEGER NOT NULL DEFAULT 0,
+                failed INTEGER NOT NULL DEFAULT 0,
+                blocked INTEGER NOT NULL DEFAULT 0,
+                status_chat_id INTEGER,
+                status_message_id INTEGER,
+                created_at TEXT NOT NULL,
+                finished_at TEXT
+            )
+        """)
+        
+        # Архивы старых заявок по месяцам (см. archive.py)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS archived_months (
+                month TEXT PRIMARY KEY,
+                path TEXT NOT NULL,
+                requests INTEGER NOT NULL DEFAULT 0,
+                updated_at TEXT NOT NULL
+            )
+        """)
+        
         conn.commit()
         conn.close()
         
@@ -42,9 +183,12 @@ def init_database():
         
     except Exception as e:
         logger.error(f"❌ Ошибка инициализации БД: {e}", exc_info=True)
+        raise
 
 
-def save_request(user_id: int, username: str, amount: str, link: str) -> bool:
+@traced()
+def save_request(user_id: int, username: str, amount: str, link: str,
+                 rate: float = None, quote_currency: str = None, idempotency_key: str = None):
     """
     Сохраняет заявку в базу данных.
     
@@ -53,10 +197,17 @@ def save_request(user_id: int, username: str, amount: str, link: str) -> bool:
         username: Username пользователя
         amount: Сумма в юанях
         link: Ссылка на товар
+        rate: Курс 1 CNY в валюте клиента, показанный в расчёте (если был)
+        quote_currency: Валюта расчёта
+        idempotency_key: Ключ повтора (уникальный, см. idempotency.storage_key)
         
     Returns:
-        True если успешно сохранено, False если ошибка
+        (ID заявки, created_at как записано в базе) если успешно сохранено, None если ошибка
+        
+    Raises:
+        DuplicateRequestError: заявка с таким idempotency_key уже есть
     """
+    existing = None
     try:
         conn = sqlite3.connect(DB_NAME)
         cursor = conn.cursor()
@@ -64,24 +215,102 @@ def save_request(user_id: int, username: str, amount: str, link: str) -> bool:
         # Получаем текущее время
         created_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         
-        # Вставляем заявку
-        cursor.execute("""
-            INSERT INTO requests (user_id, username, amount, link, created_at)
-            VALUES (?, ?, ?, ?, ?)
-        """, (user_id, username, amount, link, created_at))
+        try:
+            # Вставляем заявку
+            cursor.execute("""
+                INSERT INTO requests (user_id, username, amount, link, created_at, rate, quote_currency,
+                                      idempotency_key)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, (user_id, username, amount, link, created_at, rate, quote_currency, idempotency_key))
+        except sqlite3.IntegrityError:
+            if idempotency_key is None:
+                raise
+            cursor.execute("SELECT id FROM requests WHERE idempotency_key = ?", (idempotency_key,))
+            existing = cursor.fetchone()
+            conn.close()
+            if existing is None:
+                raise
+        else:
+            conn.commit()
+            request_id = cursor.lastrowid
+            conn.close()
+            
+            logger.info(f"✅ Заявка #{request_id} сохранена от @{username}")
+            return request_id, created_at
         
-        conn.commit()
-        request_id = cursor.lastrowid
-        conn.close()
+    except Exception as e:
+        logger.error(f"❌ Ошибка сохранения заявки: {e}", exc_info=True)
+        return None
+    
+    raise DuplicateRequestError(existing[0])
+
+
+@traced()
+def save_order(user_id: int, username: str, items: list[tuple], idempotency_key: str = None):
+    """
+    Сохраняет заказ из нескольких товаров одной транзакцией.
+    
+    Все заявки заказа вставляются одним executemany с общим order_id.
+    
+    Args:
+        user_id: ID пользователя Telegram
+        username: Username пользователя
+        items: Список кортежей (amount, link, rate, quote_currency)
+        idempotency_key: Ключ повтора заказа (уникальный)
         
-        logger.info(f"✅ Заявка #{request_id} сохранена от @{username}")
-        return True
+    Returns:
+        (order_id, список ID заявок, created_at как записано в базе) если успешно, None если ошибка
+        
+    Raises:
+        DuplicateRequestError: заказ с таким idempotency_key уже есть (request_id - ID заказа)
+    """
+    existing = None
+    try:
+        conn = sqlite3.connect(DB_NAME)
+        cursor = conn.cursor()
+        
+        created_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        
+        try:
+            with conn:
+                cursor.execute("""
+                    INSERT INTO orders (user_id, username, items, created_at, idempotency_key)
+                    VALUES (?, ?, ?, ?, ?)
+                """, (user_id, username, len(items), created_at, idempotency_key))
+                order_id = cursor.lastrowid
+                
+                cursor.executemany("""
+                    INSERT INTO requests (user_id, username, amount, link, created_at, rate, quote_currency,
+                                          order_id)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """, [
+                    (user_id, username, amount, link, created_at, rate, quote_currency, order_id)
+                    for amount, link, rate, quote_currency in items
+                ])
+        except sqlite3.IntegrityError:
+            if idempotency_key is None:
+                raise
+            cursor.execute("SELECT id FROM orders WHERE idempotency_key = ?", (idempotency_key,))
+            existing = cursor.fetchone()
+            conn.close()
+            if existing is None:
+                raise
+        else:
+            cursor.execute("SELECT id FROM requests WHERE order_id = ? ORDER BY id", (order_id,))
+            request_ids = [row[0] for row in cursor.fetchall()]
+            conn.close()
+            
+            logger.info(f"✅ Заказ #{order_id} ({len(request_ids)} заявок) сохранён от @{username}")
+            return order_id, request_ids, created_at
         
     except Exception as e:
-        logger.error(f"❌ Ошибка сохранения заявки: {e}", exc_info=True)
-        return False
+        logger.error(f"❌ Ошибка сохранения заказа: {e}", exc_info=True)
+        return None
+    
+    raise DuplicateRequestError(existing[0])
 
 
+@traced()
 def get_all_requests(limit: int = 10):
     """
     Получает последние заявки из базы данных.
@@ -90,14 +319,14 @@ def get_all_requests(limit: int = 10):
         limit: Количество заявок для получения
         
     Returns:
-        Список кортежей с данными заявок
+        Список кортежей (id, user_id, username, amount, link, created_at, status, handled_by)
     """
     try:
         conn = sqlite3.connect(DB_NAME)
         cursor = conn.cursor()
         
         cursor.execute("""
-            SELECT id, user_id, username, amount, link, created_at 
+            SELECT id, user_id, username, amount, link, created_at, status, handled_by
             FROM requests 
             ORDER BY id DESC 
             LIMIT ?
@@ -113,42 +342,583 @@ def get_all_requests(limit: int = 10):
         return []
 
 
-def get_statistics():
+@traced()
+def get_open_requests(limit: int = 20):
+    """
+    Получает очередь открытых заявок (open и in_progress), старые первыми.
+    
+    Запрос использует частичный индекс idx_requests_open,
+    поэтому не зависит от количества закрытых заявок.
+    
+    Args:
+        limit: Максимальное количество заявок
+        
+    Returns:
+        Список кортежей (id, user_id, username, amount, link, created_at, status, handled_by)
+    """
+    try:
+        conn = sqlite3.connect(DB_NAME)
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            SELECT id, user_id, username, amount, link, created_at, status, handled_by
+            FROM requests INDEXED BY idx_requests_open
+            WHERE status IN ('open', 'in_progress')
+            ORDER BY id
+            LIMIT ?
+        """, (limit,))
+        
+        requests = cursor.fetchall()
+        conn.close()
+        
+        return requests
+        
+    except Exception as e:
+        logger.error(f"❌ Ошибка получения открытых заявок: {e}", exc_info=True)
+        return []
+
+
+@traced()
+def get_request(request_id: int):
+    """
+    Получает одну заявку.
+    
+    Returns:
+        Кортеж (id, user_id, username, amount, link, created_at, status, handled_by) или None
+    """
+    try:
+        conn = sqlite3.connect(DB_NAME)
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            SELECT id, user_id, username, amount, link, created_at, status, handled_by
+            FROM requests
+            WHERE id = ?
+        """, (request_id,))
+        
+        request = cursor.fetchone()
+        conn.close()
+        
+        return request
+        
+    except Exception as e:
+        logger.error(f"❌ Ошибка получения заявки: {e}", exc_info=True)
+        return None
+
+
+@traced()
+def set_request_status(request_id: int, action: str, admin_id: int) -> bool:
+    """
+    Меняет статус заявки, если переход допустим.
+    
+    Проверка и обновление выполняются одним UPDATE, поэтому два админа,
+    одновременно нажавшие кнопку, не перезапишут друг друга.
+    
+    Args:
+        request_id: ID заявки
+        action: take, paid или cancel (см. REQUEST_ACTIONS)
+        admin_id: ID того, кто обработал заявку
+        
+    Returns:
+        True если статус изменён, False если переход недопустим или ошибка
+    """
+    new_status, from_statuses, time_column = REQUEST_ACTIONS[action]
+    
+    try:
+        conn = sqlite3.connect(DB_NAME)
+        cursor = conn.cursor()
+        
+        changed_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        placeholders = ", ".join("?" for _ in from_statuses)
+        
+        cursor.execute(f"""
+            UPDATE requests
+            SET status = ?, {time_column} = ?, handled_by = ?
+            WHERE id = ? AND status IN ({placeholders})
+        """, (new_status, changed_at, admin_id, request_id, *from_statuses))
+        changed = cursor.rowcount > 0
+        
+        conn.commit()
+        conn.close()
+        
+        if changed:
+            logger.info(f"✅ Заявка #{request_id}: {new_status} (админ {admin_id})")
+        return changed
+        
+    except Exception as e:
+        logger.error(f"❌ Ошибка смены статуса заявки: {e}", exc_info=True)
+        return False
+
+
+@traced()
+def upsert_users(rows) -> int:
+    """
+    Пакетно добавляет пользователей или обновляет их last_seen.
+    Выполняется одной транзакцией.
+    
+    Args:
+        rows: Список кортежей (user_id, username, seen_at, subscribed),
+            subscribed = None - не менять сохранённое значение
+        
+    Returns:
+        Количество обработанных строк
+    """
+    if not rows:
+        return 0
+    
+    try:
+        conn = sqlite3.connect(DB_NAME)
+        cursor = conn.cursor()
+        
+        cursor.executemany("""
+            INSERT INTO users (user_id, username, first_seen, last_seen, subscribed)
+            VALUES (?1, ?2, ?3, ?3, ?4)
+            ON CONFLICT(user_id) DO UPDATE SET
+                username = excluded.username,
+                last_seen = excluded.last_seen,
+                subscribed = COALESCE(excluded.subscribed, users.subscribed)
+        """, rows)
+        
+        conn.commit()
+        conn.close()
+        
+        return len(rows)
+        
+    except Exception as e:
+        logger.error(f"❌ Ошибка сохранения пользователей: {e}", exc_info=True)
+        return 0
+
+
+@traced()
+def get_user_ids() -> list[int]:
     """
-    Получает статистику по заявкам.
+    Получает ID всех известных пользователей.
     
     Returns:
-        dict с статистикой (total_requests, unique_users)
+        Список ID пользователей
     """
     try:
         conn = sqlite3.connect(DB_NAME)
         cursor = conn.cursor()
         
-        # Всего заявок
-        cursor.execute("SELECT COUNT(*) FROM requests")
-        total_requests = cursor.fetchone()[0]
+        cursor.execute("SELECT user_id FROM users")
+        user_ids = [row[0] for row in cursor.fetchall()]
+        
+        conn.close()
         
-        # Уникальных пользователей
-        cursor.execute("SELECT COUNT(DISTINCT user_id) FROM requests")
-        unique_users = cursor.fetchone()[0]
+        return user_ids
+        
+    except Exception as e:
+        logger.error(f"❌ Ошибка получения пользователей: {e}", exc_info=True)
+        return []
+
+
+@traced()
+def get_admins():
+    """
+    Получает всех администраторов из базы данных.
+    
+    Returns:
+        Список кортежей (user_id, username, role), None если ошибка
+        (пустой список означал бы «админов нет»)
+    """
+    try:
+        conn = sqlite3.connect(DB_NAME)
+        cursor = conn.cursor()
         
+        cursor.execute("""
+            SELECT user_id, username, role
+            FROM admins
+            ORDER BY added_at, user_id
+        """)
+        
+        admins = cursor.fetchall()
         conn.close()
         
-        return {
-            "total_requests": total_requests,
-            "unique_users": unique_users
-        }
+        return admins
         
     except Exception as e:
-        logger.error(f"❌ Ошибка получения статистики: {e}", exc_info=True)
-        return {
-            "total_requests": 0,
-            "unique_users": 0
-        }
+        logger.error(f"❌ Ошибка получения админов: {e}", exc_info=True)
+        return None
 
 
-# Инициализируем БД при импорте модуля
-init_database()
+@traced()
+def add_admin(user_id: int, username: str, role: str, added_by: int = None) -> bool:
+    """
+    Добавляет администратора или обновляет его username/роль.
+    
+    Args:
+        user_id: ID пользователя Telegram
+        username: Username (может быть пустым)
+        role: Роль администратора (owner или admin)
+        added_by: ID админа, который добавил
+        
+    Returns:
+        True если успешно сохранено, False если ошибка
+    """
+    try:
+        conn = sqlite3.connect(DB_NAME)
+        cursor = conn.cursor()
+        
+        added_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        
+        cursor.execute("""
+            INSERT INTO admins (user_id, username, role, added_by, added_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(user_id) DO UPDATE SET
+                username = excluded.username,
+                role = excluded.role
+        """, (user_id, username, role, added_by, added_at))
+        
+        conn.commit()
+        conn.close()
+        
+        logger.info(f"✅ Админ {user_id} (@{username}) сохранён с ролью {role}")
+        return True
+        
+    except Exception as e:
+        logger.error(f"❌ Ошибка сохранения админа: {e}", exc_info=True)
+        return False
+
+
+@traced()
+def remove_admin(user_id: int) -> bool:
+    """
+    Удаляет администратора.
+    
+    Args:
+        user_id: ID пользователя Telegram
+        
+    Returns:
+        True если админ был удалён, False если не найден или ошибка
+    """
+    try:
+        conn = sqlite3.connect(DB_NAME)
+        cursor = conn.cursor()
+        
+        cursor.execute("DELETE FROM admins WHERE user_id = ?", (user_id,))
+        removed = cursor.rowcount > 0
+        
+        conn.commit()
+        conn.close()
+        
+        if removed:
+            logger.info(f"✅ Админ {user_id} удалён")
+        return removed
+        
+    except Exception as e:
+        logger.error(f"❌ Ошибка удаления админа: {e}", exc_info=True)
+        return False
+
+
+@traced()
+def seed_admins(admins) -> int:
+    """
+    Заполняет таблицу админов, если она пустая.
+    
+    Args:
+        admins: Список кортежей (user_id, username, role)
+        
+    Returns:
+        Количество добавленных записей
+    """
+    try:
+        conn = sqlite3.connect(DB_NAME)
+        cursor = conn.cursor()
+        
+        cursor.execute("SELECT COUNT(*) FROM admins")
+        if cursor.fetchone()[0] > 0:
+            conn.close()
+            return 0
+        
+        added_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        cursor.executemany("""
+            INSERT INTO admins (user_id, username, role, added_by, added_at)
+            VALUES (?, ?, ?, NULL, ?)
+        """, [(user_id, username, role, added_at) for user_id, username, role in admins])
+        
+        conn.commit()
+        conn.close()
+        
+        logger.info(f"✅ Таблица админов заполнена ({len(admins)} записей)")
+        return len(admins)
+        
+    except Exception as e:
+        logger.error(f"❌ Ошибка заполнения таблицы админов: {e}", exc_info=True)
+        return 0
+
+
+@traced()
+def get_recent_user_ids(limit: int = 50) -> list[int]:
+    """
+    Получает ID пользователей, недавно оформлявших заявки.
+    
+    Args:
+        limit: Максимальное количество пользователей
+        
+    Returns:
+        Список ID пользователей (сначала самые свежие)
+    """
+    try:
+        conn = sqlite3.connect(DB_NAME)
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            SELECT user_id
+            FROM requests
+            GROUP BY user_id
+            ORDER BY MAX(id) DESC
+            LIMIT ?
+        """, (limit,))
+        
+        user_ids = [row[0] for row in cursor.fetchall()]
+        conn.close()
+        
+        return user_ids
+        
+    except Exception as e:
+        logger.error(f"❌ Ошибка получения пользователей: {e}", exc_info=True)
+        return []
+
+
+@traced()
+def get_user_ids_after(after_user_id: int, limit: int) -> list[int]:
+    """
+    Получает следующую порцию пользователей по возрастанию ID (keyset-пагинация).
+    
+    Args:
+        after_user_id: ID, после которого начинать
+        limit: Размер порции
+        
+    Returns:
+        Список ID пользователей
+    """
+    try:
+        conn = sqlite3.connect(DB_NAME)
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            SELECT user_id FROM users
+            WHERE user_id > ?
+            ORDER BY user_id
+            LIMIT ?
+        """, (after_user_id, limit))
+        
+        user_ids = [row[0] for row in cursor.fetchall()]
+        conn.close()
+        
+        return user_ids
+        
+    except Exception as e:
+        logger.error(f"❌ Ошибка получения пользователей: {e}", exc_info=True)
+        return []
+
+
+@traced()
+def delete_users(user_ids) -> int:
+    """
+    Удаляет пользователей (например, заблокировавших бота).
+    
+    Args:
+        user_ids: Список ID пользователей
+        
+    Returns:
+        Количество удалённых строк
+    """
+    if not user_ids:
+        return 0
+    
+    try:
+        conn = sqlite3.connect(DB_NAME)
+        cursor = conn.cursor()
+        
+        cursor.executemany("DELETE FROM users WHERE user_id = ?", [(user_id,) for user_id in user_ids])
+        deleted = cursor.rowcount
+        
+        conn.commit()
+        conn.close()
+        
+        return deleted
+        
+    except Exception as e:
+        logger.error(f"❌ Ошибка удаления пользователей: {e}", exc_info=True)
+        return 0
+
+
+_BROADCAST_COLUMNS = """
+    id, admin_id, source_chat_id, source_message_id, mode, status, total,
+    last_user_id, sent, failed, blocked, status_chat_id, status_message_id
+"""
+
+
+@traced()
+def create_broadcast(admin_id: int, source_chat_id: int, source_message_id: int,
+                     mode: str, status_chat_id: int, status_message_id: int):
+    """
+    Создаёт рассылку.
+    
+    Args:
+        admin_id: ID админа, запустившего рассылку
+        source_chat_id: Чат с исходным сообщением
+        source_message_id: ID исходного сообщения
+        mode: copy (копия) или forward (пересылка)
+        status_chat_id: Чат сообщения с прогрессом
+        status_message_id: ID сообщения с прогрессом
+        
+    Returns:
+        ID рассылки или None при ошибке
+    """
+    try:
+        conn = sqlite3.connect(DB_NAME)
+        cursor = conn.cursor()
+        
+        created_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        
+        cursor.execute("""
+            INSERT INTO broadcasts (
+                admin_id, source_chat_id, source_message_id, mode, total,
+                status_chat_id, status_message_id, created_at
+            )
+            VALUES (?, ?, ?, ?, (SELECT COUNT(*) FROM users), ?, ?, ?)
+        """, (admin_id, source_chat_id, source_message_id, mode,
+              status_chat_id, status_message_id, created_at))
+        
+        conn.commit()
+        broadcast_id = cursor.lastrowid
+        conn.close()
+        
+        logger.info(f"✅ Рассылка #{broadcast_id} создана админом {admin_id}")
+        return broadcast_id
+        
+    except Exception as e:
+        logger.error(f"❌ Ошибка создания рассылки: {e}", exc_info=True)
+        return None
+
+
+@traced()
+def get_broadcast(broadcast_id: int):
+    """
+    Получает рассылку по ID.
+    
+    Returns:
+        Кортеж с полями рассылки или None
+    """
+    try:
+        conn = sqlite3.connect(DB_NAME)
+        cursor = conn.cursor()
+        
+        cursor.execute(f"SELECT {_BROADCAST_COLUMNS} FROM broadcasts WHERE id = ?", (broadcast_id,))
+        broadcast = cursor.fetchone()
+        
+        conn.close()
+        return broadcast
+        
+    except Exception as e:
+        logger.error(f"❌ Ошибка получения рассылки: {e}", exc_info=True)
+        return None
+
+
+@traced()
+def get_running_broadcasts():
+    """
+    Получает незавершённые рассылки (для продолжения после рестарта).
+    
+    Returns:
+        Список кортежей с полями рассылок
+    """
+    try:
+        conn = sqlite3.connect(DB_NAME)
+        cursor = conn.cursor()
+        
+        cursor.execute(f"SELECT {_BROADCAST_COLUMNS} FROM broadcasts WHERE status = 'running' ORDER BY id")
+        broadcasts = cursor.fetchall()
+        
+        conn.close()
+        return broadcasts
+        
+    except Exception as e:
+        logger.error(f"❌ Ошибка получения рассылок: {e}", exc_info=True)
+        return []
+
+
+@traced()
+def update_broadcast_progress(broadcast_id: int, last_user_id: int, sent: int, failed: int, blocked: int):
+    """
+    Сохраняет прогресс рассылки (курсор и счётчики).
+    """
+    try:
+        conn = sqlite3.connect(DB_NAME)
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            UPDATE broadcasts
+            SET last_user_id = ?, sent = ?, failed = ?, blocked = ?
+            WHERE id = ?
+        """, (last_user_id, sent, failed, blocked, broadcast_id))
+        
+        conn.commit()
+        conn.close()
+        
+    except Exception as e:
+        logger.error(f"❌ Ошибка сохранения прогресса рассылки: {e}", exc_info=True)
+
+
+@traced()
+def finish_broadcast(broadcast_id: int, status: str) -> bool:
+    """
+    Помечает рассылку завершённой (только если она ещё идёт).
+    
+    Args:
+        broadcast_id: ID рассылки
+        status: done или cancelled
+        
+    Returns:
+        True если статус изменён, False если рассылка уже завершена или ошибка
+    """
+    try:
+        conn = sqlite3.connect(DB_NAME)
+        cursor = conn.cursor()
+        
+        finished_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        cursor.execute("""
+            UPDATE broadcasts SET status = ?, finished_at = ?
+            WHERE id = ? AND status = 'running'
+        """, (status, finished_at, broadcast_id))
+        changed = cursor.rowcount > 0
+        
+        conn.commit()
+        conn.close()
+        return changed
+        
+    except Exception as e:
+        logger.error(f"❌ Ошибка завершения рассылки: {e}", exc_info=True)
+        return False
+
+
+# ============================================================================
+# ХУКИ ЗАПУСКА
+# ============================================================================
+
+@on_startup("db_migrations")
+def _startup_migrations(bot):
+    """Создаёт таблицы, если их нет."""
+    init_database()
+
+
+@on_startup("db_warmup", after=("db_migrations",), required=False)
+def _startup_warmup(bot):
+    """
+    Прогревает БД: открывает файл и читает индексы,
+    чтобы первый запрос пользователя не ждал холодного диска.
+    """
+    conn = sqlite3.connect(DB_NAME)
+    cursor = conn.cursor()
+    tables = [row[0] for row in cursor.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+    )]
+    for table in tables:
+        cursor.execute(f"SELECT COUNT(*) FROM {table}").fetchone()
+    conn.close()
 
 
 
@@ -0,0 +1,222 @@
+"""
+Диагностика: поиск кода, который блокирует цикл событий.
+
+Включается BLOCKING_DETECTOR=1. Тогда:
+- у цикла событий включается режим отладки asyncio с порогом медленного
+  шага BLOCKING_THRESHOLD (asyncio сам пишет такие шаги в лог);
+- задача-пульс отмечается в цикле каждые BLOCKING_THRESHOLD / 2 секунды,
+  а сторожевой поток, заметив, что пульса нет дольше порога, снимает стек
+  потока цикла событий - это и есть код, который держит цикл
+  (например, sqlite3.connect в database.py).
+
+Стеки группируются по месту блокировки и обработчику; отчёт - командой
+/admin blocking или в файл BLOCKING_REPORT_FILE при остановке бота.
+Режим отладки asyncio замедляет бота - включайте только на время диагностики.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from typing import Optional
+
+import metrics
+from config import BLOCKING_DETECTOR, BLOCKING_THRESHOLD, BLOCKING_REPORT_FILE
+from lifecycle import on_startup, on_shutdown
+from render import escape
+
+logger = logging.getLogger(__name__)
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+HANDLERS_DIR = os.path.join(PROJECT_DIR, "handlers")
+
+blocked_total = metrics.counter("bot_loop_blocked_total", "Случаи блокировки цикла событий дольше порога")
+blocked_seconds = metrics.summary("bot_loop_blocked_seconds", "Длительность блокировок цикла событий")
+
+
+class Offender:
+    """Одно место блокировки: сколько раз, сколько всего и последний стек."""
+
+    __slots__ = ("location", "handler", "count", "total", "max", "stack")
+
+    def __init__(self, location: str, handler: str, stack: list[str]):
+        self.location = location
+        self.handler = handler
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.stack = stack
+
+    def to_dict(self) -> dict:
+        return {
+            "location": self.location, "handler": self.handler, "count": self.count,
+            "total_seconds": round(self.total, 3), "max_seconds": round(self.max, 3), "stack": self.stack,
+        }
+
+
+class BlockingDetector:
+    """Пульс в цикле событий и сторожевой поток, снимающий стек при блокировке."""
+
+    def __init__(self, threshold: float = BLOCKING_THRESHOLD):
+        self.threshold = threshold
+        self.offenders: dict[tuple[str, str], Offender] = {}
+        self._lock = threading.Lock()
+        self._last_beat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._captured: Optional[tuple[str, str, list[str]]] = None
+        self._stop = threading.Event()
+        self._task: asyncio.Task = None
+        self._thread: threading.Thread = None
+
+    # --- цикл событий ---
+
+    async def _heartbeat(self):
+        interval = self.threshold / 2
+        while True:
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            with self._lock:
+                stalled = now - self._last_beat - interval
+                captured, self._captured = self._captured, None
+                self._last_beat = now
+            if captured is not None:
+                self._record(captured, max(stalled, self.threshold))
+
+    def _record(self, captured: tuple, duration: float):
+        location, handler, stack = captured
+        offender = self.offenders.get((location, handler))
+        if offender is None:
+            offender = self.offenders[(location, handler)] = Offender(location, handler, stack)
+        offender.count += 1
+        offender.total += duration
+        offender.stack = stack
+        if duration > offender.max:
+            offender.max = duration
+
+        blocked_total.inc()
+        blocked_seconds.observe(duration)
+        logger.warning(f"🧱 Цикл событий заблокирован на {duration:.3f} с: {location} ({handler})")
+
+    # --- сторожевой поток ---
+
+    def _watch(self):
+        while not self._stop.wait(self.threshold / 4):
+            with self._lock:
+                if self._captured is not None or time.monotonic() - self._last_beat < self.threshold:
+                    continue
+                frame = sys._current_frames().get(self._loop_thread_id)
+                if frame is not None:
+                    self._captured = _describe(traceback.extract_stack(frame))
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._task = loop.create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watch, name="blocking-detector", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+
+    # --- отчёт ---
+
+    def top(self, limit: int = None) -> list[Offender]:
+        offenders = sorted(self.offenders.values(), key=lambda item: -item.total)
+        return offenders[:limit] if limit else offenders
+
+    def report_json(self) -> str:
+        """Полный отчёт со стеками (JSON)."""
+        return json.dumps({
+            "threshold_seconds": self.threshold,
+            "generated_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "offenders": [offender.to_dict() for offender in self.top()],
+        }, ensure_ascii=False, indent=2)
+
+    def dump(self, path: str) -> int:
+        """Пишет отчёт в файл. Returns: число мест блокировки."""
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.report_json())
+        return len(self.offenders)
+
+
+def _short(frame: traceback.FrameSummary) -> str:
+    """Кадр стека одной строкой: путь (относительно проекта, если он в проекте), строка, функция."""
+    path = frame.filename
+    if path.startswith(PROJECT_DIR):
+        path = os.path.relpath(path, PROJECT_DIR)
+    return f"{path}:{frame.lineno} {frame.name}"
+
+
+def _describe(stack: traceback.StackSummary) -> tuple[str, str, list[str]]:
+    """
+    Место блокировки (последний кадр кода бота, иначе последний кадр вообще),
+    обработчик (первый кадр из handlers/) и стек в виде строк.
+    """
+    project = [
+        frame for frame in stack
+        if frame.filename.startswith(PROJECT_DIR) and "site-packages" not in frame.filename
+        and frame.filename != __file__
+    ]
+    location = _short(project[-1]) if project else _short(stack[-1])
+    handler = next((_short(frame) for frame in project if frame.filename.startswith(HANDLERS_DIR)), "-")
+    return location, handler, [_short(frame) for frame in stack[-25:]]
+
+
+# Детектор процесса (None, если BLOCKING_DETECTOR выключен)
+detector: Optional[BlockingDetector] = None
+
+
+def report_text(limit: int = 10) -> str:
+    """Текст отчёта для админа (HTML)."""
+    if detector is None:
+        return "🧱 Детектор блокировок выключен (BLOCKING_DETECTOR=1 в .env и перезапуск)"
+
+    offenders = detector.top(limit)
+    if not offenders:
+        return f"✅ Блокировок цикла событий дольше {detector.threshold * 1000:.0f} мс не было"
+
+    lines = [f"🧱 <b>Блокировки цикла событий</b> (порог {detector.threshold * 1000:.0f} мс)\n"]
+    for number, offender in enumerate(offenders, start=1):
+        lines.append(
+            f"{number}. <code>{escape(offender.location)}</code>\n"
+            f"   обработчик: <code>{escape(offender.handler)}</code>\n"
+            f"   {offender.count} раз, всего {offender.total:.2f} с, максимум {offender.max * 1000:.0f} мс"
+        )
+    return "\n".join(lines)
+
+
+# ============================================================================
+# ХУКИ ЗАПУСКА И ОСТАНОВКИ
+# ============================================================================
+
+@on_startup("blocking_detector", required=False)
+async def _startup_detector(bot):
+    """Включает режим отладки asyncio и детектор блокировок (если BLOCKING_DETECTOR)."""
+    global detector
+    if not BLOCKING_DETECTOR:
+        return
+
+    loop = asyncio.get_running_loop()
+    loop.set_debug(True)
+    loop.slow_callback_duration = BLOCKING_THRESHOLD
+
+    detector = BlockingDetector(BLOCKING_THRESHOLD)
+    detector.start(loop)
+    logger.warning(f"🧱 Детектор блокировок включён (порог {BLOCKING_THRESHOLD * 1000:.0f} мс), бот работает медленнее")
+
+
+@on_shutdown("blocking_detector")
+async def _shutdown_detector(bot):
+    """Останавливает детектор и сохраняет отчёт в BLOCKING_REPORT_FILE."""
+    if detector is None:
+        return
+    detector.stop()
+    if BLOCKING_REPORT_FILE:
+        count = detector.dump(BLOCKING_REPORT_FILE)
+        logger.info(f"🧱 Отчёт о блокировках ({count} мест) сохранён в {BLOCKING_REPORT_FILE}")
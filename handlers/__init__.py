@@ -1,4 +1,4 @@
 # Пакет обработчиков команд и сообщений бота
 
 # Импортируем все модули обработчиков
-from . import start, requests, admin, subscription
\ No newline at end of file
+from . import start, requests, admin, subscription, broadcast
\ No newline at end of file
@@ -1,30 +1,68 @@
 """
 Обработчики админ-панели.
 
-Доступ только для пользователей из списка ADMINS.
+Доступ только для пользователей из реестра админов (admins.py).
 Функционал:
-- Статистика пользователей
-- Просмотр заявок
+- Статистика и аналитика: топ клиентов, повторные клиенты, менеджеры, заявки по дням
+- Просмотр заявок и очередь открытых заявок
+- Смена статуса заявки кнопками (взять / оплачено / отменить)
 - Управление ботом
+- Добавление и удаление админов без перезапуска (/admin add|remove|reload)
+- Резервная копия базы по команде (/admin backup)
+- Выгрузка заявок за период вместе с архивом (/admin history)
+- Перечитывание настроек менеджера и канала без перезапуска (/admin settings)
 """
 
+import asyncio
+import csv
+import io
 import logging
+from datetime import datetime
+
 from aiogram import types
+from aiogram.filters import CommandObject
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
-from admins import is_admin, ADMINS
+from admins import (
+    is_admin, is_owner, get_admins, add_admin, remove_admin, reload_admins,
+    ROLES, ROLE_ADMIN,
+)
+import analytics
+from archive import REQUEST_COLUMNS, get_requests_between
+from backups import create_backup
+import diagnostics
+import recent
+import settings
+from database import (
+    STATUS_OPEN, STATUS_IN_PROGRESS, STATUS_PAID, STATUS_CANCELLED,
+    OPEN_STATUSES, REQUEST_ACTIONS,
+)
+from render import ChunkedMessage, escape
 
 logger = logging.getLogger(__name__)
 
+# Подписи статусов заявок
+STATUS_LABELS = {
+    STATUS_OPEN: "🆕 Новая",
+    STATUS_IN_PROGRESS: "🛠 В работе",
+    STATUS_PAID: "💰 Оплачена",
+    STATUS_CANCELLED: "❌ Отменена",
+}
+
+# Сколько открытых заявок показывать в очереди
+OPEN_QUEUE_LIMIT = 20
+
 
 # ============================================================================
 # ГЛАВНОЕ МЕНЮ АДМИН-ПАНЕЛИ
 # ============================================================================
 
-async def admin_command(message: types.Message):
+async def admin_command(message: types.Message, command: CommandObject = None):
     """
     Команда /admin - открывает админ-панель.
     Доступна только администраторам.
+    
+    С аргументами выполняет подкоманду (см. handle_admin_subcommand).
     """
     
     user_id = message.from_user.id
@@ -38,6 +76,11 @@ async def admin_command(message: types.Message):
         await message.answer("❌ У вас нет доступа к админ-панели")
         return
     
+    # Подкоманды: /admin add ..., /admin remove ..., /admin reload
+    if command is not None and command.args:
+        await handle_admin_subcommand(message, command.args)
+        return
+    
     # Формируем текст приветствия
     text = f"""🔐 <b>АДМИН-ПАНЕЛЬ</b>
 
@@ -48,6 +91,7 @@ async def admin_command(message: types.Message):
     # Создаем клавиатуру
     keyboard = InlineKeyboardBuilder()
     keyboard.button(text="📊 Статистика", callback_data="admin_stats")
+    keyboard.button(text="📥 Открытые заявки", callback_data="admin_open")
     keyboard.button(text="📋 Все заявки", callback_data="admin_requests")
     keyboard.button(text="👥 Список админов", callback_data="admin_list")
     keyboard.button(text="ℹ️ О боте", callback_data="admin_info")
@@ -65,7 +109,7 @@ async def admin_command(message: types.Message):
 # ============================================================================
 
 async def button_admin_stats(callback: types.CallbackQuery):
-    """Показывает статистику бота."""
+    """Показывает статистику и аналитику бота."""
     
     user_id = callback.from_user.id
     
@@ -77,23 +121,9 @@ async def button_admin_stats(callback: types.CallbackQuery):
     logger.info(f"📨 Кнопка 'admin_stats' от {user_id}")
     
     try:
-        # Получаем статистику из модуля database
-        from database import get_statistics
-        
-        stats = get_statistics()
-        total_requests = stats["total_requests"]
-        unique_users = stats["unique_users"]
-        
-        # Формируем текст
-        text = f"""📊 <b>СТАТИСТИКА БОТА</b>
-
-📝 <b>Заявки:</b>
-   • Всего заявок: {total_requests}
-
-👥 <b>Пользователи:</b>
-   • Уникальных пользователей: {unique_users}
-
-🔄 <b>Обновлено:</b> только что"""
+        # Весь дашборд за один проход по базе, повторные нажатия - из кэша (см. analytics.py)
+        stats = await analytics.get_dashboard()
+        text = render_dashboard(stats)
         
     except Exception as e:
         logger.error(f"❌ Ошибка получения статистики: {e}", exc_info=True)
@@ -112,6 +142,68 @@ async def button_admin_stats(callback: types.CallbackQuery):
     await callback.answer()
 
 
+def _money(amount: float) -> str:
+    """Сумма с пробелами между разрядами: 12 345."""
+    return f"{amount:,.0f}".replace(",", " ")
+
+
+def render_dashboard(stats: dict) -> str:
+    """
+    Текст дашборда для админа (HTML).
+    
+    Args:
+        stats: Результат analytics.get_dashboard()
+    """
+    by_status = stats["by_status"]
+    status_lines = "\n".join(
+        f"   • {label}: {by_status.get(status, 0)}" for status, label in STATUS_LABELS.items()
+    )
+    
+    top_lines = "\n".join(
+        f"   {number}. {escape('@' + username if username else user_id)} — заявок: {count}, {_money(amount)} ¥"
+        for number, (user_id, username, count, amount) in enumerate(stats["top_customers"], start=1)
+    ) or "   —"
+    
+    admin_names = {admin_id: username for admin_id, username, _ in get_admins()}
+    manager_lines = "\n".join(
+        f"   • {escape('@' + admin_names[handled_by] if admin_names.get(handled_by) else handled_by)}: "
+        f"{sum(statuses.values())} (оплачено {statuses.get(STATUS_PAID, 0)}, "
+        f"отменено {statuses.get(STATUS_CANCELLED, 0)}, в работе {statuses.get(STATUS_IN_PROGRESS, 0)})"
+        for handled_by, statuses in sorted(stats["managers"].items(), key=lambda item: -sum(item[1].values()))
+    ) or "   —"
+    
+    day_lines = "\n".join(f"   {day[5:]}: {count}" for day, count in stats["by_day"])
+    month_lines = "\n".join(f"   {month}: {count}" for month, count in stats["by_month"][-12:]) or "   —"
+    
+    return f"""📊 <b>СТАТИСТИКА БОТА</b>
+
+📝 <b>Заявки:</b>
+   • Всего заявок: {stats["total_requests"]}
+   • Из них в архиве: {stats["archived_requests"]}
+{status_lines}
+   • Сумма оплаченных: {_money(stats["paid_amount"])} ¥
+
+👥 <b>Пользователи:</b>
+   • Всего пользователей бота: {stats["total_users"]}
+   • Подписаны на канал: {stats["subscribed_users"]}
+   • Оформляли заявки: {stats["customers"]}
+   • Повторные клиенты: {stats["repeat_customers"]} ({stats["repeat_rate"]:.0%})
+
+🏆 <b>Топ клиентов:</b>
+{top_lines}
+
+🛠 <b>Заявки по менеджерам:</b>
+{manager_lines}
+
+📅 <b>По дням:</b>
+{day_lines}
+
+🗓 <b>По месяцам:</b>
+{month_lines}
+
+🔄 <b>Посчитано:</b> {stats["computed_at"]}"""
+
+
 # ============================================================================
 # ПРОСМОТР ЗАЯВОК
 # ============================================================================
@@ -129,44 +221,228 @@ async def button_admin_requests(callback: types.CallbackQuery):
     logger.info(f"📨 Кнопка 'admin_requests' от {user_id}")
     
     try:
-        # Получаем заявки из модуля database
-        from database import get_all_requests
-        
-        requests = get_all_requests(limit=10)
+        # Последние заявки из памяти (см. recent.py), без запроса к базе
+        requests = recent.latest(limit=10)
         
         if not requests:
-            text = "📋 <b>ЗАЯВКИ</b>\n\nПока нет ни одной заявки"
+            messages = ["📋 <b>ЗАЯВКИ</b>\n\nПока нет ни одной заявки"]
         else:
-            text = f"📋 <b>ПОСЛЕДНИЕ 10 ЗАЯВОК</b>\n\n"
-            
+            builder = ChunkedMessage(header="📋 <b>ПОСЛЕДНИЕ 10 ЗАЯВОК</b>\n\n")
             for req in requests:
-                req_id, req_user_id, req_username, amount, link, created_at = req
-                
-                # Форматируем заявку
-                text += f"<b>Заявка #{req_id}</b>\n"
-                text += f"👤 @{req_username or 'нет username'} (ID: {req_user_id})\n"
-                text += f"💰 Сумма: {amount} ¥\n"
-                text += f"🔗 Ссылка: {link}\n"
-                text += f"📅 Дата: {created_at}\n"
-                text += "─" * 30 + "\n\n"
+                builder.add(format_request_entry(req))
+            messages = builder.messages()
         
     except Exception as e:
         logger.error(f"❌ Ошибка получения заявок: {e}", exc_info=True)
-        text = f"❌ <b>Ошибка получения заявок</b>\n\n{str(e)}"
+        messages = [f"❌ <b>Ошибка получения заявок</b>\n\n{escape(e)}"]
     
     # Кнопка назад
     keyboard = InlineKeyboardBuilder()
     keyboard.button(text="⬅️ Назад в админку", callback_data="admin_back")
     
     try:
-        await callback.message.answer(text, reply_markup=keyboard.as_markup())
-        logger.info(f"✅ Список заявок отправлен админу {user_id}")
+        # Кнопку прикрепляем только к последнему сообщению
+        for text in messages[:-1]:
+            await callback.message.answer(text)
+        await callback.message.answer(messages[-1], reply_markup=keyboard.as_markup())
+        logger.info(f"✅ Список заявок отправлен админу {user_id} ({len(messages)} сообщ.)")
     except Exception as e:
         logger.error(f"❌ Ошибка отправки заявок: {e}", exc_info=True)
     
     await callback.answer()
 
 
+def format_request_entry(req) -> str:
+    """
+    Форматирует одну заявку для списка в админке.
+    
+    Пользовательские значения (username, ссылка) экранируются здесь,
+    один раз при рендеринге.
+    
+    Args:
+        req: Кортеж (id, user_id, username, amount, link, created_at, status[, handled_by])
+        
+    Returns:
+        Готовый HTML-текст записи
+    """
+    req_id, req_user_id, req_username, amount, link, created_at, status = req[:7]
+    handled_by = req[7] if len(req) > 7 else None
+    
+    lines = [
+        f"<b>Заявка #{req_id}</b> — {STATUS_LABELS.get(status, status)}",
+        f"👤 @{escape(req_username or 'нет username')} (ID: {req_user_id})",
+        f"💰 Сумма: {escape(amount)} ¥",
+        f"🔗 Ссылка: {escape(link)}",
+        f"📅 Дата: {created_at}",
+    ]
+    if handled_by:
+        lines.append(f"🧑‍💼 Ответственный: <code>{handled_by}</code>")
+    lines += ["─" * 30, ""]
+    return "\n".join(lines)
+
+
+# ============================================================================
+# ОЧЕРЕДЬ ОТКРЫТЫХ ЗАЯВОК
+# ============================================================================
+
+async def button_admin_open(callback: types.CallbackQuery):
+    """
+    Показывает открытые заявки (новые и в работе), старые первыми.
+    Доступно и менеджеру (кнопка под уведомлением о заказе).
+    """
+    
+    user_id = callback.from_user.id
+    
+    # Проверка прав
+    if not can_handle_requests(user_id):
+        await callback.answer("❌ Нет доступа", show_alert=True)
+        return
+    
+    logger.info(f"📨 Кнопка 'admin_open' от {user_id}")
+    
+    from database import get_open_requests
+    
+    requests = get_open_requests(limit=OPEN_QUEUE_LIMIT)
+    
+    # Админ-панель менеджеру (не админу) недоступна - кнопку назад не показываем
+    back_markup = None
+    if is_admin(user_id):
+        keyboard = InlineKeyboardBuilder()
+        keyboard.button(text="⬅️ Назад в админку", callback_data="admin_back")
+        back_markup = keyboard.as_markup()
+    
+    if not requests:
+        await callback.message.answer(
+            "📥 <b>ОТКРЫТЫЕ ЗАЯВКИ</b>\n\nОчередь пуста 🎉",
+            reply_markup=back_markup
+        )
+        await callback.answer()
+        return
+    
+    try:
+        await callback.message.answer(f"📥 <b>ОТКРЫТЫЕ ЗАЯВКИ</b> ({len(requests)})")
+        
+        # Каждая заявка - отдельное сообщение со своими кнопками действий
+        for req in requests:
+            await callback.message.answer(
+                format_request_entry(req),
+                reply_markup=request_actions_keyboard(req[0], req[6])
+            )
+        
+        await callback.message.answer(
+            f"Показано заявок: {len(requests)} (старые первыми)",
+            reply_markup=back_markup
+        )
+        logger.info(f"✅ Очередь заявок отправлена админу {user_id}")
+    except Exception as e:
+        logger.error(f"❌ Ошибка отправки очереди заявок: {e}", exc_info=True)
+    
+    await callback.answer()
+
+
+# ============================================================================
+# СМЕНА СТАТУСА ЗАЯВКИ
+# ============================================================================
+
+def can_handle_requests(user_id: int) -> bool:
+    """Менять статус заявок могут админы и менеджер."""
+    return is_admin(user_id) or user_id == settings.current().manager_id
+
+
+def request_actions_keyboard(request_id: int, status: str):
+    """
+    Кнопки действий для заявки в текущем статусе.
+    
+    Args:
+        request_id: ID заявки
+        status: Текущий статус
+        
+    Returns:
+        InlineKeyboardMarkup или None, если заявка закрыта
+    """
+    keyboard = InlineKeyboardBuilder()
+    
+    if status == STATUS_OPEN:
+        keyboard.button(text="🛠 Взять в работу", callback_data=f"req_take:{request_id}")
+    if status in OPEN_STATUSES:
+        keyboard.button(text="💰 Оплачено", callback_data=f"req_paid:{request_id}")
+        keyboard.button(text="❌ Отменить", callback_data=f"req_cancel:{request_id}")
+    else:
+        return None
+    
+    keyboard.adjust(1)
+    return keyboard.as_markup()
+
+
+def _with_status_line(text: str, status: str, username: str) -> str:
+    """
+    Текст уведомления о заявке со строкой статуса в конце.
+    Строка, добавленная прошлым нажатием, заменяется - текст не растёт.
+    
+    Args:
+        text: HTML-текст уведомления
+        status: Новый статус заявки
+        username: Кто сменил статус (уже экранирован)
+    """
+    body, separator, last = text.rpartition("\n\n")
+    if separator and any(last.startswith(f"{label} — @") for label in STATUS_LABELS.values()):
+        text = body
+    return f"{text}\n\n{STATUS_LABELS.get(status, status)} — @{username}"
+
+
+async def button_request_action(callback: types.CallbackQuery):
+    """
+    Кнопки на уведомлении о заявке: req_take / req_paid / req_cancel.
+    Меняет статус и обновляет кнопки под сообщением.
+    """
+    
+    user_id = callback.from_user.id
+    
+    if not can_handle_requests(user_id):
+        await callback.answer("❌ Нет доступа", show_alert=True)
+        return
+    
+    action, request_id = callback.data.removeprefix("req_").split(":", 1)
+    request_id = int(request_id)
+    
+    if action not in REQUEST_ACTIONS:
+        await callback.answer()
+        return
+    
+    logger.info(f"📨 Кнопка 'req_{action}' по заявке #{request_id} от {user_id}")
+    
+    from database import set_request_status, get_request
+    
+    changed = set_request_status(request_id, action, user_id)
+    request = get_request(request_id)
+    
+    if request is None:
+        await callback.answer("Заявка не найдена", show_alert=True)
+        return
+    
+    status = request[6]
+    recent.update(request)
+    analytics.invalidate()
+    
+    if not changed:
+        await callback.answer(
+            f"Нельзя: заявка уже {STATUS_LABELS.get(status, status).lower()}",
+            show_alert=True
+        )
+    else:
+        await callback.answer(STATUS_LABELS.get(status, status))
+    
+    # Обновляем кнопки и строку статуса под уведомлением
+    try:
+        username = escape(callback.from_user.username or user_id)
+        await callback.message.edit_text(
+            _with_status_line(callback.message.html_text, status, username),
+            reply_markup=request_actions_keyboard(request_id, status)
+        )
+    except Exception as e:
+        logger.debug(f"Не удалось обновить уведомление о заявке #{request_id}: {e}")
+
+
 # ============================================================================
 # СПИСОК АДМИНОВ
 # ============================================================================
@@ -183,16 +459,17 @@ async def button_admin_list(callback: types.CallbackQuery):
     
     logger.info(f"📨 Кнопка 'admin_list' от {user_id}")
     
+    admins = get_admins()
     text = "👥 <b>СПИСОК АДМИНИСТРАТОРОВ</b>\n\n"
     
-    if not ADMINS:
+    if not admins:
         text += "Список администраторов пуст.\n\n"
-        text += "Добавьте админов в файл <code>admins.py</code>"
+        text += "Добавьте админа командой <code>/admin add &lt;user_id&gt; [username]</code>"
     else:
-        for idx, (admin_id, admin_username) in enumerate(ADMINS, 1):
-            text += f"{idx}. @{admin_username} (ID: <code>{admin_id}</code>)\n"
+        for idx, (admin_id, admin_username, role) in enumerate(admins, 1):
+            text += f"{idx}. @{escape(admin_username)} (ID: <code>{admin_id}</code>) — {role}\n"
         
-        text += f"\n<b>Всего админов:</b> {len(ADMINS)}"
+        text += f"\n<b>Всего админов:</b> {len(admins)}"
     
     # Кнопка назад
     keyboard = InlineKeyboardBuilder()
@@ -240,7 +517,7 @@ async def button_admin_info(callback: types.CallbackQuery):
 <b>Файлы:</b>
 • bot.py - основной файл
 • config.py - конфигурация
-• admins.py - список админов
+• admins.py - реестр админов (хранится в БД)
 • handlers/ - обработчики команд"""
     
     # Кнопка назад
@@ -282,6 +559,7 @@ async def button_admin_back(callback: types.CallbackQuery):
     
     keyboard = InlineKeyboardBuilder()
     keyboard.button(text="📊 Статистика", callback_data="admin_stats")
+    keyboard.button(text="📥 Открытые заявки", callback_data="admin_open")
     keyboard.button(text="📋 Все заявки", callback_data="admin_requests")
     keyboard.button(text="👥 Список админов", callback_data="admin_list")
     keyboard.button(text="ℹ️ О боте", callback_data="admin_info")
@@ -295,3 +573,255 @@ async def button_admin_back(callback: types.CallbackQuery):
     
     await callback.answer()
 
+
+
+# ============================================================================
+# УПРАВЛЕНИЕ АДМИНАМИ (/admin add | remove | reload)
+# ============================================================================
+
+ADMIN_SUBCOMMANDS_HELP = """⚙️ <b>Управление админами</b>
+
+<code>/admin add &lt;user_id&gt; [username] [role]</code> — добавить админа
+<code>/admin remove &lt;user_id&gt;</code> — удалить админа
+<code>/admin reload</code> — перечитать список из базы
+<code>/admin backup</code> — резервная копия базы заявок
+<code>/admin history &lt;YYYY-MM-DD&gt; [YYYY-MM-DD]</code> — заявки за период (CSV, вместе с архивом)
+<code>/admin recent</code> — сверить последние заявки в памяти с базой
+<code>/admin blocking</code> — что блокировало цикл событий (при BLOCKING_DETECTOR=1)
+<code>/admin settings</code> — перечитать менеджера и канал из .env без перезапуска
+
+<code>/broadcast</code> — рассылка всем пользователям бота
+
+Роли: """ + ", ".join(ROLES)
+
+
+async def handle_admin_subcommand(message: types.Message, args: str):
+    """
+    Выполняет подкоманду /admin.
+    
+    Изменение списка админов доступно только роли owner.
+    Изменения сразу попадают в базу и кэш - перезапуск не нужен.
+    
+    Args:
+        message: Сообщение с командой
+        args: Текст после /admin
+    """
+    
+    user_id = message.from_user.id
+    parts = args.split()
+    action = parts[0].lower()
+    
+    logger.info(f"📨 /admin {action} от {user_id}")
+    
+    if action == "backup":
+        await handle_backup_command(message)
+        return
+    
+    if action == "history":
+        await handle_history_command(message, parts[1:])
+        return
+    
+    if action == "recent":
+        await handle_recent_check_command(message)
+        return
+    
+    if action == "blocking":
+        await handle_blocking_report_command(message)
+        return
+    
+    if action == "settings":
+        await handle_settings_command(message)
+        return
+    
+    if action not in ("add", "remove", "reload"):
+        await message.answer(ADMIN_SUBCOMMANDS_HELP)
+        return
+    
+    if not is_owner(user_id):
+        await message.answer("❌ Управлять админами может только владелец (owner)")
+        return
+    
+    if action == "reload":
+        count = reload_admins()
+        if count is None:
+            await message.answer("❌ Не удалось прочитать базу, список админов прежний. Смотрите логи")
+            return
+        await message.answer(f"🔄 Список админов перезагружен. Всего: {count}")
+        return
+    
+    if len(parts) < 2 or not parts[1].lstrip("-").isdigit():
+        await message.answer(ADMIN_SUBCOMMANDS_HELP)
+        return
+    
+    target_id = int(parts[1])
+    
+    if action == "add":
+        username = parts[2].lstrip("@") if len(parts) > 2 else "no_username"
+        role = parts[3].lower() if len(parts) > 3 else ROLE_ADMIN
+        
+        if role not in ROLES:
+            await message.answer(f"❌ Неизвестная роль: {escape(role)}\n\nДоступно: {', '.join(ROLES)}")
+            return
+        
+        if add_admin(target_id, username, role, added_by=user_id):
+            await message.answer(
+                f"✅ Админ @{escape(username)} (ID: <code>{target_id}</code>) добавлен с ролью {role}"
+            )
+        else:
+            await message.answer("❌ Не удалось сохранить админа, смотрите логи")
+        return
+    
+    # action == "remove"
+    if target_id == user_id:
+        await message.answer("❌ Нельзя удалить самого себя")
+        return
+    
+    if remove_admin(target_id):
+        await message.answer(f"✅ Админ <code>{target_id}</code> удалён")
+    else:
+        await message.answer(f"❌ Админ <code>{target_id}</code> не найден")
+
+
+# ============================================================================
+# РЕЗЕРВНАЯ КОПИЯ БАЗЫ (/admin backup)
+# ============================================================================
+
+async def handle_backup_command(message: types.Message):
+    """
+    Снимает резервную копию базы и сообщает её размер и длительность.
+    Доступно любому админу: копия ничего не меняет в данных.
+    """
+    
+    logger.info(f"💾 /admin backup от {message.from_user.id}")
+    status = await message.answer("💾 Снимаю резервную копию базы...")
+    
+    try:
+        result = await create_backup()
+    except Exception as e:
+        await status.edit_text(f"❌ <b>Резервная копия не создана</b>\n\n{escape(e)}")
+        return
+    
+    await status.edit_text(
+        "✅ <b>Резервная копия создана</b>\n\n"
+        f"📁 Файл: <code>{escape(result['path'])}</code>\n"
+        f"📦 Размер: {result['size'] / 1024:.0f} КБ (база {result['db_size'] / 1024:.0f} КБ)\n"
+        f"⏱ Длительность: {result['duration']:.2f} с\n"
+        f"🗑 Удалено старых копий: {result['removed']}\n"
+        f"🗄 Скопировано архивов: {result['archives']}"
+    )
+
+
+# ============================================================================
+# ЗАЯВКИ ЗА ПЕРИОД (/admin history)
+# ============================================================================
+
+def _parse_date(value: str):
+    """Дата YYYY-MM-DD или None, если формат неверный."""
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").strftime("%Y-%m-%d")
+    except ValueError:
+        return None
+
+
+async def handle_history_command(message: types.Message, args: list[str]):
+    """
+    Отправляет CSV с заявками за период из основной базы и архивов.
+    Без второй даты - за один день.
+    """
+    
+    date_from = _parse_date(args[0]) if args else None
+    date_to = _parse_date(args[1]) if len(args) > 1 else date_from
+    if date_from is None or date_to is None or date_from > date_to:
+        await message.answer(ADMIN_SUBCOMMANDS_HELP)
+        return
+    
+    logger.info(f"🗄 /admin history {date_from}..{date_to} от {message.from_user.id}")
+    
+    try:
+        # Архивы открываются с диска - не блокируем цикл событий
+        rows = await asyncio.to_thread(get_requests_between, date_from, date_to)
+    except Exception as e:
+        logger.error(f"❌ Ошибка выгрузки заявок: {e}", exc_info=True)
+        await message.answer(f"❌ <b>Не удалось выгрузить заявки</b>\n\n{escape(e)}")
+        return
+    
+    if not rows:
+        await message.answer(f"📭 Заявок за {date_from} — {date_to} нет")
+        return
+    
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(REQUEST_COLUMNS)
+    writer.writerows(rows)
+    
+    await message.answer_document(
+        types.BufferedInputFile(buffer.getvalue().encode("utf-8-sig"), f"requests_{date_from}_{date_to}.csv"),
+        caption=f"🗄 Заявки за {date_from} — {date_to}: {len(rows)}",
+    )
+
+
+# ============================================================================
+# ПРОВЕРКА ПОСЛЕДНИХ ЗАЯВОК В ПАМЯТИ (/admin recent)
+# ============================================================================
+
+async def handle_recent_check_command(message: types.Message):
+    """
+    Сверяет буфер последних заявок с базой и перечитывает его при расхождении.
+    """
+    
+    logger.info(f"🔍 /admin recent от {message.from_user.id}")
+    problems = recent.verify()
+    
+    if not problems:
+        await message.answer("✅ Последние заявки в памяти совпадают с базой")
+        return
+    
+    count = recent.reload()
+    details = "\n".join(f"• {escape(problem)}" for problem in problems[:20])
+    await message.answer(
+        f"⚠️ <b>Расхождения с базой:</b> {len(problems)}\n\n{details}\n\n"
+        f"🔄 Буфер перечитан из базы ({count} заявок)"
+    )
+
+
+# ============================================================================
+# БЛОКИРОВКИ ЦИКЛА СОБЫТИЙ (/admin blocking)
+# ============================================================================
+
+async def handle_blocking_report_command(message: types.Message):
+    """
+    Отправляет сводку детектора блокировок и полный отчёт со стеками файлом.
+    """
+    
+    logger.info(f"🧱 /admin blocking от {message.from_user.id}")
+    await message.answer(diagnostics.report_text())
+    
+    detector = diagnostics.detector
+    if detector is not None and detector.offenders:
+        await message.answer_document(
+            types.BufferedInputFile(detector.report_json().encode("utf-8"), "blocking_report.json")
+        )
+
+
+# ============================================================================
+# ПЕРЕЧИТЫВАНИЕ НАСТРОЕК (/admin settings)
+# ============================================================================
+
+async def handle_settings_command(message: types.Message):
+    """
+    Перечитывает файл настроек (см. settings.py) и показывает текущие значения.
+    """
+    
+    logger.info(f"🔄 /admin settings от {message.from_user.id}")
+    
+    try:
+        changed = settings.reload()
+    except ValueError as e:
+        await message.answer(f"❌ <b>Настройки не применены</b>, работаем на прежних\n\n{escape(e)}")
+        return
+    
+    values = "\n".join(
+        f"• {name}: <code>{escape(value)}</code>" for name, value in settings.current().as_dict().items()
+    )
+    status = f"🔄 Изменено: {escape(', '.join(changed))}" if changed else "✅ Без изменений"
+    await message.answer(f"⚙️ <b>Настройки</b>\n\n{values}\n\n{status}")
@@ -0,0 +1,137 @@
+"""
+Обработчики рассылки для админов (/broadcast).
+
+Сценарий:
+1. Админ отправляет /broadcast
+2. Бот просит прислать сообщение для рассылки (текст, фото, что угодно)
+3. Админ выбирает: отправить копией или переслать
+4. Рассылка идёт в фоне (broadcaster.py), прогресс обновляется в одном сообщении
+"""
+
+import asyncio
+import logging
+from aiogram import types
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+
+import database
+from admins import is_admin
+from broadcaster import start_broadcast, cancel_broadcast, MODE_COPY, MODE_FORWARD
+
+logger = logging.getLogger(__name__)
+
+
+class BroadcastStates(StatesGroup):
+    """Состояния при подготовке рассылки."""
+
+    # Ждём сообщение, которое нужно разослать
+    waiting_for_message = State()
+
+    # Ждём выбор режима (копия / пересылка)
+    waiting_for_confirm = State()
+
+
+async def broadcast_command(message: types.Message, state: FSMContext):
+    """Команда /broadcast - начинает подготовку рассылки."""
+
+    user_id = message.from_user.id
+
+    if not is_admin(user_id):
+        await message.answer("❌ У вас нет доступа к рассылкам")
+        return
+
+    logger.info(f"📨 /broadcast от {user_id}")
+
+    keyboard = InlineKeyboardBuilder()
+    keyboard.button(text="❌ Отмена", callback_data="broadcast_abort")
+
+    await state.set_state(BroadcastStates.waiting_for_message)
+    await message.answer(
+        "📣 <b>Рассылка</b>\n\n"
+        "Пришли сообщение, которое нужно отправить всем пользователям бота.\n"
+        "Подойдёт текст, фото, видео или пересланный пост.",
+        reply_markup=keyboard.as_markup()
+    )
+
+
+async def broadcast_collect_message(message: types.Message, state: FSMContext):
+    """Получает сообщение для рассылки и спрашивает режим отправки."""
+
+    await state.update_data(
+        source_chat_id=message.chat.id,
+        source_message_id=message.message_id
+    )
+    await state.set_state(BroadcastStates.waiting_for_confirm)
+
+    keyboard = InlineKeyboardBuilder()
+    keyboard.button(text="📤 Отправить копией", callback_data=f"broadcast_start:{MODE_COPY}")
+    keyboard.button(text="↪️ Переслать", callback_data=f"broadcast_start:{MODE_FORWARD}")
+    keyboard.button(text="❌ Отмена", callback_data="broadcast_abort")
+    keyboard.adjust(1)
+
+    await message.reply(
+        "Сообщение получено. Как отправить его пользователям?",
+        reply_markup=keyboard.as_markup()
+    )
+
+
+async def button_broadcast_start(callback: types.CallbackQuery, state: FSMContext):
+    """Запускает рассылку в выбранном режиме."""
+
+    user_id = callback.from_user.id
+
+    if not is_admin(user_id):
+        await callback.answer("❌ Нет доступа", show_alert=True)
+        return
+
+    data = await state.get_data()
+    if await state.get_state() != BroadcastStates.waiting_for_confirm or "source_message_id" not in data:
+        await callback.answer("Рассылка уже запущена или отменена", show_alert=True)
+        return
+
+    mode = callback.data.split(":", 1)[1]
+    await state.clear()
+
+    # Это сообщение будет обновляться с прогрессом
+    status_message = await callback.message.answer("📣 Запускаю рассылку...")
+
+    broadcast_id = await asyncio.to_thread(
+        database.create_broadcast,
+        user_id, data["source_chat_id"], data["source_message_id"], mode,
+        status_message.chat.id, status_message.message_id
+    )
+
+    if broadcast_id is None:
+        await status_message.edit_text("❌ Не удалось создать рассылку, смотрите логи")
+    else:
+        start_broadcast(callback.bot, broadcast_id)
+        logger.info(f"📣 Админ {user_id} запустил рассылку #{broadcast_id} ({mode})")
+
+    await callback.answer()
+
+
+async def button_broadcast_abort(callback: types.CallbackQuery, state: FSMContext):
+    """Отменяет подготовку рассылки."""
+
+    await state.clear()
+    await callback.message.answer("Рассылка отменена")
+    await callback.answer()
+
+
+async def button_broadcast_cancel(callback: types.CallbackQuery):
+    """Останавливает уже идущую рассылку."""
+
+    user_id = callback.from_user.id
+
+    if not is_admin(user_id):
+        await callback.answer("❌ Нет доступа", show_alert=True)
+        return
+
+    broadcast_id = int(callback.data.split(":", 1)[1])
+
+    if await cancel_broadcast(broadcast_id):
+        logger.info(f"⏹ Админ {user_id} остановил рассылку #{broadcast_id}")
+        await callback.answer("Рассылка остановлена")
+    else:
+        await callback.answer("Рассылка уже завершена")
@@ -3,6 +3,9 @@
 
 Собирает ссылку на товар и сумму, затем отправляет уведомление менеджеру (если ID указан).
 Сохраняет заявки в базу данных и уведомляет админов.
+
+Корзина: несколько товаров одним заказом - все заявки сохраняются
+одной транзакцией с общим order_id и дают одно уведомление.
 """
 
 import logging
@@ -11,10 +14,20 @@ from aiogram.utils.keyboard import InlineKeyboardBuilder
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 
-from config import MANAGER_ID, MANAGER_USERNAME
-from database import save_request
-from admins import ADMINS
+from database import save_request, save_order, DuplicateRequestError, STATUS_OPEN
+import analytics
+import idempotency
+import recent
+import settings
+from admins import get_admins
 from handlers.subscription import check_subscription, send_subscription_required
+from handlers.admin import request_actions_keyboard
+from rates import rate_cache, currency_for_language
+from render import escape
+from texts import t, user_locale, Raw
+from tracing import traced
+from validation import validate_link, validate_amount, parse_cart_text
+from config import AMOUNT_MIN, AMOUNT_MAX, CART_MAX_ITEMS
 
 logger = logging.getLogger(__name__)
 
@@ -28,6 +41,9 @@ class RequestStates(StatesGroup):
     
     # Ждём сумму в юанях
     waiting_for_amount = State()
+    
+    # Собираем товары корзины (пары ссылка + сумма)
+    cart = State()
 
 
 async def button_request(callback: types.CallbackQuery, state: FSMContext):
@@ -46,24 +62,16 @@ async def button_request(callback: types.CallbackQuery, state: FSMContext):
         await send_subscription_required(callback)
         return
     
-    request_text = """🧾 <b>Оформление заявки</b>
-
-Отправь, пожалуйста:
-1️⃣ Ссылку на товар на BUFF
-2️⃣ Сумму в юанях (¥)
-
-Пример:
-<code>https://buff.163.com/goods/42542</code>
-<code>150</code>
-
-После этого я передам данные менеджеру @BuffinItMNG.
-Он попросит QR-код и оплатит покупку от китайского аккаунта."""
+    locale = user_locale(callback.from_user)
+    request_text = t("request.start", locale)
     
     # Отправляем сообщение (новое)
     await callback.message.answer(request_text)
     
     # Переводим пользователя в состояние ожидания ссылки
     await state.set_state(RequestStates.waiting_for_link)
+    # Язык нужен, если черновик истечёт и бот напомнит о нём (storage.py)
+    await state.update_data(locale=locale)
     
     logger.info(f"✅ Процесс оформления заявки начат")
     
@@ -87,10 +95,22 @@ async def collect_request_data(message: types.Message, state: FSMContext):
     if current_state is None:
         return
     
+    # === КОРЗИНА: несколько товаров ===
+    if current_state == RequestStates.cart:
+        await collect_cart_items(message, state)
+        return
+    
     # === ЭТАП 1: Сбор ссылки ===
     if current_state == RequestStates.waiting_for_link:
+        link, reason = validate_link(message.text)
+        if link is None:
+            # Остаёмся на этом шаге и сразу просим ссылку ещё раз
+            logger.info(f"🚫 Ссылка отклонена ({reason}) от {message.from_user.id}")
+            await message.answer(t("request.invalid_link", user_locale(message.from_user)))
+            return
+        
         # Сохраняем ссылку в контексте FSM
-        await state.update_data(link=message.text)
+        await state.update_data(link=link)
         
         # Переводим на следующий этап — сбор суммы
         await state.set_state(RequestStates.waiting_for_amount)
@@ -98,18 +118,22 @@ async def collect_request_data(message: types.Message, state: FSMContext):
         logger.info(f"📎 Ссылка получена от {message.from_user.id}")
         
         # Просим ввести сумму
-        await message.answer(
-            "✅ Ссылка получена!\n\n"
-            "Теперь отправь сумму в юанях (¥)\n\n"
-            "Пример: <code>150</code>"
-        )
+        await message.answer(t("request.link_received", user_locale(message.from_user)))
     
     # === ЭТАП 2: Сбор суммы ===
     elif current_state == RequestStates.waiting_for_amount:
         # Получаем сохранённую ссылку из контекста
         user_data = await state.get_data()
         link = user_data.get("link")
-        amount = message.text
+        locale = user_locale(message.from_user)
+        
+        # Проверяем сумму до любых запросов к базе и Telegram
+        amount_cny, reason = validate_amount(message.text)
+        if amount_cny is None:
+            logger.info(f"🚫 Сумма отклонена ({reason}) от {message.from_user.id}")
+            await message.answer(t("request.invalid_amount", locale, min=f"{AMOUNT_MIN:g}", max=f"{AMOUNT_MAX:g}"))
+            return
+        amount = message.text.strip()
         
         # Сохраняем данные пользователя
         user_id = message.from_user.id
@@ -120,34 +144,72 @@ async def collect_request_data(message: types.Message, state: FSMContext):
         
         logger.info(f"💳 Заявка готова от {user_id}: {amount} ¥")
         
-        # Сохраняем заявку в базу данных
-        save_request(user_id, username, amount, link)
+        # Повтор той же заявки (переотправка или повторная доставка апдейта):
+        # не сохраняем и не оповещаем менеджера ещё раз
+        keys = (
+            idempotency.message_key(message.chat.id, message.message_id),
+            idempotency.content_key(user_id, link, amount),
+        )
+        duplicate_id = idempotency.find_duplicate(*keys)
+        if duplicate_id is not None:
+            await message.answer(t("request.duplicate", locale, request_id=duplicate_id))
+            return
+        
+        # Мгновенный расчёт в валюте клиента по курсу из кэша (без запроса к провайдеру)
+        quote = rate_cache.quote(amount_cny, currency_for_language(message.from_user.language_code))
+        quote_line = ""
+        if quote:
+            quote_line = t("request.quote_line", locale, amount=quote.amount_text, rate=quote.rate_text)
+        
+        # Сохраняем заявку в базу данных (вместе с курсом, который увидел клиент)
+        try:
+            saved = save_request(
+                user_id, username, amount, link,
+                rate=quote.rate if quote else None,
+                quote_currency=quote.currency if quote else None,
+                idempotency_key=idempotency.storage_key(user_id, link, amount)
+            )
+        except DuplicateRequestError as e:
+            # Кэш пуст (например, после рестарта), но база уже знает эту заявку
+            idempotency.duplicates_total.inc(source="db")
+            idempotency.remember(e.request_id, *keys)
+            logger.info(f"♻️ Повтор заявки #{e.request_id} отклонён базой")
+            await message.answer(t("request.duplicate", locale, request_id=e.request_id))
+            return
+        
+        request_id = None
+        if saved is not None:
+            request_id, created_at = saved
+            idempotency.remember(request_id, *keys)
+            recent.add(request_id, user_id, username, amount, link, created_at)
+            analytics.invalidate()
         
         # Отправляем подтверждение пользователю
         await message.answer(
-            "✅ <b>Заявка создана!</b>\n\n"
-            f"💳 <b>Сумма:</b> {amount} ¥\n"
-            f"🔗 <b>Ссылка:</b> {link}\n\n"
-            f"Менеджер <code>@{MANAGER_USERNAME}</code> свяжется с тобой в ближайшее время.\n"
-            "Будь онлайн — QR-код действует ограниченное время."
+            t("request.created", locale, amount=amount, link=link, quote_line=Raw(quote_line))
         )
         
         # Отправляем уведомление менеджеру (если ID указан)
-        if MANAGER_ID:
+        if settings.current().manager_id:
             await send_notification_to_manager(
                 user_id=user_id,
                 username=username,
                 amount=amount,
-                link=link
+                link=link,
+                request_id=request_id,
+                quote=quote,
+                bot=message.bot
             )
         else:
             logger.warning("⚠️  MANAGER_ID не установлен. Уведомление менеджеру не отправлено.")
         
         # Отправляем уведомление всем админам
-        await send_notifications_to_admins(user_id, username, amount, link)
+        await send_notifications_to_admins(user_id, username, amount, link, request_id, bot=message.bot)
 
 
-async def send_notification_to_manager(user_id: int, username: str, amount: str, link: str):
+@traced("notify.manager")
+async def send_notification_to_manager(user_id: int, username: str, amount: str, link: str,
+                                       request_id: int = None, quote=None, bot: Bot = None):
     """
     Отправляет уведомление менеджеру о новой заявке.
     
@@ -156,41 +218,52 @@ async def send_notification_to_manager(user_id: int, username: str, amount: str,
         username: Username пользователя в Telegram
         amount: Сумма в юанях
         link: Ссылка на товар
+        request_id: ID заявки в БД (для кнопок смены статуса)
+        quote: Расчёт в валюте клиента, который он увидел (rates.Quote)
+        bot: Бот апдейта (общая сессия, повторы, трассировка); без него создаётся отдельный
     """
     
+    own_bot = bot is None
+    snapshot = settings.current()
+    
     try:
-        # Создаём экземпляр бота для отправки уведомления
-        from config import BOT_TOKEN
-        bot = Bot(token=BOT_TOKEN)
+        if own_bot:
+            # Создаём экземпляр бота для отправки уведомления
+            from config import BOT_TOKEN
+            bot = Bot(token=BOT_TOKEN)
         
         # Формируем текст уведомления для менеджера
-        notification_text = f"""📥 <b>Новая заявка с BUFF Pay</b>
+        notification_text = f"""📥 <b>Новая заявка с BUFF Pay</b>{f" #{request_id}" if request_id else ""}
 
-👤 <b>Пользователь:</b> @{username}
+👤 <b>Пользователь:</b> @{escape(username)}
 🆔 <b>ID:</b> <code>{user_id}</code>
-💳 <b>Сумма:</b> <code>{amount}</code> ¥
+💳 <b>Сумма:</b> <code>{escape(amount)}</code> ¥{f" ({quote.format()})" if quote else ""}
 🔗 <b>Ссылка:</b>
-<code>{link}</code>
+<code>{escape(link)}</code>
 
-⏰ <b>Действие:</b> Свяжись через @BuffinItMNG для запроса QR-кода."""
+⏰ <b>Действие:</b> Свяжись через @{snapshot.manager_username} для запроса QR-кода."""
         
         # Отправляем уведомление менеджеру
         await bot.send_message(
-            chat_id=int(MANAGER_ID),
+            chat_id=snapshot.manager_id,
             text=notification_text,
-            parse_mode="HTML"
+            parse_mode="HTML",
+            reply_markup=request_actions_keyboard(request_id, STATUS_OPEN) if request_id else None
         )
         
         logger.info(f"🔔 Менеджер оповещён о заявке от @{username}")
         
-        # Закрываем сессию бота
-        await bot.session.close()
+        # Закрываем сессию бота (только созданного здесь)
+        if own_bot:
+            await bot.session.close()
         
     except Exception as e:
         logger.error(f"❌ Ошибка при отправке уведомления менеджеру: {e}", exc_info=True)
 
 
-async def send_notifications_to_admins(user_id: int, username: str, amount: str, link: str):
+@traced("notify.admins")
+async def send_notifications_to_admins(user_id: int, username: str, amount: str, link: str,
+                                       request_id: int = None, bot: Bot = None):
     """
     Отправляет уведомления всем админам о новой заявке.
     
@@ -199,43 +272,278 @@ async def send_notifications_to_admins(user_id: int, username: str, amount: str,
         username: Username пользователя в Telegram
         amount: Сумма в юанях
         link: Ссылка на товар
+        request_id: ID заявки в БД (для кнопок смены статуса)
+        bot: Бот апдейта (общая сессия, повторы, трассировка); без него создаётся отдельный
     """
     
+    admins = get_admins()
+    own_bot = bot is None
+    
     # Если нет админов - выходим
-    if not ADMINS:
+    if not admins:
         logger.warning("⚠️  Список админов пуст. Уведомления не отправлены.")
         return
     
     try:
-        # Создаём экземпляр бота для отправки уведомлений
-        from config import BOT_TOKEN
-        bot = Bot(token=BOT_TOKEN)
+        if own_bot:
+            # Создаём экземпляр бота для отправки уведомлений
+            from config import BOT_TOKEN
+            bot = Bot(token=BOT_TOKEN)
         
         # Формируем текст уведомления для админов
-        notification_text = f"""🔔 <b>НОВАЯ ЗАЯВКА</b>
+        notification_text = f"""🔔 <b>НОВАЯ ЗАЯВКА</b>{f" #{request_id}" if request_id else ""}
 
-👤 <b>Пользователь:</b> @{username}
+👤 <b>Пользователь:</b> @{escape(username)}
 🆔 <b>ID:</b> <code>{user_id}</code>
-💰 <b>Сумма:</b> {amount} ¥
+💰 <b>Сумма:</b> {escape(amount)} ¥
 🔗 <b>Ссылка:</b>
-{link}
+{escape(link)}
 
 📊 Проверьте админ-панель: /admin"""
         
         # Отправляем уведомление каждому админу
-        for admin_id, admin_username in ADMINS:
+        for admin_id, admin_username, _ in admins:
             try:
                 await bot.send_message(
                     chat_id=admin_id,
                     text=notification_text,
-                    parse_mode="HTML"
+                    parse_mode="HTML",
+                    reply_markup=request_actions_keyboard(request_id, STATUS_OPEN) if request_id else None
                 )
                 logger.info(f"🔔 Админ @{admin_username} (ID: {admin_id}) оповещён о заявке")
             except Exception as e:
                 logger.error(f"❌ Не удалось отправить уведомление админу @{admin_username}: {e}")
         
-        # Закрываем сессию бота
-        await bot.session.close()
+        # Закрываем сессию бота (только созданного здесь)
+        if own_bot:
+            await bot.session.close()
         
     except Exception as e:
         logger.error(f"❌ Ошибка при отправке уведомлений админам: {e}", exc_info=True)
+
+
+# ============================================================================
+# КОРЗИНА (НЕСКОЛЬКО ТОВАРОВ ОДНИМ ЗАКАЗОМ)
+# ============================================================================
+
+def cart_keyboard(locale: str):
+    """Кнопки под корзиной: оформить заказ и очистить."""
+    keyboard = InlineKeyboardBuilder()
+    keyboard.button(text=t("cart.button.confirm", locale), callback_data="cart_confirm")
+    keyboard.button(text=t("cart.button.clear", locale), callback_data="cart_clear")
+    keyboard.adjust(1)
+    return keyboard.as_markup()
+
+
+def _cart_total(items: list) -> float:
+    return sum(amount for _, _, amount in items)
+
+
+def render_cart(items: list, locale: str, pending_link: str = None) -> str:
+    """Текст корзины: товары, итог и ссылка, ждущая сумму."""
+    lines = [
+        t("cart.item", locale, number=number, link=link, amount=amount_text)
+        for number, (link, amount_text, _) in enumerate(items, start=1)
+    ]
+    text = t(
+        "cart.summary", locale,
+        items=Raw("\n".join(lines) or t("cart.no_items", locale)),
+        count=len(items), max=CART_MAX_ITEMS, total=f"{_cart_total(items):g}"
+    )
+    if pending_link:
+        text += "\n\n" + t("cart.pending_link", locale, link=pending_link)
+    return text
+
+
+def _cart_problem(line: int, field: str, locale: str) -> str:
+    """Строка об ошибке: что не так (field: link, amount, cart) и в какой строке сообщения."""
+    problem = t(
+        f"cart.problem.{field}", locale,
+        min=f"{AMOUNT_MIN:g}", max=f"{AMOUNT_MAX:g}", limit=CART_MAX_ITEMS
+    )
+    return t("cart.problem", locale, line=line, problem=Raw(problem)) if line else problem
+
+
+async def button_cart(callback: types.CallbackQuery, state: FSMContext):
+    """
+    Обработчик кнопки 'Несколько товаров': открывает пустую корзину.
+    """
+    
+    logger.info(f"📨 Кнопка 'cart' от {callback.from_user.id}")
+    
+    # Подписку проверяем один раз на весь заказ
+    is_subscribed = await check_subscription(callback.from_user.id, callback.bot)
+    if not is_subscribed:
+        await send_subscription_required(callback)
+        return
+    
+    locale = user_locale(callback.from_user)
+    await callback.message.answer(t("cart.start", locale, max=CART_MAX_ITEMS))
+    
+    await state.set_state(RequestStates.cart)
+    await state.set_data({"locale": locale, "items": [], "pending_link": None})
+    
+    await callback.answer()
+
+
+async def collect_cart_items(message: types.Message, state: FSMContext):
+    """
+    Добавляет в корзину товары из сообщения (по одному на строку).
+    Неверные строки не добавляются, о них сразу сообщаем.
+    """
+    
+    data = await state.get_data()
+    locale = data.get("locale") or user_locale(message.from_user)
+    items = [tuple(item) for item in data.get("items", [])]
+    
+    parsed, errors, pending_link = parse_cart_text(message.text, data.get("pending_link"))
+    
+    free = CART_MAX_ITEMS - len(items)
+    if len(parsed) > free:
+        errors.append((0, "cart", "limit"))
+        parsed = parsed[:max(free, 0)]
+    items += parsed
+    
+    await state.update_data(items=[list(item) for item in items], pending_link=pending_link)
+    logger.info(f"🛒 Корзина {message.from_user.id}: +{len(parsed)}, всего {len(items)}, ошибок {len(errors)}")
+    
+    text = render_cart(items, locale, pending_link)
+    if errors:
+        problems = "\n".join(_cart_problem(line, field, locale) for line, field, _ in errors)
+        text = t("cart.errors", locale, problems=Raw(problems)) + "\n\n" + text
+    
+    await message.answer(text, reply_markup=cart_keyboard(locale) if items else None)
+
+
+async def button_cart_clear(callback: types.CallbackQuery, state: FSMContext):
+    """Очищает корзину (остаёмся в режиме корзины)."""
+    
+    if await state.get_state() != RequestStates.cart:
+        await callback.answer()
+        return
+    
+    locale = user_locale(callback.from_user)
+    await state.update_data(items=[], pending_link=None)
+    await callback.message.edit_text(t("cart.cleared", locale))
+    await callback.answer()
+
+
+async def button_cart_confirm(callback: types.CallbackQuery, state: FSMContext):
+    """
+    Оформляет заказ: все товары корзины одной транзакцией и одно уведомление.
+    """
+    
+    locale = user_locale(callback.from_user)
+    data = await state.get_data()
+    items = [tuple(item) for item in data.get("items", [])]
+    
+    if await state.get_state() != RequestStates.cart or not items:
+        await callback.answer(t("cart.empty", locale), show_alert=True)
+        return
+    
+    user_id = callback.from_user.id
+    username = callback.from_user.username or "не указано"
+    
+    await state.clear()
+    await callback.answer()
+    
+    # Повтор того же заказа (например, корзину собрали заново с теми же товарами)
+    links = "\n".join(link for link, _, _ in items)
+    amounts = "\n".join(amount_text for _, amount_text, _ in items)
+    keys = (idempotency.content_key(user_id, links, amounts, kind="order"),)
+    duplicate_id = idempotency.find_duplicate(*keys)
+    if duplicate_id is not None:
+        await callback.message.answer(t("cart.duplicate", locale, order_id=duplicate_id))
+        return
+    
+    # Один расчёт на итоговую сумму; курс сохраняется в каждой заявке заказа
+    total = _cart_total(items)
+    quote = rate_cache.quote(total, currency_for_language(callback.from_user.language_code))
+    quote_line = ""
+    if quote:
+        quote_line = t("request.quote_line", locale, amount=quote.amount_text, rate=quote.rate_text)
+    
+    try:
+        saved = save_order(
+            user_id, username,
+            [
+                (amount_text, link, quote.rate if quote else None, quote.currency if quote else None)
+                for link, amount_text, _ in items
+            ],
+            idempotency_key=idempotency.storage_key(user_id, links, amounts, kind="order")
+        )
+    except DuplicateRequestError as e:
+        idempotency.duplicates_total.inc(source="db")
+        idempotency.remember(e.request_id, *keys)
+        await callback.message.answer(t("cart.duplicate", locale, order_id=e.request_id))
+        return
+    
+    if saved is None:
+        await callback.message.answer(t("cart.failed", locale))
+        return
+    
+    order_id, request_ids, created_at = saved
+    idempotency.remember(order_id, *keys)
+    for request_id, (link, amount_text, _) in zip(request_ids, items):
+        recent.add(request_id, user_id, username, amount_text, link, created_at)
+    analytics.invalidate()
+    
+    await callback.message.answer(t(
+        "cart.created", locale,
+        order_id=order_id, count=len(items), total=f"{total:g}", quote_line=Raw(quote_line)
+    ))
+    
+    await send_order_notifications(
+        order_id, request_ids, user_id, username, items, total, quote=quote, bot=callback.bot
+    )
+
+
+@traced("notify.order")
+async def send_order_notifications(order_id: int, request_ids: list[int], user_id: int, username: str,
+                                   items: list, total: float, quote=None, bot: Bot = None):
+    """
+    Одно уведомление о заказе менеджеру и каждому админу.
+    
+    Args:
+        order_id: ID заказа
+        request_ids: ID заявок заказа (в порядке товаров)
+        user_id: ID пользователя в Telegram
+        username: Username пользователя в Telegram
+        items: Товары [(ссылка, сумма текстом, сумма)]
+        total: Итоговая сумма в юанях
+        quote: Расчёт итоговой суммы в валюте клиента (rates.Quote)
+        bot: Бот апдейта
+    """
+    
+    lines = [
+        f"{number}. <code>#{request_id}</code> — <code>{escape(amount_text)}</code> ¥\n{escape(link)}"
+        for number, (request_id, (link, amount_text, _)) in enumerate(zip(request_ids, items), start=1)
+    ]
+    notification_text = f"""🛒 <b>НОВЫЙ ЗАКАЗ #{order_id}</b> ({len(items)} шт.)
+
+👤 <b>Пользователь:</b> @{escape(username)}
+🆔 <b>ID:</b> <code>{user_id}</code>
+💳 <b>Итого:</b> <code>{total:g}</code> ¥{f" ({quote.format()})" if quote else ""}
+
+""" + "\n".join(lines) + """
+
+📥 Взять в работу, отметить оплату или отменить — в очереди открытых заявок (кнопка ниже)"""
+    
+    # Кнопки действий - под каждой заявкой в очереди: одно сообщение на весь заказ
+    # не может менять статус отдельных заявок
+    keyboard = InlineKeyboardBuilder()
+    keyboard.button(text="📥 Открытые заявки", callback_data="admin_open")
+    
+    recipients = [(admin_id, admin_username) for admin_id, admin_username, _ in get_admins()]
+    manager_id = settings.current().manager_id
+    if manager_id and manager_id not in {admin_id for admin_id, _ in recipients}:
+        recipients.insert(0, (manager_id, "manager"))
+    
+    for chat_id, name in recipients:
+        try:
+            await bot.send_message(
+                chat_id=chat_id, text=notification_text, parse_mode="HTML", reply_markup=keyboard.as_markup()
+            )
+            logger.info(f"🔔 @{name} (ID: {chat_id}) оповещён о заказе #{order_id}")
+        except Exception as e:
+            logger.error(f"❌ Не удалось отправить уведомление о заказе @{name}: {e}")
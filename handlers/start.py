@@ -9,10 +9,26 @@ import logging
 from aiogram import types
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from handlers.subscription import check_subscription, send_subscription_required
+from users import touch_user
+from texts import t, user_locale
 
 logger = logging.getLogger(__name__)
 
 
+def main_menu_keyboard(locale: str):
+    """
+    Кнопки главного меню на языке пользователя.
+    
+    Args:
+        locale: Код локали (см. texts.locale_for)
+    """
+    keyboard = InlineKeyboardBuilder()
+    for action in ("register", "send_link", "request", "cart", "how_it_works", "support"):
+        keyboard.button(text=t(f"menu.button.{action}", locale), callback_data=action)
+    keyboard.adjust(1)
+    return keyboard.as_markup()
+
+
 # ============================================================================
 # ГЛАВНОЕ МЕНЮ
 # ============================================================================
@@ -25,6 +41,9 @@ async def start_command(message: types.Message):
     # Проверяем подписку на канал
     is_subscribed = await check_subscription(message.from_user.id, message.bot)
     
+    # Запоминаем пользователя и результат проверки (в БД уйдёт пачкой)
+    touch_user(message.from_user.id, message.from_user.username, subscribed=is_subscribed)
+    
     if not is_subscribed:
         # Если не подписан - показываем сообщение о необходимости подписки
         logger.info(f"🔒 Пользователь {message.from_user.id} не подписан на канал")
@@ -34,25 +53,11 @@ async def start_command(message: types.Message):
     # Если подписан - показываем главное меню
     logger.info(f"✅ Пользователь {message.from_user.id} подписан, показываем меню")
     
-    text = """💎 <b>BUFF Pay</b> — покупай скины в 2 раза дешевле, чем в Steam
-
-Если ты покупаешь через Steam — ты переплачиваешь до 40%.
-В Китае есть официальный маркетплейс BUFF (buff.163.com), где те же скины стоят на треть дешевле.
-
-Мы помогаем тебе купить там, где ты не можешь сам.
-
-📍 <b>Выбери что тебе нужно:</b>"""
-    
-    keyboard = InlineKeyboardBuilder()
-    keyboard.button(text="🪪 Как зарегистрироваться", callback_data="register")
-    keyboard.button(text="🔗 Как скинуть ссылку", callback_data="send_link")
-    keyboard.button(text="🧾 Оформить заявку", callback_data="request")
-    keyboard.button(text="❓ Как это работает", callback_data="how_it_works")
-    keyboard.button(text="💬 Поддержка", callback_data="support")
-    keyboard.adjust(1)
+    locale = user_locale(message.from_user)
+    text = t("menu.welcome", locale)
     
     try:
-        await message.answer(text, reply_markup=keyboard.as_markup())
+        await message.answer(text, reply_markup=main_menu_keyboard(locale))
         logger.info(f"✅ Главное меню отправлено")
     except Exception as e:
         logger.error(f"❌ Ошибка в start_command: {e}", exc_info=True)
@@ -73,33 +78,12 @@ async def button_register(callback: types.CallbackQuery):
         await send_subscription_required(callback)
         return
     
-    text = """🪪 <b>Как зарегистрироваться на BUFF (buff.163.com)</b>
-
-1️⃣ Зайди на сайт <code>https://buff.163.com</code>
-
-2️⃣ Нажми «Login via Steam» (кнопка с логотипом Steam)
-
-3️⃣ Авторизуйся через свой Steam-аккаунт
-
-4️⃣ После входа BUFF попросит подтвердить номер телефона:
-   • Выбери страну 🇰🇿 Казахстан
-   • Введи свой номер
-   • Убедись что VPN выключен
-   • Подтверди SMS-код
-
-5️⃣ После этого аккаунт BUFF будет создан!
-
-✅ <b>Теперь ты можешь спокойно:</b>
-   • Смотреть и покупать скины
-   • На сайте есть русская версия интерфейса
-   • Цены отображаются в юанях
-   • Можно добавить в «Избранное» интересующие товары
-
-<b>Следующий шаг:</b> Нажми «Как скинуть ссылку», чтобы узнать как найти и отправить скин"""
+    locale = user_locale(callback.from_user)
+    text = t("guide.register", locale)
     
     keyboard = InlineKeyboardBuilder()
-    keyboard.button(text="🔗 Как скинуть ссылку", callback_data="send_link")
-    keyboard.button(text="⬅️ Назад в меню", callback_data="back_to_start")
+    keyboard.button(text=t("menu.button.send_link", locale), callback_data="send_link")
+    keyboard.button(text=t("menu.button.back", locale), callback_data="back_to_start")
     keyboard.adjust(1)
     
     try:
@@ -126,26 +110,12 @@ async def button_send_link(callback: types.CallbackQuery):
         await send_subscription_required(callback)
         return
     
-    text = """🔗 <b>Как скинуть ссылку на товар с BUFF</b>
-
-1️⃣ Зайди на <code>https://buff.163.com</code> и выбери нужный скин
-
-2️⃣ Нажми на товар, чтобы открыть его страницу
-
-3️⃣ Скопируй ссылку из адресной строки
-
-Пример:
-<code>https://buff.163.com/goods/42542</code>
-
-4️⃣ Отправь эту ссылку и сумму в юанях в этого бота
-
-5️⃣ Менеджер @BuffinItMNG напишет тебе и попросит QR-код для оплаты
-
-<b>Готов отправить заявку?</b> Нажми кнопку ниже 👇"""
+    locale = user_locale(callback.from_user)
+    text = t("guide.send_link", locale)
     
     keyboard = InlineKeyboardBuilder()
-    keyboard.button(text="🧾 Оформить заявку", callback_data="request")
-    keyboard.button(text="⬅️ Назад в меню", callback_data="back_to_start")
+    keyboard.button(text=t("menu.button.request", locale), callback_data="request")
+    keyboard.button(text=t("menu.button.back", locale), callback_data="back_to_start")
     keyboard.adjust(1)
     
     try:
@@ -172,26 +142,11 @@ async def button_how_it_works(callback: types.CallbackQuery):
         await send_subscription_required(callback)
         return
     
-    text = """⚙️ <b>Как это работает</b>
-
-1️⃣ Ты сам заходишь на сайт <code>buff.163.com</code>
-
-2️⃣ Выбираешь скин, доходишь до оплаты — BUFF покажет QR-код
-
-3️⃣ Возвращаешься сюда и жмёшь «Оформить заявку»
-
-4️⃣ Вводишь сумму и ссылку на товар
-
-5️⃣ Мы переадресуем тебя менеджеру @BuffinItMNG
-
-6️⃣ Менеджер попросит QR-код и оплатит покупку через китайскую платёжную систему
-
-7️⃣ Скин падает прямо в твой инвентарь
-
-💰 <b>Средняя экономия — 30–40% по сравнению со Steam</b>"""
+    locale = user_locale(callback.from_user)
+    text = t("guide.how_it_works", locale)
     
     keyboard = InlineKeyboardBuilder()
-    keyboard.button(text="⬅️ Назад в меню", callback_data="back_to_start")
+    keyboard.button(text=t("menu.button.back", locale), callback_data="back_to_start")
     keyboard.adjust(1)
     
     try:
@@ -218,16 +173,11 @@ async def button_support(callback: types.CallbackQuery):
         await send_subscription_required(callback)
         return
     
-    text = """📞 <b>Поддержка</b>
-
-Если что-то непонятно или нужна срочная помощь — пиши менеджеру:
-
-<code>@BuffinItMNG</code>
-
-Он ответит на все вопросы и поможет с заявкой."""
+    locale = user_locale(callback.from_user)
+    text = t("support", locale)
     
     keyboard = InlineKeyboardBuilder()
-    keyboard.button(text="⬅️ Назад в меню", callback_data="back_to_start")
+    keyboard.button(text=t("menu.button.back", locale), callback_data="back_to_start")
     keyboard.adjust(1)
     
     try:
@@ -254,20 +204,11 @@ async def button_back_to_start(callback: types.CallbackQuery):
         await send_subscription_required(callback)
         return
     
-    text = """💎 <b>BUFF Pay</b> — главное меню
-
-Выбери что тебе нужно:"""
-    
-    keyboard = InlineKeyboardBuilder()
-    keyboard.button(text="🪪 Как зарегистрироваться", callback_data="register")
-    keyboard.button(text="🔗 Как скинуть ссылку", callback_data="send_link")
-    keyboard.button(text="🧾 Оформить заявку", callback_data="request")
-    keyboard.button(text="❓ Как это работает", callback_data="how_it_works")
-    keyboard.button(text="💬 Поддержка", callback_data="support")
-    keyboard.adjust(1)
+    locale = user_locale(callback.from_user)
+    text = t("menu.main", locale)
     
     try:
-        await callback.message.answer(text, reply_markup=keyboard.as_markup())
+        await callback.message.answer(text, reply_markup=main_menu_keyboard(locale))
         logger.info(f"✅ Вернулись в меню")
     except Exception as e:
         logger.error(f"❌ Ошибка в button_back_to_start: {e}", exc_info=True)
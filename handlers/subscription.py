@@ -5,46 +5,76 @@
 Если не подписан - показывает красивое сообщение про безопасность.
 """
 
+import asyncio
 import logging
+import time
+from collections import OrderedDict
 from aiogram import types, Bot
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter, TelegramServerError
 from aiogram.utils.keyboard import InlineKeyboardBuilder
-from config import REQUIRED_CHANNEL, REQUIRED_CHANNEL_ID
+import settings
+from config import SUBSCRIPTION_CACHE_SIZE
+from database import get_recent_user_ids
+from lifecycle import on_startup, on_shutdown
+from middlewares.bot_api import CircuitOpenError
+from texts import t, user_locale
 
 logger = logging.getLogger(__name__)
 
+# Кэш положительных проверок подписки: user_id -> время проверки (monotonic).
+# Отрицательные результаты не кэшируются, чтобы только что подписавшийся
+# пользователь сразу проходил проверку.
+_subscribed_at: OrderedDict[int, float] = OrderedDict()
 
-async def send_main_menu(message: types.Message):
+# Последний полученный от Telegram ответ (без срока годности): user_id -> подписан ли.
+# Используется, только когда Telegram недоступен (см. check_subscription).
+_last_known: OrderedDict[int, bool] = OrderedDict()
+
+# Оба словаря ограничены SUBSCRIPTION_CACHE_SIZE записями: порядок - от давно
+# проверенных к недавним, лишние вытесняются с начала (см. _remember)
+
+# Сбои, при которых ответа о подписке нет вовсе (в отличие от 400 Bad Request)
+UNAVAILABLE_ERRORS = (CircuitOpenError, TelegramNetworkError, TelegramServerError, TelegramRetryAfter)
+
+# Сколько недавних пользователей проверять при прогреве кэша
+PREFILL_USERS_LIMIT = 50
+
+# Фоновый прогрев кэша (идёт параллельно с polling)
+_prefill_task: asyncio.Task = None
+
+
+def _remember(user_id: int, subscribed: bool):
+    """Запоминает ответ Telegram и вытесняет самых давно проверенных пользователей."""
+    _last_known[user_id] = subscribed
+    _last_known.move_to_end(user_id)
+    if subscribed:
+        _subscribed_at[user_id] = time.monotonic()
+        _subscribed_at.move_to_end(user_id)
+    else:
+        _subscribed_at.pop(user_id, None)
+
+    for cache in (_last_known, _subscribed_at):
+        while len(cache) > SUBSCRIPTION_CACHE_SIZE:
+            cache.popitem(last=False)
+
+
+async def send_main_menu(message: types.Message, locale: str):
     """
     Отправляет главное меню бота.
     
     Args:
         message: Объект сообщения для отправки меню
+        locale: Язык пользователя (см. texts.locale_for)
     """
-    
-    text = """💎 <b>BUFF Pay</b> — покупай скины в 2 раза дешевле, чем в Steam
-
-Если ты покупаешь через Steam — ты переплачиваешь до 40%.
-В Китае есть официальный маркетплейс BUFF (buff.163.com), где те же скины стоят на треть дешевле.
-
-Мы помогаем тебе купить там, где ты не можешь сам.
-
-📍 <b>Выбери что тебе нужно:</b>"""
-    
-    keyboard = InlineKeyboardBuilder()
-    keyboard.button(text="🪪 Как зарегистрироваться", callback_data="register")
-    keyboard.button(text="🔗 Как скинуть ссылку", callback_data="send_link")
-    keyboard.button(text="🧾 Оформить заявку", callback_data="request")
-    keyboard.button(text="❓ Как это работает", callback_data="how_it_works")
-    keyboard.button(text="💬 Поддержка", callback_data="support")
-    keyboard.adjust(1)
+    from handlers.start import main_menu_keyboard
     
     try:
         # Используем bot.send_message для надёжности
         bot = message.bot
         await bot.send_message(
             chat_id=message.chat.id,
-            text=text,
-            reply_markup=keyboard.as_markup(),
+            text=t("menu.welcome", locale),
+            reply_markup=main_menu_keyboard(locale),
             parse_mode="HTML"
         )
         logger.info(f"✅ Главное меню отправлено")
@@ -52,21 +82,30 @@ async def send_main_menu(message: types.Message):
         logger.error(f"❌ Ошибка отправки главного меню: {e}", exc_info=True)
 
 
-async def check_subscription(user_id: int, bot: Bot) -> bool:
+async def check_subscription(user_id: int, bot: Bot, use_cache: bool = True) -> bool:
     """
     Проверяет подписан ли пользователь на обязательный канал.
     
     Args:
         user_id: ID пользователя Telegram
         bot: Экземпляр бота
+        use_cache: Разрешить ответ из кэша (False - всегда спрашивать Telegram)
         
     Returns:
-        True если подписан, False если нет
+        True если подписан, False если нет.
+        Если Telegram недоступен - последний известный результат (новых пользователей пропускаем)
     """
+    snapshot = settings.current()
+    
+    if use_cache and snapshot.subscription_cache_ttl > 0:
+        checked_at = _subscribed_at.get(user_id)
+        if checked_at is not None and time.monotonic() - checked_at < snapshot.subscription_cache_ttl:
+            return True
+    
     try:
         # Получаем информацию о пользователе в канале
         member = await bot.get_chat_member(
-            chat_id=REQUIRED_CHANNEL_ID,
+            chat_id=snapshot.required_channel_id,
             user_id=user_id
         )
         
@@ -74,11 +113,21 @@ async def check_subscription(user_id: int, bot: Bot) -> bool:
         # restricted и kicked - не подписан
         if member.status in ["member", "administrator", "creator"]:
             logger.info(f"✅ Пользователь {user_id} подписан на канал")
+            _remember(user_id, True)
             return True
         else:
             logger.info(f"❌ Пользователь {user_id} НЕ подписан (статус: {member.status})")
+            _remember(user_id, False)
             return False
-            
+    
+    except UNAVAILABLE_ERRORS as e:
+        # Telegram не ответил (повторы исчерпаны или выключатель разомкнут).
+        # Не отправляем платящего клиента на экран подписки из-за сбоя сети:
+        # берём последний известный ответ, а нового пользователя пропускаем.
+        result = _last_known.get(user_id, True)
+        logger.warning(f"⚠️ Подписка {user_id} не проверена ({e}), используем {result}")
+        return result
+    
     except Exception as e:
         # Если ошибка (например пользователь не в канале) - считаем что не подписан
         logger.warning(f"⚠️ Ошибка проверки подписки для {user_id}: {e}")
@@ -108,26 +157,21 @@ async def send_subscription_required(message_or_callback):
     logger.info(f"🔒 Показываем требование подписки для {user_id}")
     
     # Строгое сообщение про безопасность
-    text = """<b>Обязательная подписка</b>
-
-Для защиты от фейковых ботов и мошенников необходимо подписаться на официальный канал {channel}
-
-В канале публикуются официальные новости, информация о безопасности и предупреждения о мошенниках.
-
-После подписки нажмите кнопку "Проверить подписку".""".format(channel=REQUIRED_CHANNEL)
+    locale = user_locale(message_or_callback.from_user)
+    text = t("subscription.required", locale)
     
     # Создаем кнопки
     keyboard = InlineKeyboardBuilder()
     
     # Кнопка подписки на канал
     keyboard.button(
-        text="Подписаться на канал",
-        url=f"https://t.me/{REQUIRED_CHANNEL.replace('@', '')}"
+        text=t("subscription.button.subscribe", locale),
+        url=f"https://t.me/{settings.current().required_channel.replace('@', '')}"
     )
     
     # Кнопка проверки подписки
     keyboard.button(
-        text="Проверить подписку",
+        text=t("subscription.button.check", locale),
         callback_data="check_subscription"
     )
     
@@ -147,7 +191,7 @@ async def send_subscription_required(message_or_callback):
         # Если это callback - отвечаем на него
         if isinstance(message_or_callback, types.CallbackQuery):
             await message_or_callback.answer(
-                "Требуется подписка на канал",
+                t("subscription.alert.required", locale),
                 show_alert=True
             )
             
@@ -162,29 +206,76 @@ async def button_check_subscription(callback: types.CallbackQuery):
     """
     
     user_id = callback.from_user.id
+    locale = user_locale(callback.from_user)
     logger.info(f"🔍 Проверка подписки для пользователя {user_id}")
     
-    # Проверяем подписку
-    is_subscribed = await check_subscription(user_id, callback.bot)
+    # Проверяем подписку (мимо кэша - пользователь только что нажал кнопку)
+    is_subscribed = await check_subscription(user_id, callback.bot, use_cache=False)
     
     if is_subscribed:
         # Пользователь подписан - показываем главное меню
         logger.info(f"✅ Пользователь {user_id} подписан, показываем меню")
         
-        await callback.answer("Подписка подтверждена", show_alert=False)
+        await callback.answer(t("subscription.alert.confirmed", locale), show_alert=False)
         
         # Отправляем главное меню напрямую
-        await send_main_menu(callback.message)
+        await send_main_menu(callback.message, locale)
         
     else:
         # Пользователь еще не подписан
         logger.warning(f"❌ Пользователь {user_id} все еще не подписан")
         
         await callback.answer(
-            "Подписка не обнаружена. Подпишитесь на канал и повторите попытку.",
+            t("subscription.alert.not_found", locale),
             show_alert=True
         )
         
         # Отправляем сообщение о подписке снова
         await send_subscription_required(callback)
 
+
+@settings.on_change
+def _settings_changed(old, new):
+    """Другой канал - прежние ответы о подписке больше не верны."""
+    if old.required_channel_id != new.required_channel_id:
+        count = len(_last_known)
+        _subscribed_at.clear()
+        _last_known.clear()
+        logger.info(f"🔄 Канал подписки сменён на {new.required_channel_id}, кэш подписок сброшен ({count})")
+
+
+async def prefill_subscription_cache(bot: Bot):
+    """
+    Прогревает кэш подписок для недавних клиентов,
+    чтобы их первые нажатия после рестарта не ждали getChatMember.
+    """
+    user_ids = await asyncio.to_thread(get_recent_user_ids, PREFILL_USERS_LIMIT)
+    semaphore = asyncio.Semaphore(5)
+    
+    async def check(user_id: int):
+        async with semaphore:
+            await check_subscription(user_id, bot, use_cache=False)
+    
+    try:
+        await asyncio.gather(*(check(user_id) for user_id in user_ids))
+    except Exception as e:
+        logger.error(f"❌ Ошибка прогрева кэша подписок: {e}", exc_info=True)
+        return
+    logger.info(f"✅ Кэш подписок прогрет: {len(_subscribed_at)} из {len(user_ids)} подписаны")
+
+
+@on_startup("subscription_prefill", after=("db_migrations",), required=False)
+async def _startup_prefill(bot: Bot):
+    """
+    Запускает прогрев кэша подписок в фоне: запуск бота (и первый апдейт)
+    не ждёт десятков запросов getChatMember.
+    """
+    global _prefill_task
+    if settings.current().subscription_cache_ttl > 0:
+        _prefill_task = asyncio.create_task(prefill_subscription_cache(bot))
+
+
+@on_shutdown("subscription_prefill")
+async def _shutdown_prefill(bot: Bot):
+    if _prefill_task is not None:
+        _prefill_task.cancel()
@@ -0,0 +1,176 @@
+"""
+Проверки живости и готовности бота и замер задержки цикла событий.
+
+Маршруты добавляются в HTTP-сервер метрик (metrics.ROUTES, METRICS_PORT):
+    /health/live   - процесс отвечает; текущая и максимальная задержка цикла событий
+    /health/ready  - база доступна, polling запущен, цикл событий не заблокирован;
+                     время последнего апдейта и глубина очередей
+Ответ - JSON, код 200 или 503 (если хоть одна проверка не пройдена).
+
+Задержка цикла событий: фоновая задача засыпает на HEALTH_LAG_INTERVAL
+и измеряет, насколько позже проснулась. Большая задержка означает,
+что обработчик блокирует цикл (например, синхронным запросом к SQLite).
+"""
+
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+
+from aiogram import BaseMiddleware
+
+import database
+import metrics
+from config import HEALTH_LAG_INTERVAL, HEALTH_MAX_LAG, HEALTH_MAX_UPDATE_AGE
+from lifecycle import on_startup, on_shutdown
+
+logger = logging.getLogger(__name__)
+
+# Очереди, глубина которых попадает в /health/ready: имя -> (метрика, метки)
+QUEUE_GAUGES = {
+    "in_flight": ("bot_in_flight_updates", {}),
+    "waiting_chat": ("bot_scheduler_waiting_updates", {"stage": "chat"}),
+    "waiting_slot": ("bot_scheduler_waiting_updates", {"stage": "slot"}),
+    "running": ("bot_scheduler_running_updates", {}),
+}
+
+loop_lag = metrics.gauge("bot_event_loop_lag_seconds", "Последняя задержка цикла событий")
+loop_lag_max = metrics.gauge("bot_event_loop_lag_max_seconds", "Максимальная задержка цикла событий с запуска")
+last_update_timestamp = metrics.gauge("bot_last_update_timestamp", "Время последнего апдейта (unix)")
+
+
+# Состояние проверок процесса
+_polling = False
+_last_update_at: float = None
+_lag = 0.0
+_lag_max = 0.0
+_task: asyncio.Task = None
+
+
+# ============================================================================
+# ИСТОЧНИКИ ДАННЫХ
+# ============================================================================
+
+class LastUpdateMiddleware(BaseMiddleware):
+    """Outer-middleware диспетчера (dp.update): запоминает время последнего апдейта."""
+
+    async def __call__(self, handler, event, data):
+        global _last_update_at
+        _last_update_at = time.time()
+        last_update_timestamp.set(_last_update_at)
+        return await handler(event, data)
+
+
+async def polling_started():
+    """Подписка на dp.startup: polling запущен."""
+    global _polling
+    _polling = True
+
+
+async def polling_stopped():
+    """Подписка на dp.shutdown: polling остановлен."""
+    global _polling
+    _polling = False
+
+
+async def _sample_loop_lag(interval: float):
+    """Измеряет, насколько позже запланированного просыпается задача."""
+    global _lag, _lag_max
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lag = max(0.0, time.perf_counter() - started - interval)
+
+        _lag = lag
+        loop_lag.set(lag)
+        if lag > _lag_max:
+            _lag_max = lag
+            loop_lag_max.set(lag)
+        if lag > HEALTH_MAX_LAG:
+            logger.warning(f"🐢 Цикл событий был заблокирован на {lag:.2f} с")
+
+
+def _check_database() -> None:
+    conn = sqlite3.connect(database.DB_NAME, timeout=2)
+    try:
+        conn.execute("SELECT 1 FROM requests LIMIT 1").fetchall()
+    finally:
+        conn.close()
+
+
+def _queue_depths() -> dict:
+    depths = {}
+    for name, (metric_name, labels) in QUEUE_GAUGES.items():
+        metric = metrics.REGISTRY.get(metric_name)
+        depths[name] = metric.value(**labels) if metric is not None else 0
+    return depths
+
+
+# ============================================================================
+# МАРШРУТЫ
+# ============================================================================
+
+def _json(status: int, body: dict):
+    return status, "application/json", json.dumps(body, ensure_ascii=False) + "\n"
+
+
+async def _live_route():
+    return _json(200, {
+        "status": "ok",
+        "loop_lag_seconds": round(_lag, 4),
+        "loop_lag_max_seconds": round(_lag_max, 4),
+    })
+
+
+async def _ready_route():
+    checks = {}
+
+    try:
+        # В потоке: если база заблокирована, не блокируем и цикл событий
+        await asyncio.wait_for(asyncio.to_thread(_check_database), timeout=3)
+        checks["database"] = "ok"
+    except Exception as e:
+        checks["database"] = f"error: {e.__class__.__name__}: {e}"
+
+    checks["polling"] = "ok" if _polling else "error: polling не запущен"
+    checks["loop_lag"] = (
+        "ok" if _lag <= HEALTH_MAX_LAG else f"error: задержка {_lag:.2f} с > {HEALTH_MAX_LAG:g} с"
+    )
+
+    update_age = None if _last_update_at is None else time.time() - _last_update_at
+    if HEALTH_MAX_UPDATE_AGE > 0:
+        stale = update_age is None or update_age > HEALTH_MAX_UPDATE_AGE
+        checks["last_update"] = f"error: нет апдейтов дольше {HEALTH_MAX_UPDATE_AGE:g} с" if stale else "ok"
+
+    ready = all(value == "ok" for value in checks.values())
+    return _json(200 if ready else 503, {
+        "status": "ok" if ready else "error",
+        "checks": checks,
+        "last_update_age_seconds": None if update_age is None else round(update_age, 1),
+        "loop_lag_seconds": round(_lag, 4),
+        "loop_lag_max_seconds": round(_lag_max, 4),
+        "queues": _queue_depths(),
+    })
+
+
+metrics.ROUTES["/health/live"] = _live_route
+metrics.ROUTES["/health/ready"] = _ready_route
+
+
+# ============================================================================
+# ХУКИ ЗАПУСКА И ОСТАНОВКИ
+# ============================================================================
+
+@on_startup("loop_lag_sampler", required=False)
+async def _startup_lag_sampler(bot):
+    """Запускает замер задержки цикла событий."""
+    global _task
+    if HEALTH_LAG_INTERVAL > 0:
+        _task = asyncio.create_task(_sample_loop_lag(HEALTH_LAG_INTERVAL))
+
+
+@on_shutdown("loop_lag_sampler")
+async def _shutdown_lag_sampler(bot):
+    if _task is not None:
+        _task.cancel()
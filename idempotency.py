@@ -0,0 +1,92 @@
+"""
+Защита от повторных заявок.
+
+Одна и та же заявка может прийти дважды: пользователь отправил сумму
+ещё раз, или Telegram повторно доставил апдейт после таймаута. Повтор
+не должен создавать вторую строку в базе и второе уведомление менеджеру.
+
+Заявка опознаётся по двум ключам:
+- сообщение (chat_id, message_id) - повторная доставка того же апдейта;
+- содержимое (user_id, ссылка, сумма) в пределах IDEMPOTENCY_WINDOW секунд.
+Ключи заказов из корзины начинаются с order:, заявок - с req:, поэтому
+корзина из одного товара не совпадает с такой же одиночной заявкой.
+
+Ключи недавних заявок держатся в памяти - повтор отсекается до записи
+в базу. Ключ содержимого с номером окна пишется в requests.idempotency_key
+(уникальный индекс), поэтому дубль не пройдёт и после рестарта бота.
+"""
+
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import metrics
+from config import IDEMPOTENCY_WINDOW
+
+logger = logging.getLogger(__name__)
+
+# Ключ -> (ID заявки, когда истекает). Порядок вставки = порядок истечения
+_recent_keys: OrderedDict[str, tuple[int, float]] = OrderedDict()
+
+duplicates_total = metrics.counter(
+    "bot_duplicate_requests_total", "Отклонённые повторные заявки: найдены в памяти (cache) или в базе (db)"
+)
+
+
+def _digest(*parts) -> str:
+    return hashlib.sha256("\0".join(str(part) for part in parts).encode("utf-8")).hexdigest()[:32]
+
+
+def message_key(chat_id: int, message_id: int) -> str:
+    """Ключ сообщения Telegram."""
+    return f"msg:{chat_id}:{message_id}"
+
+
+def content_key(user_id: int, link: str, amount: str, kind: str = "req") -> str:
+    """Ключ содержимого заявки (kind="req") или заказа (kind="order"); пробелы по краям не учитываются."""
+    return f"{kind}:{_digest(user_id, str(link).strip(), str(amount).strip())}"
+
+
+def storage_key(user_id: int, link: str, amount: str, now: float = None, kind: str = "req") -> str:
+    """
+    Ключ для уникального индекса в базе: содержимое плюс номер окна.
+    Повтор на границе окон база пропустит, но его отсечёт кэш в памяти.
+    """
+    window = int((now or time.time()) // IDEMPOTENCY_WINDOW)
+    return f"{content_key(user_id, link, amount, kind)}:{window}"
+
+
+def _purge(now: float):
+    """Удаляет истёкшие ключи (они в начале словаря)."""
+    while _recent_keys:
+        key, (_, expires_at) = next(iter(_recent_keys.items()))
+        if expires_at > now:
+            break
+        del _recent_keys[key]
+
+
+def find_duplicate(*keys: str) -> Optional[int]:
+    """
+    Ищет недавнюю заявку с любым из ключей.
+
+    Returns:
+        ID найденной заявки или None
+    """
+    _purge(time.monotonic())
+    for key in keys:
+        entry = _recent_keys.get(key)
+        if entry is not None:
+            duplicates_total.inc(source="cache")
+            logger.info(f"♻️ Повтор заявки #{entry[0]} ({key.split(':')[0]}), не сохраняем")
+            return entry[0]
+    return None
+
+
+def remember(request_id: int, *keys: str):
+    """Запоминает ключи сохранённой заявки на IDEMPOTENCY_WINDOW секунд."""
+    expires_at = time.monotonic() + IDEMPOTENCY_WINDOW
+    for key in keys:
+        _recent_keys.pop(key, None)
+        _recent_keys[key] = (request_id, expires_at)
@@ -0,0 +1,296 @@
+"""
+Жизненный цикл бота: хуки запуска и остановки.
+
+Модули регистрируют хуки через декораторы on_startup / on_shutdown.
+При запуске все хуки выполняются параллельно (с учётом зависимостей after=...),
+а по итогам в лог пишется разбивка времени холодного старта по фазам.
+
+При остановке сначала выполняется drain(): ждём (с ограничением по времени)
+обработчики, которые уже начали работу, и только потом запускаем хуки остановки.
+"""
+
+import asyncio
+import inspect
+import logging
+import time
+
+from aiogram import BaseMiddleware
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Момент импорта модуля - считаем его началом холодного старта
+PROCESS_STARTED_AT = time.perf_counter()
+
+_startup_hooks = {}
+_shutdown_hooks = {}
+
+# Апдейты, которые обрабатываются прямо сейчас или ждут очереди своего чата: задача -> описание
+_in_flight: dict[asyncio.Task, str] = {}
+
+# После начала остановки новые апдейты не принимаются
+_accepting_updates = True
+
+startup_phase_seconds = metrics.gauge(
+    "bot_startup_phase_seconds", "Длительность фаз запуска бота"
+)
+time_to_first_update = metrics.gauge(
+    "bot_time_to_first_update_seconds", "Время от запуска процесса до первого апдейта"
+)
+in_flight_updates = metrics.gauge(
+    "bot_in_flight_updates", "Апдейты, которые обрабатываются прямо сейчас"
+)
+
+
+class Hook:
+    """Зарегистрированный хук запуска или остановки."""
+
+    __slots__ = ("name", "func", "after", "required")
+
+    def __init__(self, name: str, func, after: tuple, required: bool):
+        self.name = name
+        self.func = func
+        self.after = after
+        self.required = required
+
+
+def on_startup(name: str, after: tuple = (), required: bool = True):
+    """
+    Регистрирует хук запуска.
+
+    Хук - функция func(bot) (синхронная или async).
+    Синхронные хуки выполняются в отдельном потоке, чтобы не блокировать остальные.
+
+    Args:
+        name: Имя фазы (для отчёта о времени)
+        after: Имена фаз, которые должны завершиться раньше
+        required: Если True, ошибка хука прерывает запуск бота
+    """
+    def decorator(func):
+        _startup_hooks[name] = Hook(name, func, tuple(after), required)
+        return func
+    return decorator
+
+
+def on_shutdown(name: str, after: tuple = ()):
+    """
+    Регистрирует хук остановки.
+
+    Args:
+        name: Имя фазы
+        after: Имена фаз остановки, которые должны завершиться раньше
+    """
+    def decorator(func):
+        _shutdown_hooks[name] = Hook(name, func, tuple(after), False)
+        return func
+    return decorator
+
+
+async def _call(func, bot):
+    """Вызывает хук: корутину напрямую, синхронную функцию - в потоке."""
+    if inspect.iscoroutinefunction(func):
+        return await func(bot)
+    return await asyncio.to_thread(func, bot)
+
+
+async def _run_hooks(hooks: dict, bot, title: str) -> dict:
+    """
+    Запускает хуки параллельно с учётом зависимостей.
+
+    Returns:
+        Словарь имя фазы -> (длительность в секундах, ошибка или None)
+    """
+    results = {}
+    tasks = {}
+
+    async def run(hook: Hook):
+        for dependency in hook.after:
+            if dependency in tasks:
+                await asyncio.wait([tasks[dependency]])
+                if results.get(dependency, (0, None))[1] is not None:
+                    results[hook.name] = (0.0, RuntimeError(f"зависимость {dependency} не выполнена"))
+                    return
+
+        started = time.perf_counter()
+        try:
+            await _call(hook.func, bot)
+            results[hook.name] = (time.perf_counter() - started, None)
+        except Exception as e:
+            results[hook.name] = (time.perf_counter() - started, e)
+            logger.error(f"❌ {title}: фаза '{hook.name}' завершилась ошибкой: {e}", exc_info=True)
+
+    for hook in hooks.values():
+        tasks[hook.name] = asyncio.create_task(run(hook))
+
+    if tasks:
+        await asyncio.wait(tasks.values())
+
+    return results
+
+
+def _log_report(title: str, results: dict, wall: float):
+    """Пишет в лог таблицу длительностей фаз."""
+    logger.info(f"⏱ {title}: {wall * 1000:.0f} мс (фазы выполнялись параллельно)")
+    for name, (duration, error) in sorted(results.items(), key=lambda item: -item[1][0]):
+        status = "✅" if error is None else "❌"
+        logger.info(f"   {status} {name:<24} {duration * 1000:8.1f} мс")
+
+
+async def run_startup(bot) -> dict:
+    """
+    Выполняет все хуки запуска.
+
+    Args:
+        bot: Экземпляр бота (передаётся в хуки)
+
+    Returns:
+        Словарь имя фазы -> длительность в секундах
+
+    Raises:
+        RuntimeError: если упал обязательный хук
+    """
+    started = time.perf_counter()
+    results = await _run_hooks(_startup_hooks, bot, "Запуск")
+    _log_report("Запуск", results, time.perf_counter() - started)
+
+    for name, (duration, _) in results.items():
+        startup_phase_seconds.set(duration, phase=name)
+
+    failed = [
+        name for name, (_, error) in results.items()
+        if error is not None and _startup_hooks[name].required
+    ]
+    if failed:
+        raise RuntimeError(f"Не удалось запустить бота, упали фазы: {', '.join(failed)}")
+
+    logger.info(
+        f"🚀 Холодный старт до начала polling: "
+        f"{(time.perf_counter() - PROCESS_STARTED_AT) * 1000:.0f} мс"
+    )
+    return {name: duration for name, (duration, _) in results.items()}
+
+
+async def run_shutdown(bot) -> dict:
+    """
+    Выполняет все хуки остановки. Ошибки логируются, но не прерывают остановку.
+
+    Args:
+        bot: Экземпляр бота
+
+    Returns:
+        Словарь имя фазы -> длительность в секундах
+    """
+    started = time.perf_counter()
+    results = await _run_hooks(_shutdown_hooks, bot, "Остановка")
+    _log_report("Остановка", results, time.perf_counter() - started)
+    return {name: duration for name, (duration, _) in results.items()}
+
+
+class FirstUpdateMiddleware(BaseMiddleware):
+    """
+    Outer-middleware диспетчера: один раз фиксирует время до первого апдейта.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._seen = False
+
+    async def __call__(self, handler, event, data):
+        if not self._seen:
+            self._seen = True
+            elapsed = time.perf_counter() - PROCESS_STARTED_AT
+            time_to_first_update.set(elapsed)
+            logger.info(f"⏱ Первый апдейт получен через {elapsed:.2f} с после запуска процесса")
+        return await handler(event, data)
+
+
+# ============================================================================
+# ОТСЛЕЖИВАНИЕ ОБРАБОТЧИКОВ И DRAIN ПРИ ОСТАНОВКЕ
+# ============================================================================
+
+def track_queued(task: asyncio.Task, info: str) -> bool:
+    """
+    Запоминает задачу апдейта, который ещё ждёт очереди своего чата
+    (см. middlewares.scheduler.ChatEventIsolation), чтобы drain дождался
+    и его, а при таймауте перечислил среди прерванных.
+
+    Returns:
+        False, если бот уже останавливается (апдейт не принят)
+    """
+    if not _accepting_updates:
+        return False
+    _in_flight[task] = info
+    in_flight_updates.set(len(_in_flight))
+    return True
+
+
+def untrack(task: asyncio.Task):
+    """Убирает задачу из отслеживаемых (апдейт обработан или отброшен)."""
+    _in_flight.pop(task, None)
+    in_flight_updates.set(len(_in_flight))
+
+
+class InFlightMiddleware(BaseMiddleware):
+    """
+    Outer-middleware диспетчера: запоминает задачи, которые обрабатывают апдейты,
+    чтобы при остановке дождаться их завершения.
+
+    Апдейт, принятый до начала остановки и ждавший очереди своего чата
+    (track_queued), обрабатывается и после начала остановки - drain его ждёт.
+    """
+
+    async def __call__(self, handler, event, data):
+        task = asyncio.current_task()
+        if not _accepting_updates and task not in _in_flight:
+            logger.warning(f"⚠️ Апдейт {event.update_id} пропущен: бот останавливается")
+            return None
+
+        user = data.get("event_from_user")
+        _in_flight[task] = (
+            f"update {event.update_id} ({event.event_type}, "
+            f"user {user.id if user else '-'})"
+        )
+        in_flight_updates.set(len(_in_flight))
+        try:
+            return await handler(event, data)
+        finally:
+            untrack(task)
+
+
+async def drain(timeout: float) -> dict:
+    """
+    Перестаёт принимать апдейты и ждёт уже начатые обработчики.
+
+    Args:
+        timeout: Максимальное время ожидания в секундах
+
+    Returns:
+        dict с ключами drained (сколько завершилось) и abandoned
+        (описания обработчиков, которые пришлось прервать)
+    """
+    global _accepting_updates
+    _accepting_updates = False
+
+    # Задачу, которая вызвала drain, не ждём (иначе ждали бы сами себя)
+    current = asyncio.current_task()
+    pending = {task: info for task, info in _in_flight.items() if task is not current}
+
+    if not pending:
+        logger.info("✅ Незавершённых обработчиков нет")
+        return {"drained": 0, "abandoned": []}
+
+    logger.info(f"⏳ Ждём завершения обработчиков: {len(pending)} (не дольше {timeout:g} с)")
+    done, not_done = await asyncio.wait(pending.keys(), timeout=timeout)
+
+    abandoned = [pending[task] for task in not_done]
+    for task in not_done:
+        task.cancel()
+
+    logger.info(f"✅ Завершено обработчиков: {len(done)}")
+    if abandoned:
+        logger.warning(f"⚠️ Прервано по таймауту: {len(abandoned)}")
+        for info in abandoned:
+            logger.warning(f"   • {info}")
+
+    return {"drained": len(done), "abandoned": abandoned}
@@ -0,0 +1,198 @@
+"""
+Простые метрики бота в формате Prometheus.
+
+Счётчики и gauge-метрики хранятся в памяти процесса.
+Если задан METRICS_PORT, при старте поднимается маленький HTTP-сервер,
+который отдаёт их по адресу /metrics (и маршруты других модулей из ROUTES,
+например /health/live и /health/ready, см. health.py).
+"""
+
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Все зарегистрированные метрики: имя -> объект метрики
+REGISTRY = {}
+
+# Дополнительные HTTP-маршруты: путь -> async функция, возвращающая (status, content_type, body)
+ROUTES = {}
+
+
+def _format_labels(labels: tuple) -> str:
+    """Форматирует метки в виде {key="value",...}."""
+    if not labels:
+        return ""
+    inner = ",".join(f'{key}="{value}"' for key, value in labels)
+    return "{" + inner + "}"
+
+
+class Counter:
+    """Монотонно растущий счётчик с метками."""
+
+    kind = "counter"
+    __slots__ = ("name", "help", "_values")
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(sorted(labels.items())), 0)
+
+    def samples(self):
+        for key, value in self._values.items():
+            yield self.name, key, value
+
+
+class Gauge(Counter):
+    """Значение, которое может расти и уменьшаться."""
+
+    kind = "gauge"
+    __slots__ = ()
+
+    def set(self, value: float, **labels):
+        self._values[tuple(sorted(labels.items()))] = value
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def clear(self):
+        """Удаляет все значения (например, перед полным пересчётом по меткам)."""
+        self._values.clear()
+
+
+class Summary:
+    """Количество, сумма и максимум наблюдений (например, задержек)."""
+
+    kind = "summary"
+    __slots__ = ("name", "help", "_values")
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._values: dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        stats = self._values.get(key)
+        if stats is None:
+            self._values[key] = [1, value, value]
+        else:
+            stats[0] += 1
+            stats[1] += value
+            if value > stats[2]:
+                stats[2] = value
+
+    def samples(self):
+        for key, (count, total, maximum) in self._values.items():
+            yield f"{self.name}_count", key, count
+            yield f"{self.name}_sum", key, total
+            yield f"{self.name}_max", key, maximum
+
+
+def _get_or_create(cls, name: str, help: str):
+    metric = REGISTRY.get(name)
+    if metric is None:
+        metric = cls(name, help)
+        REGISTRY[name] = metric
+    return metric
+
+
+def counter(name: str, help: str = "") -> Counter:
+    """Возвращает (или создаёт) счётчик."""
+    return _get_or_create(Counter, name, help)
+
+
+def gauge(name: str, help: str = "") -> Gauge:
+    """Возвращает (или создаёт) gauge-метрику."""
+    return _get_or_create(Gauge, name, help)
+
+
+def summary(name: str, help: str = "") -> Summary:
+    """Возвращает (или создаёт) summary-метрику."""
+    return _get_or_create(Summary, name, help)
+
+
+def render() -> str:
+    """
+    Отдаёт все метрики в текстовом формате Prometheus.
+
+    Returns:
+        Текст для ответа на /metrics
+    """
+    lines = []
+    for metric in REGISTRY.values():
+        if metric.help:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for sample_name, labels, value in metric.samples():
+            lines.append(f"{sample_name}{_format_labels(labels)} {value}")
+    lines.append("")
+    return "\n".join(lines)
+
+
+# ============================================================================
+# HTTP-СЕРВЕР
+# ============================================================================
+
+async def _metrics_route():
+    return 200, "text/plain; version=0.0.4", render()
+
+
+ROUTES["/metrics"] = _metrics_route
+
+
+async def _handle_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    """Обрабатывает один HTTP-запрос (только GET, без keep-alive)."""
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+        # Заголовки запроса нам не нужны - просто дочитываем их
+        while True:
+            line = await asyncio.wait_for(reader.readline(), timeout=5)
+            if line in (b"\r\n", b"\n", b""):
+                break
+
+        parts = request_line.decode("latin-1").split()
+        path = parts[1].split("?", 1)[0] if len(parts) >= 2 else "/"
+        route = ROUTES.get(path)
+
+        if route is None:
+            status, content_type, body = 404, "text/plain", "not found\n"
+        else:
+            status, content_type, body = await route()
+
+        payload = body.encode("utf-8")
+        reason = {200: "OK", 404: "Not Found", 503: "Service Unavailable"}.get(status, "OK")
+        writer.write(
+            f"HTTP/1.1 {status} {reason}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(payload)}\r\n"
+            "Connection: close\r\n\r\n".encode("latin-1") + payload
+        )
+        await writer.drain()
+    except Exception as e:
+        logger.debug(f"Ошибка обработки HTTP-запроса метрик: {e}")
+    finally:
+        writer.close()
+
+
+async def start_server(host: str, port: int) -> asyncio.AbstractServer:
+    """
+    Запускает HTTP-сервер метрик.
+
+    Args:
+        host: Адрес для прослушивания
+        port: Порт
+
+    Returns:
+        Запущенный asyncio-сервер (закрыть через server.close())
+    """
+    server = await asyncio.start_server(_handle_connection, host, port)
+    logger.info(f"📈 Сервер метрик слушает http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,2 @@
+# Пакет middleware: диспетчера (фильтрация и учёт апдейтов до обработчиков)
+# и сессии бота (устойчивость запросов к Bot API)
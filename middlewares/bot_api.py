@@ -0,0 +1,195 @@
+"""
+Устойчивость запросов к Bot API (middleware сессии бота).
+
+- RetryAfter: ждём указанное Telegram время и повторяем (если ждать недолго),
+- сетевые ошибки и 5xx: повторяем с экспоненциальной задержкой и джиттером,
+  но только для читающих методов (get*) - повтор sendMessage после таймаута
+  мог бы отправить сообщение дважды,
+- для отдельных методов (getChatMember) - автоматический выключатель (circuit breaker):
+  после серии сбоев запросы какое-то время не отправляются вовсе, а сразу
+  завершаются CircuitOpenError. Вызывающий код решает, чем их заменить
+  (см. check_subscription).
+
+Подключение:
+    bot.session.middleware(BotApiMiddleware())
+"""
+
+import asyncio
+import logging
+import random
+import time
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+
+import metrics
+from config import (
+    API_RETRY_ATTEMPTS, API_RETRY_BASE_DELAY, API_RETRY_MAX_DELAY, API_RETRY_AFTER_MAX,
+    API_BREAKER_FAILURES, API_BREAKER_RESET,
+)
+
+logger = logging.getLogger(__name__)
+
+# Методы, которые не повторяем: у поллинга своя логика переподключения
+NO_RETRY_METHODS = {"getUpdates"}
+
+# Ошибки, после которых запрос имеет смысл повторить
+TRANSIENT_ERRORS = (TelegramNetworkError, TelegramServerError)
+
+api_retries_total = metrics.counter(
+    "bot_api_retries_total", "Повторные запросы к Bot API по методу и причине"
+)
+api_failures_total = metrics.counter(
+    "bot_api_failures_total", "Запросы к Bot API, не удавшиеся после всех попыток"
+)
+breaker_open = metrics.gauge(
+    "bot_api_circuit_open", "Выключатель метода разомкнут (1) или замкнут (0)"
+)
+breaker_rejected_total = metrics.counter(
+    "bot_api_circuit_rejected_total", "Запросы, не отправленные из-за разомкнутого выключателя"
+)
+
+
+class CircuitOpenError(Exception):
+    """Запрос не отправлен: выключатель метода разомкнут."""
+
+    def __init__(self, method: str, retry_in: float):
+        super().__init__(f"{method}: выключатель разомкнут, повтор через {retry_in:.0f} с")
+        self.method = method
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """
+    Автоматический выключатель одного метода API.
+
+    Замкнут - запросы идут как обычно. После failure_threshold сбоев подряд
+    размыкается на reset_timeout секунд. Затем пропускает один пробный запрос:
+    успех замыкает выключатель, сбой размыкает его снова.
+    """
+
+    __slots__ = ("method", "failure_threshold", "reset_timeout", "failures", "opened_at", "probing")
+
+    def __init__(self, method: str, failure_threshold: int, reset_timeout: float):
+        self.method = method
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def before_request(self):
+        """
+        Проверяет, можно ли отправить запрос.
+
+        Raises:
+            CircuitOpenError: если выключатель разомкнут (или пробный запрос уже идёт)
+        """
+        if self.opened_at is None:
+            return
+
+        retry_in = self.opened_at + self.reset_timeout - time.monotonic()
+        if retry_in > 0 or self.probing:
+            breaker_rejected_total.inc(method=self.method)
+            raise CircuitOpenError(self.method, max(retry_in, 0))
+
+        # Время вышло - пропускаем один пробный запрос
+        self.probing = True
+
+    def record_success(self):
+        if self.opened_at is not None:
+            logger.info(f"✅ Bot API {self.method}: выключатель замкнут, запросы снова идут")
+            breaker_open.set(0, method=self.method)
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.probing = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                logger.warning(
+                    f"⚠️ Bot API {self.method}: {self.failures} сбоев подряд, "
+                    f"выключатель разомкнут на {self.reset_timeout:g} с"
+                )
+            self.opened_at = time.monotonic()
+            breaker_open.set(1, method=self.method)
+
+
+# Выключатели по методам API
+BREAKERS = {
+    "getChatMember": CircuitBreaker("getChatMember", API_BREAKER_FAILURES, API_BREAKER_RESET),
+}
+
+
+def backoff_delay(attempt: int) -> float:
+    """
+    Задержка перед повтором: экспонента с полным джиттером.
+
+    Args:
+        attempt: Номер неудачной попытки (с 1)
+    """
+    return random.uniform(0, min(API_RETRY_MAX_DELAY, API_RETRY_BASE_DELAY * 2 ** (attempt - 1)))
+
+
+class BotApiMiddleware(BaseRequestMiddleware):
+    """Повторы, учёт RetryAfter и выключатели для всех запросов бота."""
+
+    async def __call__(self, make_request, bot, method):
+        name = method.__api_method__
+
+        if name in NO_RETRY_METHODS:
+            return await make_request(bot, method)
+
+        breaker = BREAKERS.get(name)
+        if breaker is not None:
+            breaker.before_request()
+
+        # Повтор после сетевой ошибки безопасен только для читающих методов
+        idempotent = name.startswith("get")
+        attempt = 0
+
+        while True:
+            attempt += 1
+            try:
+                response = await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                if attempt >= API_RETRY_ATTEMPTS or e.retry_after > API_RETRY_AFTER_MAX:
+                    self._failed(name, breaker)
+                    raise
+                api_retries_total.inc(method=name, reason="retry_after")
+                logger.warning(f"⏳ Bot API {name}: RetryAfter {e.retry_after} с, попытка {attempt}")
+                await asyncio.sleep(e.retry_after)
+            except TRANSIENT_ERRORS as e:
+                if not idempotent or attempt >= API_RETRY_ATTEMPTS:
+                    self._failed(name, breaker)
+                    raise
+                delay = backoff_delay(attempt)
+                api_retries_total.inc(method=name, reason=type(e).__name__)
+                logger.warning(f"🔁 Bot API {name}: {e}, повтор через {delay:.2f} с")
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                # Отменённый пробный запрос не должен навсегда занять выключатель
+                if breaker is not None:
+                    breaker.probing = False
+                raise
+            except Exception:
+                # Осмысленный ответ API (например, 400 Bad Request) - сбоем не считается
+                if breaker is not None:
+                    breaker.record_success()
+                raise
+            else:
+                if breaker is not None:
+                    breaker.record_success()
+                return response
+
+    @staticmethod
+    def _failed(name: str, breaker):
+        api_failures_total.inc(method=name)
+        if breaker is not None:
+            breaker.record_failure()
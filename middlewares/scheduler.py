@@ -0,0 +1,150 @@
+"""
+Планировщик обработки апдейтов.
+
+aiogram запускает каждый апдейт отдельной задачей. Без ограничений это значит:
+- одновременно может работать сколько угодно обработчиков,
+- два сообщения одного пользователя (ссылка и сумма в заявке) обрабатываются
+  параллельно и гоняются за состояние FSM.
+
+Порядок внутри чата обеспечивает ChatEventIsolation - изоляция событий
+FSM (Dispatcher(events_isolation=...)): апдейты одного пользователя в чате
+выстраиваются в очередь строго по порядку поступления, и состояние FSM
+читается уже после того, как подошла очередь. Поэтому второе сообщение
+видит состояние, которое установил обработчик первого. Ждущий апдейт
+сразу учитывается в lifecycle (track_queued): при остановке drain ждёт
+и его, а не только уже начатые обработчики.
+
+UpdateSchedulerMiddleware ограничивает число одновременно работающих
+обработчиков (UPDATES_CONCURRENCY). Апдейт, ждущий своей очереди в чате,
+не занимает общий слот.
+"""
+
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+
+from aiogram import BaseMiddleware
+from aiogram.fsm.storage.base import BaseEventIsolation, StorageKey
+
+import metrics
+from config import UPDATES_CONCURRENCY
+from lifecycle import track_queued, untrack
+
+logger = logging.getLogger(__name__)
+
+scheduler_waiting = metrics.gauge(
+    "bot_scheduler_waiting_updates", "Апдейты в очереди: ждут свой чат (chat) или общий слот (slot)"
+)
+scheduler_running = metrics.gauge(
+    "bot_scheduler_running_updates", "Апдейты, которые обрабатываются прямо сейчас"
+)
+scheduler_queues = metrics.gauge(
+    "bot_scheduler_chat_queues", "Чаты, у которых есть апдейты в обработке или в очереди"
+)
+scheduler_wait = metrics.summary(
+    "bot_scheduler_wait_seconds", "Время ожидания общего слота до начала обработки"
+)
+
+
+class ChatQueue:
+    """Очередь одного чата: замок (FIFO) и число апдейтов, которые его ждут или держат."""
+
+    __slots__ = ("lock", "users")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.users = 0
+
+
+class SchedulerState:
+    """Общие счётчики очередей для метрик и /health/ready."""
+
+    __slots__ = ("waiting",)
+
+    def __init__(self):
+        self.waiting = {"chat": 0, "slot": 0}
+
+    def set_waiting(self, stage: str, delta: int):
+        self.waiting[stage] += delta
+        scheduler_waiting.set(self.waiting[stage], stage=stage)
+
+
+_state = SchedulerState()
+
+
+class ChatEventIsolation(BaseEventIsolation):
+    """
+    Изоляция событий FSM: апдейты с одним ключом FSM (пользователь в чате)
+    обрабатываются по одному, строго по порядку поступления.
+
+    В отличие от SimpleEventIsolation aiogram, замок удаляется, когда его
+    никто не ждёт, - словарь не растёт с числом пользователей.
+    """
+
+    def __init__(self):
+        self._queues: dict[StorageKey, ChatQueue] = {}
+
+    @asynccontextmanager
+    async def lock(self, key: StorageKey):
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = ChatQueue()
+            scheduler_queues.set(len(self._queues))
+        queue.users += 1
+        task = asyncio.current_task()
+        track_queued(task, f"chat {key.chat_id}, user {key.user_id} (ждёт очереди чата)")
+
+        try:
+            # asyncio.Lock пропускает ожидающих строго по очереди
+            _state.set_waiting("chat", 1)
+            try:
+                await queue.lock.acquire()
+            finally:
+                _state.set_waiting("chat", -1)
+
+            try:
+                yield
+            finally:
+                queue.lock.release()
+        finally:
+            untrack(task)
+            queue.users -= 1
+            if queue.users == 0:
+                del self._queues[key]
+                scheduler_queues.set(len(self._queues))
+
+    async def close(self) -> None:
+        self._queues.clear()
+
+
+class UpdateSchedulerMiddleware(BaseMiddleware):
+    """
+    Outer-middleware диспетчера (dp.update): не больше UPDATES_CONCURRENCY
+    обработчиков одновременно. Стоит после FSMContextMiddleware, поэтому
+    слот занимает только апдейт, которому уже подошла очередь в чате.
+    """
+
+    def __init__(self, concurrency: int = UPDATES_CONCURRENCY):
+        self.concurrency = concurrency
+        self._slots = asyncio.Semaphore(concurrency)
+        self._running = 0
+
+    async def __call__(self, handler, event, data):
+        queued_at = time.monotonic()
+
+        _state.set_waiting("slot", 1)
+        try:
+            await self._slots.acquire()
+        finally:
+            _state.set_waiting("slot", -1)
+
+        scheduler_wait.observe(time.monotonic() - queued_at)
+        self._running += 1
+        scheduler_running.set(self._running)
+        try:
+            return await handler(event, data)
+        finally:
+            self._running -= 1
+            scheduler_running.set(self._running)
+            self._slots.release()
@@ -0,0 +1,150 @@
+"""
+Анти-флуд: ограничение частоты сообщений и нажатий кнопок.
+
+Для каждого пользователя хранится компактная запись с тремя «вёдрами токенов»:
+- сообщения,
+- нажатия кнопок (callback),
+- шаги оформления заявки (сообщения в состоянии RequestStates и кнопка «Оформить заявку»).
+
+Лишние апдейты отбрасываются до обработчиков, поэтому спамер не тратит
+запросы getChatMember и запись в БД. Записи неактивных пользователей
+периодически удаляются, так что память не растёт бесконечно.
+"""
+
+import logging
+import time
+
+from aiogram import BaseMiddleware, types
+
+import metrics
+from admins import is_admin
+from config import (
+    THROTTLE_MESSAGE_RATE, THROTTLE_MESSAGE_BURST,
+    THROTTLE_CALLBACK_RATE, THROTTLE_CALLBACK_BURST,
+    THROTTLE_REQUEST_RATE, THROTTLE_REQUEST_BURST,
+)
+from texts import t, user_locale
+
+logger = logging.getLogger(__name__)
+
+# Как часто (в секундах) чистить записи неактивных пользователей
+SWEEP_INTERVAL = 60
+
+# Не чаще одного сообщения «не так быстро» в столько секунд на пользователя
+WARN_INTERVAL = 10
+
+throttled_total = metrics.counter(
+    "bot_throttled_total", "Апдейты, отброшенные анти-флудом"
+)
+throttle_users = metrics.gauge(
+    "bot_throttle_tracked_users", "Пользователи, для которых хранится состояние анти-флуда"
+)
+
+
+class UserBuckets:
+    """Состояние анти-флуда одного пользователя (три ведра токенов)."""
+
+    __slots__ = ("message", "callback", "request", "updated_at", "warned_at")
+
+    def __init__(self, now: float):
+        self.message = THROTTLE_MESSAGE_BURST
+        self.callback = THROTTLE_CALLBACK_BURST
+        self.request = THROTTLE_REQUEST_BURST
+        self.updated_at = now
+        self.warned_at = 0.0
+
+    def refill(self, now: float):
+        """Пополняет все вёдра за прошедшее время."""
+        elapsed = now - self.updated_at
+        if elapsed <= 0:
+            return
+        self.message = min(THROTTLE_MESSAGE_BURST, self.message + elapsed * THROTTLE_MESSAGE_RATE)
+        self.callback = min(THROTTLE_CALLBACK_BURST, self.callback + elapsed * THROTTLE_CALLBACK_RATE)
+        self.request = min(THROTTLE_REQUEST_BURST, self.request + elapsed * THROTTLE_REQUEST_RATE)
+        self.updated_at = now
+
+    def is_idle(self, now: float) -> bool:
+        """Все вёдра были бы полными - запись можно удалить без потери информации."""
+        self.refill(now)
+        return (
+            self.message >= THROTTLE_MESSAGE_BURST
+            and self.callback >= THROTTLE_CALLBACK_BURST
+            and self.request >= THROTTLE_REQUEST_BURST
+        )
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """
+    Outer-middleware для message и callback_query.
+
+    Регистрация:
+        throttling = ThrottlingMiddleware()
+        dp.message.outer_middleware(throttling)
+        dp.callback_query.outer_middleware(throttling)
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._users: dict[int, UserBuckets] = {}
+        self._last_sweep = time.monotonic()
+
+    def _sweep(self, now: float):
+        """Удаляет записи пользователей, у которых все вёдра уже полные."""
+        idle = [user_id for user_id, buckets in self._users.items() if buckets.is_idle(now)]
+        for user_id in idle:
+            del self._users[user_id]
+        self._last_sweep = now
+        throttle_users.set(len(self._users))
+        if idle:
+            logger.debug(f"🧹 Анти-флуд: удалено неактивных записей {len(idle)}")
+
+    async def __call__(self, handler, event, data):
+        user = data.get("event_from_user")
+        if user is None or is_admin(user.id):
+            return await handler(event, data)
+
+        now = time.monotonic()
+        if now - self._last_sweep > SWEEP_INTERVAL:
+            self._sweep(now)
+
+        buckets = self._users.get(user.id)
+        if buckets is None:
+            buckets = self._users[user.id] = UserBuckets(now)
+            throttle_users.set(len(self._users))
+        else:
+            buckets.refill(now)
+
+        if isinstance(event, types.CallbackQuery):
+            kind = "callback"
+            is_request = event.data == "request"
+        else:
+            kind = "message"
+            raw_state = data.get("raw_state")
+            is_request = raw_state is not None and raw_state.startswith("RequestStates")
+
+        if is_request and buckets.request < 1:
+            await self._reject(event, buckets, now, "request")
+            return None
+        if getattr(buckets, kind) < 1:
+            await self._reject(event, buckets, now, kind)
+            return None
+
+        setattr(buckets, kind, getattr(buckets, kind) - 1)
+        if is_request:
+            buckets.request -= 1
+
+        return await handler(event, data)
+
+    async def _reject(self, event, buckets: UserBuckets, now: float, kind: str):
+        """Отбрасывает апдейт и (не слишком часто) просит пользователя притормозить."""
+        throttled_total.inc(kind=kind)
+
+        try:
+            if isinstance(event, types.CallbackQuery):
+                # На callback всё равно нужно ответить - это дешёвый вызов
+                await event.answer(t("throttle.callback", user_locale(event.from_user)))
+            elif now - buckets.warned_at > WARN_INTERVAL:
+                buckets.warned_at = now
+                await event.answer(t("throttle.message", user_locale(event.from_user)))
+        except Exception as e:
+            logger.debug(f"Не удалось отправить предупреждение анти-флуда: {e}")
@@ -0,0 +1,20 @@
+"""
+Middleware учёта пользователей.
+
+Отмечает каждого пользователя, от которого пришёл апдейт (см. users.py).
+Стоимость на апдейт - поиск в множестве и запись в словарь, без обращения к БД.
+"""
+
+from aiogram import BaseMiddleware
+
+from users import touch_user
+
+
+class UserTrackingMiddleware(BaseMiddleware):
+    """Outer-middleware диспетчера (dp.update)."""
+
+    async def __call__(self, handler, event, data):
+        user = data.get("event_from_user")
+        if user is not None and not user.is_bot:
+            touch_user(user.id, user.username)
+        return await handler(event, data)
@@ -0,0 +1,264 @@
+"""
+Курсы юаня (CNY) для предварительного расчёта стоимости заявки.
+
+Провайдер курсов подключаемый (RATES_PROVIDER):
+- none - без курсов, расчёт не показывается (по умолчанию),
+- file - локальный JSON-файл вида {"RUB": 12.9, "KZT": 68.4}, удобно для тестов,
+- cbr  - курсы ЦБ РФ (cbr-xml-daily.ru), пересчитанные от юаня; единственный
+  провайдер с сетевыми запросами, включается только явно.
+
+Курсы хранятся в кэше процесса и обновляются фоновой задачей,
+поэтому заявка никогда не ждёт ответа провайдера: расчёт берётся из кэша мгновенно.
+Курсы старше RATES_MAX_AGE секунд (провайдер долго недоступен) не показываются.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from abc import ABC, abstractmethod
+from typing import Optional
+
+import aiohttp
+
+import metrics
+from config import RATES_PROVIDER, RATES_FILE, RATES_REFRESH_INTERVAL, RATES_MAX_AGE, QUOTE_CURRENCY
+from lifecycle import on_startup, on_shutdown
+
+logger = logging.getLogger(__name__)
+
+# Валюта клиента по language_code из Telegram (остальные - QUOTE_CURRENCY)
+CURRENCY_BY_LANGUAGE = {
+    "ru": "RUB",
+    "kk": "KZT",
+    "uk": "UAH",
+    "be": "BYN",
+    "uz": "UZS",
+    "en": "USD",
+}
+
+CURRENCY_SYMBOLS = {
+    "RUB": "₽",
+    "KZT": "₸",
+    "UAH": "₴",
+    "BYN": "Br",
+    "UZS": "сум",
+    "USD": "$",
+    "EUR": "€",
+}
+
+rates_refresh_total = metrics.counter(
+    "bot_rates_refresh_total", "Обновления курсов по результату"
+)
+rates_updated_at = metrics.gauge(
+    "bot_rates_last_refresh_timestamp", "Время последнего успешного обновления курсов (unix)"
+)
+
+
+# ============================================================================
+# ПРОВАЙДЕРЫ
+# ============================================================================
+
+class RateProvider(ABC):
+    """Источник курсов: сколько единиц валюты стоит 1 юань."""
+
+    name = "base"
+
+    @abstractmethod
+    async def fetch(self) -> dict[str, float]:
+        """
+        Получает курсы.
+
+        Returns:
+            Словарь код валюты -> цена 1 CNY в этой валюте
+        """
+
+
+class StaticRateProvider(RateProvider):
+    """Фиксированные курсы (для тестов и разработки)."""
+
+    name = "static"
+
+    def __init__(self, rates: dict[str, float]):
+        self.rates = dict(rates)
+
+    async def fetch(self) -> dict[str, float]:
+        return dict(self.rates)
+
+
+class FileRateProvider(RateProvider):
+    """Курсы из локального JSON-файла: {"RUB": 12.9, "KZT": 68.4}."""
+
+    name = "file"
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def _read(self) -> dict[str, float]:
+        with open(self.path, encoding="utf-8") as f:
+            return {code.upper(): float(value) for code, value in json.load(f).items()}
+
+    async def fetch(self) -> dict[str, float]:
+        return await asyncio.to_thread(self._read)
+
+
+class CbrRateProvider(RateProvider):
+    """Курсы ЦБ РФ. Все курсы даны к рублю, пересчитываем их от юаня."""
+
+    name = "cbr"
+    URL = "https://www.cbr-xml-daily.ru/daily_json.js"
+
+    async def fetch(self) -> dict[str, float]:
+        timeout = aiohttp.ClientTimeout(total=10)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            async with session.get(self.URL) as response:
+                response.raise_for_status()
+                payload = json.loads(await response.text())
+
+        # Цена 1 единицы каждой валюты в рублях
+        rub_per_unit = {
+            code: item["Value"] / item["Nominal"]
+            for code, item in payload["Valute"].items()
+        }
+        rub_per_unit["RUB"] = 1.0
+
+        rub_per_cny = rub_per_unit["CNY"]
+        return {
+            code: rub_per_cny / price
+            for code, price in rub_per_unit.items()
+            if code != "CNY"
+        }
+
+
+def create_provider(name: str) -> Optional[RateProvider]:
+    """
+    Создаёт провайдера по имени из конфигурации.
+
+    Returns:
+        Провайдер или None, если курсы отключены
+    """
+    if name == "cbr":
+        return CbrRateProvider()
+    if name == "file":
+        return FileRateProvider(RATES_FILE)
+    return None
+
+
+# ============================================================================
+# КЭШ
+# ============================================================================
+
+class Quote:
+    """Предварительный расчёт суммы в валюте клиента."""
+
+    __slots__ = ("amount", "currency", "rate", "fetched_at")
+
+    def __init__(self, amount: float, currency: str, rate: float, fetched_at: float):
+        self.amount = amount
+        self.currency = currency
+        self.rate = rate
+        self.fetched_at = fetched_at
+
+    @property
+    def amount_text(self) -> str:
+        """Сумма с символом валюты: «1 935 ₽»."""
+        symbol = CURRENCY_SYMBOLS.get(self.currency, self.currency)
+        return f"{self.amount:,.0f} {symbol}".replace(",", " ")
+
+    @property
+    def rate_text(self) -> str:
+        return f"{self.rate:.2f}"
+
+    def format(self) -> str:
+        """Например: «≈ 1 935 ₽ (курс 12.90)»."""
+        return f"≈ {self.amount_text} (курс {self.rate_text})"
+
+
+class RateCache:
+    """Кэш курсов с фоновым обновлением."""
+
+    def __init__(self, provider: Optional[RateProvider], refresh_interval: float, max_age: float = 0):
+        self.provider = provider
+        self.refresh_interval = refresh_interval
+        self.max_age = max_age
+        self.rates: dict[str, float] = {}
+        self.fetched_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    async def refresh(self) -> bool:
+        """
+        Загружает свежие курсы. При ошибке оставляет прежние.
+
+        Returns:
+            True если курсы обновлены
+        """
+        if self.provider is None:
+            return False
+
+        try:
+            rates = await self.provider.fetch()
+        except Exception as e:
+            rates_refresh_total.inc(result="error")
+            logger.warning(f"⚠️ Не удалось обновить курсы ({self.provider.name}): {e}")
+            return False
+
+        # Заменяем словарь целиком - читатели всегда видят согласованный набор
+        self.rates = rates
+        self.fetched_at = time.time()
+        rates_refresh_total.inc(result="ok")
+        rates_updated_at.set(self.fetched_at)
+        logger.info(f"💱 Курсы обновлены ({self.provider.name}): {len(rates)} валют")
+        return True
+
+    async def _refresh_loop(self):
+        while True:
+            await self.refresh()
+            await asyncio.sleep(self.refresh_interval)
+
+    def start(self):
+        """Запускает фоновое обновление (первая загрузка - сразу)."""
+        if self.provider is not None and self._task is None:
+            self._task = asyncio.create_task(self._refresh_loop())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def quote(self, amount_cny: float, currency: str) -> Optional[Quote]:
+        """
+        Мгновенный расчёт из кэша (без обращения к провайдеру).
+
+        Returns:
+            Quote или None, если курса нет или он старше max_age
+        """
+        rate = self.rates.get(currency)
+        if rate is None:
+            return None
+        if self.max_age > 0 and time.time() - self.fetched_at > self.max_age:
+            return None
+        return Quote(amount_cny * rate, currency, rate, self.fetched_at)
+
+
+def currency_for_language(language_code: Optional[str]) -> str:
+    """Валюта клиента по языку Telegram (ru-RU -> RUB)."""
+    if language_code:
+        currency = CURRENCY_BY_LANGUAGE.get(language_code.split("-")[0].lower())
+        if currency:
+            return currency
+    return QUOTE_CURRENCY
+
+
+# Кэш курсов процесса
+rate_cache = RateCache(create_provider(RATES_PROVIDER), RATES_REFRESH_INTERVAL, RATES_MAX_AGE)
+
+
+@on_startup("rates_refresh", required=False)
+async def _startup_rates(bot):
+    """Запускает фоновое обновление курсов (не ждём первую загрузку)."""
+    rate_cache.start()
+
+
+@on_shutdown("rates_refresh")
+async def _shutdown_rates(bot):
+    rate_cache.stop()
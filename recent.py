@@ -0,0 +1,153 @@
+"""
+Последние заявки в памяти.
+
+Кольцевой буфер (deque с maxlen) из RECENT_REQUESTS_SIZE последних заявок.
+Заполняется из базы при запуске, пополняется при каждой сохранённой
+заявке и обновляется при смене статуса, поэтому список "📋 Все заявки"
+в админке не обращается к базе.
+
+База остаётся источником истины: verify() сравнивает буфер с ней
+(команда /admin recent) - для отладки расхождений.
+"""
+
+import logging
+from collections import deque
+
+import database
+from config import RECENT_REQUESTS_SIZE
+from lifecycle import on_startup
+
+logger = logging.getLogger(__name__)
+
+
+class RecentRequest:
+    """Компактная запись заявки (поля как в database.get_request)."""
+
+    __slots__ = ("id", "user_id", "username", "amount", "link", "created_at", "status", "handled_by")
+
+    def __init__(self, id, user_id, username, amount, link, created_at, status, handled_by=None):
+        self.id = id
+        self.user_id = user_id
+        self.username = username
+        self.amount = amount
+        self.link = link
+        self.created_at = created_at
+        self.status = status
+        self.handled_by = handled_by
+
+    def as_row(self) -> tuple:
+        """Кортеж (id, user_id, username, amount, link, created_at, status, handled_by)."""
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+
+# Буфер: новые заявки справа, самые старые вытесняются слева
+_buffer: deque = deque(maxlen=RECENT_REQUESTS_SIZE)
+_loaded = False
+
+
+def reload() -> int:
+    """
+    Перечитывает последние заявки из базы и заменяет буфер.
+
+    Returns:
+        Количество заявок в буфере
+    """
+    global _buffer, _loaded
+
+    rows = database.get_all_requests(limit=RECENT_REQUESTS_SIZE)
+    _buffer = deque((RecentRequest(*row) for row in reversed(rows)), maxlen=RECENT_REQUESTS_SIZE)
+    _loaded = True
+
+    logger.info(f"✅ Последних заявок в памяти: {len(_buffer)}")
+    return len(_buffer)
+
+
+def _ensure_loaded():
+    """Заполняет буфер при первом обращении."""
+    if not _loaded:
+        reload()
+
+
+def add(request_id: int, user_id: int, username: str, amount: str, link: str, created_at: str,
+        status: str = database.STATUS_OPEN) -> RecentRequest:
+    """
+    Добавляет только что сохранённую заявку (вызывать после database.save_request).
+    created_at - значение из базы (его возвращает save_request), чтобы буфер
+    совпадал с базой (см. verify).
+
+    Returns:
+        Запись заявки в буфере
+    """
+    _ensure_loaded()
+    record = RecentRequest(request_id, user_id, username, amount, link, created_at, status)
+    _buffer.append(record)
+    return record
+
+
+def update(row) -> bool:
+    """
+    Обновляет статус заявки в буфере по строке из database.get_request.
+
+    Returns:
+        True если заявка есть в буфере
+    """
+    request_id, status, handled_by = row[0], row[6], row[7]
+    for record in _buffer:
+        if record.id == request_id:
+            record.status = status
+            record.handled_by = handled_by
+            return True
+    return False
+
+
+def latest(limit: int = 10) -> list[tuple]:
+    """
+    Последние заявки, новые первыми.
+
+    Returns:
+        Список кортежей как у database.get_all_requests
+    """
+    _ensure_loaded()
+    rows = []
+    for record in reversed(_buffer):
+        if len(rows) == limit:
+            break
+        rows.append(record.as_row())
+    return rows
+
+
+def verify() -> list[str]:
+    """
+    Сравнивает буфер с базой.
+
+    Returns:
+        Список расхождений (пустой, если буфер совпадает с базой)
+    """
+    _ensure_loaded()
+    cached = [record.as_row() for record in reversed(_buffer)]
+    actual = database.get_all_requests(limit=RECENT_REQUESTS_SIZE)
+
+    problems = []
+    if len(cached) != len(actual):
+        problems.append(f"в памяти {len(cached)} заявок, в базе {len(actual)}")
+
+    for mine, theirs in zip(cached, actual):
+        if mine[0] != theirs[0]:
+            problems.append(f"заявка #{mine[0]} в памяти, в базе на этом месте #{theirs[0]}")
+            break
+        fields = [
+            name for name, a, b in zip(RecentRequest.__slots__, mine, theirs)
+            if a != b
+        ]
+        if fields:
+            problems.append(f"заявка #{mine[0]}: отличаются {', '.join(fields)}")
+
+    if problems:
+        logger.warning(f"⚠️ Буфер последних заявок расходится с базой: {'; '.join(problems)}")
+    return problems
+
+
+@on_startup("recent_requests", after=("db_migrations",), required=False)
+def _startup_load_recent(bot):
+    """Заполняет буфер последних заявок при запуске."""
+    reload()
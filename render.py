@@ -0,0 +1,207 @@
+"""
+Сборка длинных сообщений с учётом лимита Telegram.
+
+Telegram принимает не больше 4096 символов в одном сообщении.
+Текст собирается из записей (entries), каждая запись измеряется один раз,
+а разбиение на сообщения происходит по границам записей (запись длиннее
+сообщения режется по строкам, см. ChunkedMessage._split_oversized).
+"""
+
+import html
+import re
+from typing import Optional
+
+# Максимальная длина текста одного сообщения Telegram
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+# Неделимые части HTML при разрезании: тег, сущность (&amp;) или один символ
+_HTML_ATOM = re.compile(r"<[^<>]*>|&#?\w+;|[\s\S]")
+_TAG_NAME = re.compile(r"<(/?)([A-Za-z][\w-]*)")
+
+
+def escape(value) -> str:
+    """
+    Экранирует пользовательское значение для parse_mode=HTML.
+
+    Args:
+        value: Любое значение (None превращается в пустую строку)
+
+    Returns:
+        Безопасная для HTML строка
+    """
+    if value is None:
+        return ""
+    return html.escape(str(value), quote=False)
+
+
+def _apply_tag(stack: list[tuple[str, str]], atom: str) -> list[tuple[str, str]]:
+    """Открытые теги после atom (новый список, если atom - тег)."""
+    match = _TAG_NAME.match(atom) if atom.startswith("<") else None
+    if match is None:
+        return stack
+    closing, name = match.groups()
+    name = name.lower()
+    if not closing:
+        return stack + [(name, atom)]
+    for position in range(len(stack) - 1, -1, -1):
+        if stack[position][0] == name:
+            return stack[:position] + stack[position + 1:]
+    return stack
+
+
+def _is_text(atom: str) -> bool:
+    """Видимый текст: не тег и не пробельный символ."""
+    return not atom.startswith("<") and not atom.isspace()
+
+
+def _closing(stack: list[tuple[str, str]]) -> str:
+    return "".join(f"</{name}>" for name, _ in reversed(stack))
+
+
+def _opening(stack: list[tuple[str, str]]) -> str:
+    return "".join(tag for _, tag in stack)
+
+
+class ChunkedMessage:
+    """
+    Построитель сообщений, который режет текст по границам записей.
+
+    Пример:
+        builder = ChunkedMessage(header="📋 <b>ЗАЯВКИ</b>\\n\\n")
+        for req in requests:
+            builder.add(format_request(req))
+        for text in builder.messages():
+            await message.answer(text)
+    """
+
+    def __init__(self, header: str = "", separator: str = "\n", limit: int = TELEGRAM_MESSAGE_LIMIT):
+        self.header = header
+        self.separator = separator
+        self.limit = limit
+        self._entries: list[str] = []
+
+    def add(self, entry: str):
+        """Добавляет готовую (уже экранированную) запись."""
+        self._entries.append(entry)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _split_oversized(self, entry: str, budget: int, first_budget: Optional[int] = None) -> list[str]:
+        """
+        Режет одну запись, которая сама по себе не влезает в сообщение.
+
+        Режет по границе строки, а если строка длиннее сообщения - между
+        символами, но никогда внутри тега или сущности (&amp;). Теги,
+        открытые на месте разреза, закрываются в конце части и заново
+        открываются в начале следующей.
+
+        Args:
+            entry: Запись (HTML)
+            budget: Максимальная длина части
+            first_budget: Длина первой части, если она меньше (перед ней заголовок)
+
+        Returns:
+            Части записи; первая пустая, если в first_budget не влез ни один символ
+        """
+        parts = []
+        current: list[str] = []
+        length = 0
+        stack: list[tuple[str, str]] = []   # Открытые теги: (имя, открывающий тег)
+        line_break = None                   # (индекс "\n" в current, открытые теги в этом месте)
+        has_content = False                 # В части уже есть видимый текст (не только теги и пробелы)
+        limit = first_budget if first_budget is not None else budget
+
+        atoms = _HTML_ATOM.findall(entry)
+        index = 0
+        while index < len(atoms):
+            atom = atoms[index]
+            new_stack = _apply_tag(stack, atom)
+
+            overflow = length + len(atom) + len(_closing(new_stack)) > limit
+            if overflow and not has_content:
+                if limit != budget:
+                    # Перед заголовком не влезает ни одного символа - запись начнётся со следующего сообщения
+                    parts.append("")
+                    limit = budget
+                    continue
+                # Пробелы до первого текста части не видны - не тратим на них место
+                if atom.isspace():
+                    index += 1
+                    continue
+                trimmed = [piece for piece in current if not piece.isspace()]
+                if len(trimmed) != len(current):
+                    current = trimmed
+                    length = sum(len(piece) for piece in current)
+                    continue
+
+            if overflow and has_content:
+                if line_break is not None:
+                    cut, open_tags = line_break
+                    parts.append("".join(current[:cut]) + _closing(open_tags))
+                    current = [_opening(open_tags)] + current[cut + 1:]
+                else:
+                    parts.append("".join(current) + _closing(stack))
+                    current = [_opening(stack)]
+                length = sum(len(piece) for piece in current)
+                has_content = any(_is_text(piece) for piece in current[1:])
+                line_break = None
+                limit = budget
+                continue
+
+            current.append(atom)
+            length += len(atom)
+            stack = new_stack
+            has_content = has_content or _is_text(atom)
+            if atom == "\n" and has_content:
+                line_break = (len(current) - 1, list(stack))
+            index += 1
+
+        if has_content:
+            parts.append("".join(current))
+
+        return parts
+
+    def messages(self) -> list[str]:
+        """
+        Собирает записи в минимальное количество сообщений.
+
+        Returns:
+            Список текстов, каждый не длиннее limit.
+            Заголовок ставится только в начало первого сообщения.
+        """
+        chunks: list[str] = []
+        parts: list[str] = [self.header] if self.header else []
+        length = len(self.header)
+        has_entry = False
+        sep_len = len(self.separator)
+
+        for entry in self._entries:
+            extra = len(entry) + (sep_len if has_entry else 0)
+
+            if length + extra <= self.limit:
+                if has_entry:
+                    parts.append(self.separator)
+                parts.append(entry)
+                length += extra
+                has_entry = True
+                continue
+
+            if not has_entry:
+                # В сообщении пока только заголовок: он идёт в начало первой части записи
+                pieces = self._split_oversized(entry, self.limit, first_budget=self.limit - length)
+                pieces[0] = "".join(parts) + pieces[0]
+            else:
+                # Запись не влезает - закрываем текущее сообщение
+                chunks.append("".join(parts))
+                pieces = self._split_oversized(entry, self.limit) if len(entry) > self.limit else [entry]
+
+            chunks.extend(pieces[:-1])
+            parts = [pieces[-1]]
+            length = len(pieces[-1])
+            has_entry = True
+
+        if parts:
+            chunks.append("".join(parts))
+
+        return chunks
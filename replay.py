@@ -0,0 +1,394 @@
+"""
+Запись и воспроизведение реальных апдейтов.
+
+Запись: если задан RECORD_DIR, каждый входящий апдейт пишется в сжатые
+JSONL-сегменты RECORD_DIR/updates-YYYYmmdd-HHMMSS.jsonl.gz (по
+RECORD_SEGMENT_UPDATES апдейтов в сегменте). ID пользователей и чатов
+заменяются псевдонимами (HMAC с солью RECORD_SALT), имена и username
+вырезаются. ID админов остаются как есть, чтобы при воспроизведении
+работала админ-панель. Текст сообщений сохраняется - он нужен для
+сценария заявки.
+
+Воспроизведение: запись прогоняется через полный диспетчер бота
+(все middleware и обработчики) с заглушкой вместо Bot API и с чистой
+временной базой, в исходном темпе или с максимальной скоростью. Файлы,
+которые пишут команды админов (резервные копии, архивы, отчёты), тоже
+уходят во временную папку (см. SANDBOX_PATHS):
+    python replay.py                          # все сегменты из RECORD_DIR, максимальная скорость
+    python replay.py --realtime --speed 2 recordings/updates-20250101-120000.jsonl.gz
+
+В конце печатается пропускная способность, задержки обработчиков
+(p50/p95/max) и число запросов к Bot API по методам.
+"""
+
+import argparse
+import asyncio
+import sys
+import glob
+import gzip
+import hashlib
+import hmac
+import json
+import logging
+import os
+import tempfile
+import time
+import typing
+from collections import Counter
+from datetime import datetime
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.types import Chat, ChatMemberMember, Message, MessageId, Update, User
+
+import config
+from config import RECORD_DIR, RECORD_SEGMENT_UPDATES, RECORD_SALT
+from lifecycle import on_shutdown
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_PREFIX = "updates-"
+SEGMENT_SUFFIX = ".jsonl.gz"
+
+# Объекты, в которых заменяется id (пользователь или чат)
+ANONYMIZED_OBJECTS = frozenset({
+    "from", "chat", "user", "sender_chat", "forward_from", "forward_from_chat",
+    "via_bot", "new_chat_member", "old_chat_member", "sender_user",
+})
+# Поля с личными данными: необязательные не записываются, обязательные заменяются
+PERSONAL_FIELDS = frozenset({"username", "last_name", "phone_number", "bio"})
+PLACEHOLDER_FIELDS = {"first_name": "user", "title": "chat"}
+
+# Пути из config, которые при воспроизведении переносятся во временную папку:
+# имя настройки -> имя файла или папки в ней
+SANDBOX_PATHS = {
+    "BACKUP_DIR": "backups",
+    "ARCHIVE_DIR": "archive",
+    "FSM_STATE_FILE": "fsm_state.json",
+    "BLOCKING_REPORT_FILE": "blocking_report.json",
+    "TRACE_FILE": "traces.jsonl",
+}
+# Модули, которые берут эти пути из config при импорте (в т.ч. как значения по умолчанию)
+SANDBOX_MODULES = ("database", "tracing", "backups", "archive", "diagnostics", "bot")
+
+# Активный рекордер (закрывается хуком остановки)
+_recorder: "UpdateRecorderMiddleware" = None
+# Папка песочницы воспроизведения (см. sandbox)
+_sandbox_dir: str = None
+
+
+# ============================================================================
+# ЗАПИСЬ
+# ============================================================================
+
+class UpdateRecorderMiddleware(BaseMiddleware):
+    """
+    Outer-middleware диспетчера (dp.update): пишет апдейты в сегменты.
+    Ставится первым, чтобы в запись попадали и апдейты, отброшенные анти-флудом.
+    """
+
+    def __init__(self, directory: str, segment_updates: int = RECORD_SEGMENT_UPDATES, salt: str = RECORD_SALT):
+        self.directory = directory
+        self.segment_updates = segment_updates
+        # Без соли - случайная на процесс: псевдонимы согласованы только внутри одного запуска
+        self._key = salt.encode("utf-8") if salt else os.urandom(16)
+        self._file = None
+        self._written = 0
+
+    @classmethod
+    def from_config(cls):
+        """Рекордер по RECORD_DIR или None, если запись выключена."""
+        global _recorder
+        if not RECORD_DIR:
+            return None
+        _recorder = cls(RECORD_DIR)
+        logger.info(f"🎙 Апдейты записываются в {RECORD_DIR}/")
+        return _recorder
+
+    def _pseudonym(self, value: int) -> int:
+        digest = hmac.new(self._key, str(abs(value)).encode(), hashlib.sha256).digest()
+        pseudonym = int.from_bytes(digest[:5], "big") + 1
+        return -pseudonym if value < 0 else pseudonym
+
+    def anonymize(self, payload, admin_ids: frozenset = frozenset()):
+        """Заменяет ID пользователей и чатов на псевдонимы, вырезает имена (рекурсивно)."""
+        if isinstance(payload, list):
+            return [self.anonymize(item, admin_ids) for item in payload]
+        if not isinstance(payload, dict):
+            return payload
+
+        result = {}
+        for key, value in payload.items():
+            if key in ANONYMIZED_OBJECTS and isinstance(value, dict):
+                value = {
+                    k: PLACEHOLDER_FIELDS.get(k, v) for k, v in value.items() if k not in PERSONAL_FIELDS
+                }
+                if isinstance(value.get("id"), int) and value["id"] not in admin_ids:
+                    value["id"] = self._pseudonym(value["id"])
+            result[key] = self.anonymize(value, admin_ids)
+        return result
+
+    def _open_segment(self):
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        path = os.path.join(self.directory, f"{SEGMENT_PREFIX}{stamp}{SEGMENT_SUFFIX}")
+        self._file = gzip.open(path, "wt", encoding="utf-8", compresslevel=6)
+        self._written = 0
+
+    def record(self, update: Update):
+        from admins import get_admins
+
+        payload = update.model_dump(mode="json", by_alias=True, exclude_none=True)
+        admin_ids = frozenset(user_id for user_id, _, _ in get_admins())
+        line = json.dumps({"t": time.time(), "update": self.anonymize(payload, admin_ids)}, ensure_ascii=False)
+
+        if self._file is None or self._written >= self.segment_updates:
+            self.close()
+            self._open_segment()
+        self._file.write(line + "\n")
+        self._written += 1
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    async def __call__(self, handler, event, data):
+        try:
+            self.record(event)
+        except Exception as e:
+            logger.debug(f"Не удалось записать апдейт: {e}")
+        return await handler(event, data)
+
+
+@on_shutdown("update_recorder")
+def _shutdown_recorder(bot):
+    """Дописывает и закрывает текущий сегмент."""
+    if _recorder is not None:
+        _recorder.close()
+
+
+# ============================================================================
+# ВОСПРОИЗВЕДЕНИЕ
+# ============================================================================
+
+class ReplaySession(BaseSession):
+    """Сессия-заглушка: запросы к Bot API не уходят в сеть, ответы правдоподобные."""
+
+    def __init__(self):
+        super().__init__()
+        self.calls = Counter()
+        self._message_id = 0
+
+    def _message(self, bot, method) -> Message:
+        self._message_id += 1
+        chat_id = getattr(method, "chat_id", None)
+        # Привязан к боту, как ответ настоящей сессии: обработчик может вызвать message.edit_text()
+        return Message(
+            message_id=self._message_id,
+            date=datetime.now(),
+            chat=Chat(id=chat_id if isinstance(chat_id, int) else 0, type="private"),
+            text=getattr(method, "text", None),
+        ).as_(bot)
+
+    async def make_request(self, bot, method, timeout=None):
+        name = method.__api_method__
+        self.calls[name] += 1
+
+        if name == "getMe":
+            return User(id=bot.id, is_bot=True, first_name="Replay", username="replay_bot")
+        if name == "getChatMember":
+            return ChatMemberMember(user=User(id=method.user_id, is_bot=False, first_name="user"))
+        if name == "copyMessage":
+            self._message_id += 1
+            return MessageId(message_id=self._message_id)
+
+        returning = method.__returning__
+        if returning is Message or Message in typing.get_args(returning):
+            return self._message(bot, method)
+        return True
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        raise NotImplementedError("При воспроизведении файлы не скачиваются")
+
+    async def close(self):
+        pass
+
+
+class HandlerTimingMiddleware(BaseMiddleware):
+    """Inner-middleware: время каждого обработчика по имени."""
+
+    def __init__(self):
+        self.timings: dict[str, list[float]] = {}
+
+    async def __call__(self, handler, event, data):
+        callback = getattr(data.get("handler"), "callback", None)
+        name = getattr(callback, "__qualname__", "unknown")
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            self.timings.setdefault(name, []).append(time.perf_counter() - started)
+
+
+def list_segments(directory: str = RECORD_DIR) -> list[str]:
+    """Сегменты записи, от старых к новым."""
+    return sorted(glob.glob(os.path.join(glob.escape(directory), f"{SEGMENT_PREFIX}*{SEGMENT_SUFFIX}")))
+
+
+def read_recording(paths: list[str]) -> list[tuple[float, dict]]:
+    """Читает апдейты из сегментов: [(время записи, апдейт)]."""
+    records = []
+    for path in paths:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    item = json.loads(line)
+                except ValueError:
+                    continue  # Оборванная последняя строка сегмента
+                records.append((item["t"], item["update"]))
+    records.sort(key=lambda record: record[0])
+    return records
+
+
+def _percentile(values: list[float], share: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * share))]
+
+
+def sandbox(directory: str, db_name: str = None):
+    """
+    Переносит базу и все файлы, которые пишет бот, в папку directory.
+
+    Вызывается до импорта модулей бота: они читают пути из config при импорте.
+    Иначе записанная /admin backup создала бы копию в рабочей BACKUP_DIR
+    и удалила бы старую при ротации.
+
+    Raises:
+        RuntimeError: модули бота уже импортированы
+    """
+    global _sandbox_dir
+
+    loaded = [name for name in SANDBOX_MODULES if name in sys.modules]
+    if loaded:
+        raise RuntimeError(f"Песочницу нужно включить до импорта модулей бота, уже загружены: {', '.join(loaded)}")
+
+    for name, filename in SANDBOX_PATHS.items():
+        # Пустое значение - файл выключен, так и оставляем
+        if getattr(config, name):
+            setattr(config, name, os.path.join(directory, filename))
+
+    import database
+    database.DB_NAME = db_name or os.path.join(directory, "replay.db")
+    _sandbox_dir = directory
+
+
+async def replay(records: list[tuple[float, dict]], realtime: bool = False, speed: float = 1.0) -> dict:
+    """
+    Прогоняет апдейты через полный диспетчер бота.
+    Перед этим нужно включить песочницу (sandbox), иначе RuntimeError.
+
+    Args:
+        records: Апдейты из read_recording
+        realtime: Соблюдать интервалы между апдейтами (иначе - максимальная скорость)
+        speed: Ускорение исходного темпа (для realtime)
+
+    Returns:
+        dict: updates, errors, seconds, timings (обработчик -> список секунд), calls (метод -> число)
+    """
+    if _sandbox_dir is None:
+        raise RuntimeError("Воспроизведение без песочницы тронуло бы рабочие файлы: вызовите sandbox()")
+
+    import database
+    from bot import create_dispatcher
+    from aiogram.fsm.storage.memory import MemoryStorage
+
+    database.init_database()
+
+    session = ReplaySession()
+    bot = Bot(token="123456:replay", session=session)
+    dp = create_dispatcher(MemoryStorage(), record=False)
+    timing = HandlerTimingMiddleware()
+    dp.message.middleware(timing)
+    dp.callback_query.middleware(timing)
+
+    errors = 0
+
+    async def feed(payload: dict):
+        nonlocal errors
+        try:
+            await dp.feed_update(bot, Update.model_validate(payload, context={"bot": bot}))
+        except Exception as e:
+            errors += 1
+            # Первую ошибку показываем целиком, остальные - только в отладочном логе
+            log = logger.warning if errors == 1 else logger.debug
+            log(f"⚠️ Апдейт {payload.get('update_id')} завершился ошибкой: {e}", exc_info=errors == 1)
+
+    tasks = []
+    started = time.perf_counter()
+    first_at = records[0][0] if records else 0.0
+
+    for recorded_at, payload in records:
+        if realtime:
+            delay = (recorded_at - first_at) / speed - (time.perf_counter() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(feed(payload)))
+
+    await asyncio.gather(*tasks)
+    return {
+        "updates": len(records),
+        "errors": errors,
+        "seconds": time.perf_counter() - started,
+        "timings": timing.timings,
+        "calls": session.calls,
+    }
+
+
+def print_report(report: dict):
+    seconds = report["seconds"]
+    print(f"\nАпдейтов: {report['updates']} за {seconds:.2f} с "
+          f"({report['updates'] / seconds if seconds else 0:.1f} апд/с), ошибок: {report['errors']}\n")
+
+    print(f"{'Обработчик':<45} {'вызовов':>8} {'p50, мс':>9} {'p95, мс':>9} {'max, мс':>9}")
+    timings = sorted(report["timings"].items(), key=lambda item: -sum(item[1]))
+    for name, values in timings:
+        print(f"{name:<45} {len(values):>8} {_percentile(values, 0.5) * 1000:>9.2f} "
+              f"{_percentile(values, 0.95) * 1000:>9.2f} {max(values) * 1000:>9.2f}")
+
+    print("\nЗапросы к Bot API:")
+    for name, count in report["calls"].most_common():
+        print(f"  {name:<30} {count:>8}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Воспроизведение записанных апдейтов")
+    parser.add_argument("files", nargs="*", help="Сегменты записи (по умолчанию все из RECORD_DIR)")
+    parser.add_argument("--realtime", action="store_true", help="Соблюдать исходные интервалы между апдейтами")
+    parser.add_argument("--speed", type=float, default=1.0, help="Ускорение исходного темпа (с --realtime)")
+    parser.add_argument("--db", help="Файл временной базы (по умолчанию - новый во временной папке)")
+    args = parser.parse_args(argv)
+
+    paths = args.files or (list_segments(RECORD_DIR) if RECORD_DIR else [])
+    if not paths:
+        parser.error("нет сегментов записи (аргумент или RECORD_DIR)")
+
+    scratch = tempfile.TemporaryDirectory(prefix="replay-")
+    # Временная база и файлы: запись не должна трогать рабочие
+    sandbox(scratch.name, args.db)
+    import database
+
+    records = read_recording(paths)
+    print(f"Сегментов: {len(paths)}, апдейтов: {len(records)}, база: {database.DB_NAME}")
+
+    import bot  # noqa: F401 - настраивает логирование при импорте, дальше приглушаем
+    logging.getLogger().setLevel(logging.WARNING)
+    try:
+        report = asyncio.run(replay(records, realtime=args.realtime, speed=args.speed))
+    finally:
+        scratch.cleanup()
+    print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""
+Настройки, которые меняются без перезапуска бота.
+
+MANAGER_ID, MANAGER_USERNAME, REQUIRED_CHANNEL, REQUIRED_CHANNEL_ID и
+SUBSCRIPTION_CACHE_TTL читаются из файла SETTINGS_FILE (по умолчанию .env)
+в типизированный снимок Settings. Обработчики берут текущий снимок:
+
+    manager_id = settings.current().manager_id
+
+Файл перечитывается, когда меняется его mtime (проверка каждые
+SETTINGS_RELOAD_INTERVAL секунд), по сигналу SIGHUP и командой
+/admin settings. Новый снимок сначала проверяется целиком и только потом
+заменяет текущий (одно присваивание) - с ошибкой в файле бот продолжает
+работать на прежних настройках. Незавершённые диалоги (FSM) не теряются.
+
+Модули с кэшами, зависящими от настроек (подписки, тексты меню),
+подписываются через @on_change и сбрасывают их при замене снимка.
+
+Порядок источников одинаковый при запуске и при перечитывании, как у
+load_dotenv: переменная окружения процесса важнее файла. Настройка,
+заданная в окружении (например, в docker-compose), меняется только
+перезапуском; без перезапуска меняются значения из файла.
+"""
+
+import asyncio
+import logging
+import os
+import re
+import signal
+from typing import Optional
+
+from dotenv import dotenv_values
+
+import metrics
+from config import PROCESS_ENV, SETTINGS_FILE, SETTINGS_RELOAD_INTERVAL
+from lifecycle import on_startup, on_shutdown
+
+logger = logging.getLogger(__name__)
+
+USERNAME_PATTERN = re.compile(r"[A-Za-z0-9_]{4,32}")
+CHANNEL_PATTERN = re.compile(r"@[A-Za-z0-9_]{4,32}")
+CHAT_ID_PATTERN = re.compile(r"-?\d+")
+
+reloads_total = metrics.counter(
+    "bot_settings_reloads_total", "Перечитывания настроек: применены (ok), без изменений (unchanged), ошибка (error)"
+)
+
+
+class Settings:
+    """Снимок перезагружаемых настроек (не изменяется после создания)."""
+
+    __slots__ = ("manager_id", "manager_username", "required_channel", "required_channel_id",
+                 "subscription_cache_ttl")
+
+    def __init__(self, manager_id: Optional[int], manager_username: str, required_channel: str,
+                 required_channel_id: str, subscription_cache_ttl: int):
+        self.manager_id = manager_id
+        self.manager_username = manager_username
+        self.required_channel = required_channel
+        self.required_channel_id = required_channel_id
+        self.subscription_cache_ttl = subscription_cache_ttl
+
+    @classmethod
+    def from_values(cls, values) -> "Settings":
+        """
+        Собирает и проверяет снимок из словаря переменных (как в .env).
+
+        Raises:
+            ValueError: хотя бы одно значение неверное (в тексте - все ошибки)
+        """
+        errors = []
+
+        manager_id = (values.get("MANAGER_ID") or "").strip()
+        if manager_id and not CHAT_ID_PATTERN.fullmatch(manager_id):
+            errors.append(f"MANAGER_ID должен быть числом, а не {manager_id!r}")
+
+        manager_username = (values.get("MANAGER_USERNAME") or "BuffinItMNG").strip().lstrip("@")
+        if not USERNAME_PATTERN.fullmatch(manager_username):
+            errors.append(f"MANAGER_USERNAME - username без @, а не {manager_username!r}")
+
+        required_channel = (values.get("REQUIRED_CHANNEL") or "@BuffinIt").strip()
+        if not CHANNEL_PATTERN.fullmatch(required_channel):
+            errors.append(f"REQUIRED_CHANNEL должен быть вида @channel, а не {required_channel!r}")
+
+        required_channel_id = (values.get("REQUIRED_CHANNEL_ID") or "@BuffinIt").strip()
+        if not (CHANNEL_PATTERN.fullmatch(required_channel_id) or CHAT_ID_PATTERN.fullmatch(required_channel_id)):
+            errors.append(f"REQUIRED_CHANNEL_ID должен быть @channel или числом, а не {required_channel_id!r}")
+
+        ttl = (values.get("SUBSCRIPTION_CACHE_TTL") or "300").strip()
+        if not ttl.isdigit():
+            errors.append(f"SUBSCRIPTION_CACHE_TTL должен быть целым числом >= 0, а не {ttl!r}")
+
+        if errors:
+            raise ValueError("; ".join(errors))
+
+        return cls(
+            manager_id=int(manager_id) if manager_id else None,
+            manager_username=manager_username,
+            required_channel=required_channel,
+            required_channel_id=required_channel_id,
+            subscription_cache_ttl=int(ttl),
+        )
+
+    def as_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def changed(self, other: "Settings") -> list[str]:
+        """Имена настроек, которые отличаются в other."""
+        return [name for name in self.__slots__ if getattr(self, name) != getattr(other, name)]
+
+
+def _stat(path: str) -> Optional[tuple]:
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _read_values(path: str) -> dict:
+    """Переменные для снимка: файл, поверх него - окружение процесса (как у load_dotenv)."""
+    values = dotenv_values(path) if os.path.exists(path) else {}
+    return {**values, **PROCESS_ENV}
+
+
+# Текущий снимок заменяется целиком, поэтому читатели всегда видят согласованные значения
+_file_state: tuple = _stat(SETTINGS_FILE)
+_current: Settings = Settings.from_values(_read_values(SETTINGS_FILE))
+_subscribers = []
+_task: asyncio.Task = None
+
+
+def current() -> Settings:
+    """Текущий снимок настроек."""
+    return _current
+
+
+def on_change(func):
+    """
+    Подписывает функцию func(old, new) на замену снимка настроек.
+    Вызывается синхронно сразу после замены.
+    """
+    _subscribers.append(func)
+    return func
+
+
+def reload(path: str = SETTINGS_FILE) -> list[str]:
+    """
+    Перечитывает файл настроек и, если значения верны, заменяет снимок.
+
+    Args:
+        path: Файл в формате .env
+
+    Returns:
+        Имена изменившихся настроек (пустой список, если ничего не поменялось)
+
+    Raises:
+        ValueError: в файле неверные значения (снимок не заменён)
+    """
+    global _current, _file_state
+
+    _file_state = _stat(path)
+
+    try:
+        new = Settings.from_values(_read_values(path))
+    except ValueError:
+        reloads_total.inc(result="error")
+        raise
+
+    old = _current
+    changed = old.changed(new)
+    if not changed:
+        reloads_total.inc(result="unchanged")
+        return []
+
+    _current = new
+    reloads_total.inc(result="ok")
+    logger.info(f"🔄 Настройки обновлены: {', '.join(changed)}")
+
+    for func in _subscribers:
+        try:
+            func(old, new)
+        except Exception as e:
+            logger.error(f"❌ Ошибка обработчика смены настроек {func.__qualname__}: {e}", exc_info=True)
+    return changed
+
+
+def _reload_logged(reason: str):
+    """Перечитывает настройки; ошибка в файле попадает только в лог."""
+    try:
+        reload()
+    except ValueError as e:
+        logger.error(f"❌ Настройки не применены ({reason}), работаем на прежних: {e}")
+
+
+async def _watch_file(interval: float):
+    """Перечитывает файл, когда меняется его mtime или размер."""
+    while True:
+        await asyncio.sleep(interval)
+        if _stat(SETTINGS_FILE) != _file_state:
+            _reload_logged("файл изменён")
+
+
+# ============================================================================
+# ХУКИ ЗАПУСКА И ОСТАНОВКИ
+# ============================================================================
+
+@on_startup("settings_reload", required=False)
+async def _startup_settings(bot):
+    """Запоминает состояние файла, подписывается на SIGHUP и запускает проверку mtime."""
+    global _file_state, _task
+    _file_state = _stat(SETTINGS_FILE)
+
+    if hasattr(signal, "SIGHUP"):
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, _reload_logged, "SIGHUP")
+        except (NotImplementedError, RuntimeError) as e:
+            logger.warning(f"⚠️ SIGHUP для перечитывания настроек недоступен: {e}")
+
+    if SETTINGS_RELOAD_INTERVAL > 0:
+        _task = asyncio.create_task(_watch_file(SETTINGS_RELOAD_INTERVAL))
+
+
+@on_shutdown("settings_reload")
+async def _shutdown_settings(bot):
+    if _task is not None:
+        _task.cancel()
+    if hasattr(signal, "SIGHUP"):
+        asyncio.get_running_loop().remove_signal_handler(signal.SIGHUP)
@@ -0,0 +1,231 @@
+"""
+Хранилище состояний FSM.
+
+Работает как MemoryStorage, но умеет сохранять незавершённые диалоги
+в JSON-файл при остановке и восстанавливать их при запуске,
+чтобы рестарт бота не сбрасывал заявки на середине.
+
+Брошенные диалоги не живут вечно: у каждой группы состояний свой срок (TTL),
+фоновая задача удаляет просроченные записи и, если нужно, напоминает
+пользователю, что черновик заявки сброшен.
+"""
+
+import asyncio
+import copy
+import json
+import logging
+import os
+import time
+from dataclasses import asdict
+from typing import Any, Optional
+
+from aiogram import Bot
+from aiogram.fsm.storage.base import StorageKey, StateType
+from aiogram.fsm.storage.memory import MemoryStorage, MemoryStorageRecord
+
+import metrics
+from config import FSM_TTL, FSM_REQUEST_TTL, FSM_SWEEP_INTERVAL, FSM_EXPIRED_NUDGE
+
+logger = logging.getLogger(__name__)
+
+# Срок жизни диалога по группе состояний (часть до ":" в "RequestStates:waiting_for_link")
+STATE_TTLS = {
+    "RequestStates": FSM_REQUEST_TTL,
+}
+
+# Тексты напоминаний о сброшенном диалоге по группе состояний (ключи texts.py)
+EXPIRED_NUDGES = {
+    "RequestStates": "request.draft_expired",
+}
+
+fsm_entries = metrics.gauge(
+    "bot_fsm_entries", "Записи FSM в памяти по состоянию (none - только данные)"
+)
+fsm_expired_total = metrics.counter(
+    "bot_fsm_expired_total", "Диалоги, удалённые по истечении срока"
+)
+
+
+def state_group(state: Optional[str]) -> Optional[str]:
+    """Группа состояния: "RequestStates:waiting_for_link" -> "RequestStates"."""
+    return state.split(":", 1)[0] if state else None
+
+
+class PersistentMemoryStorage(MemoryStorage):
+    """
+    MemoryStorage с сохранением в файл (dump/load) и удалением
+    просроченных диалогов (sweep / start_sweeper).
+    """
+
+    def __init__(self, path: str, default_ttl: float = FSM_TTL, state_ttls: dict = None):
+        super().__init__()
+        self.path = path
+        self.default_ttl = default_ttl
+        self.state_ttls = STATE_TTLS if state_ttls is None else state_ttls
+        # Время последнего изменения записи (time.time(), чтобы переживать рестарт)
+        self.updated_at: dict[StorageKey, float] = {}
+        self._sweeper: Optional[asyncio.Task] = None
+
+    # Чтение не создаёт пустых записей (MemoryStorage заводит их на каждый get_state)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        record = self.storage.get(key)
+        return record.state if record is not None else None
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        record = self.storage.get(key)
+        return record.data.copy() if record is not None else {}
+
+    async def get_value(self, storage_key: StorageKey, dict_key: str, default: Any = None) -> Any:
+        record = self.storage.get(storage_key)
+        if record is None:
+            return default
+        return copy.copy(record.data.get(dict_key, default))
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        await super().set_state(key, state)
+        self._touch(key)
+
+    async def set_data(self, key: StorageKey, data) -> None:
+        await super().set_data(key, data)
+        self._touch(key)
+
+    def _touch(self, key: StorageKey):
+        record = self.storage[key]
+        if record.state is None and not record.data:
+            # Диалог завершён - запись не нужна
+            del self.storage[key]
+            self.updated_at.pop(key, None)
+        else:
+            self.updated_at[key] = time.time()
+
+    def ttl_for(self, state: Optional[str]) -> float:
+        """Срок жизни записи в этом состоянии (секунды, 0 - бессрочно)."""
+        return self.state_ttls.get(state_group(state), self.default_ttl)
+
+    # ========================================================================
+    # УДАЛЕНИЕ ПРОСРОЧЕННЫХ ДИАЛОГОВ
+    # ========================================================================
+
+    def sweep(self, now: float = None) -> list[tuple[StorageKey, MemoryStorageRecord]]:
+        """
+        Удаляет просроченные и пустые записи и обновляет gauge по состояниям.
+
+        Args:
+            now: Текущее время (time.time()), для тестов
+
+        Returns:
+            Удалённые просроченные записи [(ключ, запись)]
+        """
+        now = time.time() if now is None else now
+        expired = []
+        counts: dict[str, int] = {}
+
+        for key, record in list(self.storage.items()):
+            if record.state is None and not record.data:
+                del self.storage[key]
+                self.updated_at.pop(key, None)
+                continue
+
+            ttl = self.ttl_for(record.state)
+            if ttl > 0 and now - self.updated_at.get(key, now) > ttl:
+                del self.storage[key]
+                self.updated_at.pop(key, None)
+                expired.append((key, record))
+                fsm_expired_total.inc(state=record.state or "none")
+                continue
+
+            label = record.state or "none"
+            counts[label] = counts.get(label, 0) + 1
+
+        # Состояния, которых больше нет, пропадают из метрики
+        fsm_entries.clear()
+        for label, count in counts.items():
+            fsm_entries.set(count, state=label)
+
+        if expired:
+            logger.info(f"🧹 Удалено просроченных диалогов FSM: {len(expired)}")
+        return expired
+
+    async def _nudge(self, bot: Bot, key: StorageKey, record: MemoryStorageRecord):
+        """Сообщает пользователю, что его черновик сброшен."""
+        from texts import t, locale_for
+
+        text_key = EXPIRED_NUDGES.get(state_group(record.state))
+        if text_key is None:
+            return
+
+        try:
+            await bot.send_message(key.chat_id, t(text_key, locale_for(record.data.get("locale"))))
+        except Exception as e:
+            logger.debug(f"Не удалось напомнить {key.chat_id} о сброшенном диалоге: {e}")
+
+    async def _sweep_loop(self, bot: Bot, nudge: bool):
+        while True:
+            await asyncio.sleep(FSM_SWEEP_INTERVAL)
+            try:
+                for key, record in self.sweep():
+                    if nudge:
+                        await self._nudge(bot, key, record)
+            except Exception as e:
+                logger.error(f"❌ Ошибка очистки FSM: {e}", exc_info=True)
+
+    def start_sweeper(self, bot: Bot, nudge: bool = FSM_EXPIRED_NUDGE):
+        """Запускает периодическую очистку просроченных диалогов."""
+        self.sweep()
+        if self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._sweep_loop(bot, nudge))
+
+    def stop_sweeper(self):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            self._sweeper = None
+
+    def dump(self) -> int:
+        """
+        Сохраняет непустые записи в файл (атомарно, через временный файл).
+
+        Returns:
+            Количество сохранённых записей
+        """
+        records = [
+            {"key": asdict(key), "state": record.state, "data": record.data,
+             "updated_at": self.updated_at.get(key)}
+            for key, record in self.storage.items()
+            if record.state is not None or record.data
+        ]
+
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(records, f, ensure_ascii=False, default=str)
+        os.replace(tmp_path, self.path)
+
+        logger.info(f"💾 Сохранено состояний FSM: {len(records)} → {self.path}")
+        return len(records)
+
+    def load(self) -> int:
+        """
+        Восстанавливает записи из файла, если он есть.
+
+        Returns:
+            Количество восстановленных записей
+        """
+        if not os.path.exists(self.path):
+            return 0
+
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                records = json.load(f)
+        except Exception as e:
+            logger.error(f"❌ Не удалось прочитать {self.path}: {e}", exc_info=True)
+            return 0
+
+        now = time.time()
+        for item in records:
+            key = StorageKey(**item["key"])
+            self.storage[key] = MemoryStorageRecord(data=item["data"], state=item["state"])
+            # Старые файлы без времени: срок отсчитываем с момента запуска
+            self.updated_at[key] = item.get("updated_at") or now
+
+        logger.info(f"♻️ Восстановлено состояний FSM: {len(records)} из {self.path}")
+        return len(records)
@@ -0,0 +1,208 @@
+"""
+Каталог текстов бота на нескольких языках.
+
+Тексты лежат в locales/<язык>.json (ключ -> строка или список строк),
+загружаются и разбираются один раз при запуске. Вывод текста - поиск
+готового шаблона в словаре и подстановка параметров.
+
+Пример:
+    t("request.created", locale, amount=amount, link=link)
+
+Все параметры экранируются для parse_mode=HTML автоматически.
+Готовый HTML (например, другой отрендеренный текст) передаётся через Raw.
+Язык пользователя берётся из language_code Telegram (см. locale_for).
+"""
+
+import json
+import logging
+import os
+from string import Formatter
+from typing import Optional
+
+import settings
+from config import LOCALES_DIR, DEFAULT_LOCALE
+from lifecycle import on_startup
+from render import escape
+
+logger = logging.getLogger(__name__)
+
+
+def _global_params(snapshot: settings.Settings) -> dict:
+    return {
+        "manager": snapshot.manager_username,
+        "channel": snapshot.required_channel,
+    }
+
+
+# Параметры, доступные во всех шаблонах (заменяются при смене настроек)
+GLOBAL_PARAMS = _global_params(settings.current())
+
+
+class Raw(str):
+    """Строка с готовым HTML: при подстановке в шаблон не экранируется."""
+
+    __slots__ = ()
+
+
+class Template:
+    """
+    Разобранный шаблон: чередование литералов и имён параметров.
+    Шаблон без параметров хранит готовую строку.
+    """
+
+    __slots__ = ("key", "parts", "fields", "static")
+
+    def __init__(self, key: str, source: str):
+        self.key = key
+        self.parts: list[tuple[str, Optional[str]]] = []
+
+        for literal, field, spec, conversion in Formatter().parse(source):
+            if field is not None and (not field.isidentifier() or spec or conversion):
+                raise ValueError(f"{key}: поддерживаются только простые параметры, а не {{{field}}}")
+            self.parts.append((literal, field))
+
+        self.fields = frozenset(field for _, field in self.parts if field is not None)
+        self.static = None if self.fields else "".join(literal for literal, _ in self.parts)
+
+    def render(self, params: dict) -> str:
+        if self.static is not None:
+            return self.static
+
+        chunks = []
+        for literal, field in self.parts:
+            chunks.append(literal)
+            if field is not None:
+                value = params[field]
+                chunks.append(value if isinstance(value, Raw) else escape(value))
+        return "".join(chunks)
+
+
+# Каталог: язык -> ключ -> шаблон. Заменяется целиком при загрузке.
+_catalog: dict[str, dict[str, Template]] = {}
+
+
+def _read_locale(path: str) -> dict[str, Template]:
+    """Читает и разбирает один файл локали."""
+    with open(path, encoding="utf-8") as f:
+        raw = json.load(f)
+
+    return {
+        key: Template(key, "\n".join(value) if isinstance(value, list) else value)
+        for key, value in raw.items()
+    }
+
+
+def load_catalog(directory: str = LOCALES_DIR) -> int:
+    """
+    Загружает все локали из каталога и атомарно заменяет текущий каталог.
+
+    Недостающие в локали ключи берутся из языка по умолчанию, поэтому при
+    выводе текста нет цепочки запасных вариантов - только один поиск.
+
+    Args:
+        directory: Папка с файлами <язык>.json
+
+    Returns:
+        Количество загруженных локалей
+    """
+    global _catalog
+
+    locales = {}
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(".json"):
+            locales[name[:-5]] = _read_locale(os.path.join(directory, name))
+
+    if DEFAULT_LOCALE not in locales:
+        raise RuntimeError(f"Нет файла локали по умолчанию: {directory}/{DEFAULT_LOCALE}.json")
+
+    default = locales[DEFAULT_LOCALE]
+    for locale, templates in locales.items():
+        if locale == DEFAULT_LOCALE:
+            continue
+
+        for key, template in templates.items():
+            if key not in default:
+                logger.warning(f"⚠️ Локаль {locale}: лишний ключ {key}")
+            elif not template.fields <= default[key].fields:
+                raise RuntimeError(f"Локаль {locale}: в {key} неизвестные параметры "
+                                   f"{sorted(template.fields - default[key].fields)}")
+
+        missing = default.keys() - templates.keys()
+        if missing:
+            logger.warning(f"⚠️ Локаль {locale}: нет {len(missing)} ключей, будут на {DEFAULT_LOCALE}")
+        locales[locale] = {**default, **templates}
+
+    _catalog = locales
+    logger.info(f"✅ Загружены тексты: {', '.join(locales)} ({len(default)} ключей)")
+    return len(locales)
+
+
+def _ensure_loaded():
+    """Загружает каталог при первом обращении."""
+    if not _catalog:
+        load_catalog()
+
+
+def locale_for(language_code: Optional[str]) -> str:
+    """
+    Выбирает локаль по language_code пользователя Telegram.
+
+    Args:
+        language_code: Например "ru", "en-US" или None
+
+    Returns:
+        Код поддерживаемой локали (иначе язык по умолчанию)
+    """
+    _ensure_loaded()
+    if language_code:
+        locale = language_code.split("-")[0].lower()
+        if locale in _catalog:
+            return locale
+    return DEFAULT_LOCALE
+
+
+def user_locale(user: Optional[object]) -> str:
+    """Локаль пользователя aiogram (types.User) или язык по умолчанию."""
+    return locale_for(getattr(user, "language_code", None))
+
+
+def t(key: str, locale: str = DEFAULT_LOCALE, **params) -> str:
+    """
+    Возвращает текст на языке пользователя.
+
+    Args:
+        key: Ключ текста, например "menu.main"
+        locale: Код локали (см. locale_for)
+        **params: Значения параметров шаблона (экранируются, кроме Raw)
+
+    Returns:
+        Готовый HTML-текст
+    """
+    _ensure_loaded()
+    templates = _catalog.get(locale) or _catalog[DEFAULT_LOCALE]
+    template = templates.get(key)
+    if template is None:
+        logger.error(f"❌ Нет текста {key} ({locale})")
+        return key
+
+    if template.static is not None:
+        return template.static
+
+    try:
+        return template.render({**GLOBAL_PARAMS, **params})
+    except KeyError as e:
+        logger.error(f"❌ Не передан параметр {e} для текста {key}")
+        return key
+
+
+@settings.on_change
+def _settings_changed(old, new):
+    """Менеджер и канал в текстах меню - из нового снимка настроек."""
+    global GLOBAL_PARAMS
+    GLOBAL_PARAMS = _global_params(new)
+
+
+@on_startup("texts_catalog")
+def _startup_load_catalog(bot):
+    """Загружает тексты при запуске, чтобы ошибка в файлах остановила бота сразу."""
+    load_catalog()
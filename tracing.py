@@ -0,0 +1,329 @@
+"""
+Лёгкая трассировка апдейтов.
+
+На каждый апдейт создаётся корневой спан, внутри - спаны обработчика,
+каждого вызова database.py и каждого запроса к Bot API. Спаны выбранных
+(TRACE_SAMPLE_RATE) трасс пишутся в локальный JSONL-файл с ротацией,
+по одному спану на строку, с полями в духе OTLP (traceId, spanId,
+parentSpanId, startTimeUnixNano, ...). ID трассы попадает в каждую
+запись лога (%(trace_id)s), поэтому по логам легко найти трассу и наоборот.
+
+Самые медленные трассы:
+    python tracing.py                      # 10 самых медленных из TRACE_FILE
+    python tracing.py -n 20 --name update.message traces.jsonl
+"""
+
+import argparse
+import functools
+import glob
+import inspect
+import json
+import logging
+import os
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from logging.handlers import RotatingFileHandler
+from typing import Optional
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+
+from config import TRACE_FILE, TRACE_SAMPLE_RATE, TRACE_FILE_MAX_BYTES, TRACE_FILE_BACKUPS
+
+logger = logging.getLogger(__name__)
+
+# Текущий спан задачи (contextvars переживают await и asyncio.to_thread)
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+# Логгер-экспортёр: отдельный файл, в общий лог не попадает
+_exporter = logging.getLogger("tracing.export")
+_exporter.propagate = False
+
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+
+class Span:
+    """Один спан трассы."""
+
+    __slots__ = ("trace_id", "span_id", "parent_span_id", "name", "kind",
+                 "start_ns", "end_ns", "attributes", "status", "sampled", "spans")
+
+    def __init__(self, name: str, parent: Optional["Span"], kind: int, attributes: dict):
+        self.name = name
+        self.kind = kind
+        self.span_id = os.urandom(8).hex()
+        self.attributes = attributes
+        self.status = STATUS_OK
+        self.end_ns = None
+
+        if parent is None:
+            # Корневой спан: решаем, записывать ли трассу целиком
+            self.trace_id = os.urandom(16).hex()
+            self.parent_span_id = ""
+            self.sampled = bool(_exporter.handlers) and random.random() < TRACE_SAMPLE_RATE
+            self.spans = [] if self.sampled else None
+        else:
+            self.trace_id = parent.trace_id
+            self.parent_span_id = parent.span_id
+            self.sampled = parent.sampled
+            # Все спаны трассы собираются в списке корня и пишутся вместе
+            self.spans = parent.spans
+
+        self.start_ns = time.time_ns()
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def finish(self, error: BaseException = None):
+        self.end_ns = time.time_ns()
+        if error is not None:
+            self.status = STATUS_ERROR
+            self.attributes["exception.type"] = type(error).__name__
+            self.attributes["exception.message"] = str(error)[:300]
+
+        if self.sampled:
+            self.spans.append(self)
+            if not self.parent_span_id:
+                _export(self.spans)
+
+    def to_dict(self) -> dict:
+        """Представление спана в полях OTLP/JSON."""
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": self.end_ns,
+            "attributes": [
+                {"key": key, "value": _otlp_value(value)} for key, value in self.attributes.items()
+            ],
+            "status": {"code": self.status},
+        }
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _export(spans: list):
+    """Пишет завершённую трассу в файл (по спану на строку)."""
+    try:
+        for item in spans:
+            _exporter.info(json.dumps(item.to_dict(), ensure_ascii=False))
+    except Exception as e:
+        logger.debug(f"Не удалось записать трассу: {e}")
+
+
+@contextmanager
+def span(name: str, kind: int = SPAN_KIND_INTERNAL, **attributes):
+    """
+    Контекстный менеджер спана (работает и в sync, и в async коде).
+
+    Пример:
+        with span("notify.admins", admins=len(admins)):
+            ...
+    """
+    parent = _current_span.get()
+    if parent is not None and (not parent.sampled or parent.end_ns is not None):
+        # Трасса не записывается или уже завершена и выгружена (фоновая задача,
+        # запущенная из обработчика): дочерние спаны не создаём
+        yield parent
+        return
+
+    current = Span(name, parent, kind, attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.finish(e)
+        raise
+    else:
+        current.finish()
+    finally:
+        _current_span.reset(token)
+
+
+def traced(name: str = None):
+    """
+    Декоратор: оборачивает каждый вызов функции в спан.
+    Вне трассы (нет корневого спана) функция вызывается как есть.
+
+    Args:
+        name: Имя спана (по умолчанию - модуль.функция)
+    """
+    def decorator(func):
+        span_name = name or f"{func.__module__}.{func.__name__}"
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if _current_span.get() is None:
+                    return await func(*args, **kwargs)
+                with span(span_name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current_span.get() is None:
+                return func(*args, **kwargs)
+            with span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+def current_trace_id() -> str:
+    """ID текущей трассы или "-"."""
+    current = _current_span.get()
+    return current.trace_id if current is not None else "-"
+
+
+# ============================================================================
+# MIDDLEWARE
+# ============================================================================
+
+class UpdateTracingMiddleware(BaseMiddleware):
+    """Outer-middleware диспетчера (dp.update): корневой спан апдейта."""
+
+    async def __call__(self, handler, event, data):
+        user = data.get("event_from_user")
+        with span(
+            f"update.{event.event_type}", SPAN_KIND_SERVER,
+            **{"update.id": event.update_id, "user.id": user.id if user else 0}
+        ):
+            return await handler(event, data)
+
+
+class HandlerTracingMiddleware(BaseMiddleware):
+    """Inner-middleware (dp.message, dp.callback_query): спан вокруг обработчика."""
+
+    async def __call__(self, handler, event, data):
+        handler_object = data.get("handler")
+        callback = getattr(handler_object, "callback", None)
+        name = getattr(callback, "__qualname__", "unknown")
+        with span(f"handler.{getattr(callback, '__module__', '')}.{name}"):
+            return await handler(event, data)
+
+
+class ApiTracingMiddleware(BaseRequestMiddleware):
+    """Middleware сессии бота: спан на каждый запрос к Bot API (вместе с повторами)."""
+
+    async def __call__(self, make_request, bot, method):
+        name = method.__api_method__
+        if name == "getUpdates" or _current_span.get() is None:
+            return await make_request(bot, method)
+        with span(f"api.{name}", SPAN_KIND_CLIENT):
+            return await make_request(bot, method)
+
+
+# ============================================================================
+# НАСТРОЙКА
+# ============================================================================
+
+def setup_tracing():
+    """
+    Подключает ID трассы к записям лога и, если задан TRACE_FILE,
+    экспорт спанов в файл с ротацией.
+    """
+    factory = logging.getLogRecordFactory()
+
+    def record_factory(*args, **kwargs):
+        record = factory(*args, **kwargs)
+        record.trace_id = current_trace_id()
+        return record
+
+    logging.setLogRecordFactory(record_factory)
+
+    if TRACE_FILE and not _exporter.handlers:
+        handler = RotatingFileHandler(
+            TRACE_FILE, maxBytes=TRACE_FILE_MAX_BYTES, backupCount=TRACE_FILE_BACKUPS, encoding="utf-8"
+        )
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        _exporter.addHandler(handler)
+        _exporter.setLevel(logging.INFO)
+        logger.info(f"🔭 Трассы пишутся в {TRACE_FILE} (доля {TRACE_SAMPLE_RATE:g})")
+
+
+# ============================================================================
+# CLI: САМЫЕ МЕДЛЕННЫЕ ТРАССЫ
+# ============================================================================
+
+def _read_spans(path: str) -> dict[str, list[dict]]:
+    """Читает спаны из файла и его ротированных копий, группирует по трассам."""
+    traces: dict[str, list[dict]] = {}
+    for file_path in sorted(glob.glob(glob.escape(path) + "*")):
+        with open(file_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    item = json.loads(line)
+                except ValueError:
+                    continue
+                traces.setdefault(item["traceId"], []).append(item)
+    return traces
+
+
+def _duration_ms(item: dict) -> float:
+    return (item["endTimeUnixNano"] - item["startTimeUnixNano"]) / 1e6
+
+
+def _print_tree(spans: list[dict]):
+    children: dict[str, list[dict]] = {}
+    for item in spans:
+        children.setdefault(item["parentSpanId"], []).append(item)
+
+    def walk(parent_id: str, depth: int):
+        for item in sorted(children.get(parent_id, []), key=lambda s: s["startTimeUnixNano"]):
+            error = " ❌" if item["status"]["code"] == STATUS_ERROR else ""
+            print(f"    {'  ' * depth}{_duration_ms(item):9.1f} мс  {item['name']}{error}")
+            walk(item["spanId"], depth + 1)
+
+    walk("", 0)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Самые медленные трассы бота")
+    parser.add_argument("file", nargs="?", default=TRACE_FILE, help="JSONL-файл трасс")
+    parser.add_argument("-n", "--limit", type=int, default=10, help="Сколько трасс показать")
+    parser.add_argument("--name", help="Только трассы с таким корневым спаном (например update.message)")
+    args = parser.parse_args(argv)
+
+    if not args.file:
+        parser.error("не задан файл трасс (аргумент или TRACE_FILE)")
+
+    roots = []
+    traces = _read_spans(args.file)
+    for spans in traces.values():
+        root = next((item for item in spans if not item["parentSpanId"]), None)
+        if root is not None and (args.name is None or root["name"] == args.name):
+            roots.append((root, spans))
+
+    roots.sort(key=lambda pair: -_duration_ms(pair[0]))
+    print(f"Трасс в файле: {len(traces)}, показано самых медленных: {min(args.limit, len(roots))}\n")
+
+    for root, spans in roots[:args.limit]:
+        attributes = {attr["key"]: next(iter(attr["value"].values())) for attr in root["attributes"]}
+        print(f"{_duration_ms(root):.1f} мс  trace {root['traceId']}  "
+              f"user {attributes.get('user.id', '-')}  update {attributes.get('update.id', '-')}")
+        _print_tree(spans)
+        print()
+
+
+if __name__ == "__main__":
+    main()
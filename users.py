@@ -0,0 +1,169 @@
+"""
+Учёт пользователей бота.
+
+Каждый апдейт отмечает пользователя в памяти (поиск в множестве и запись в словарь),
+а в таблицу users изменения уходят пачкой раз в USERS_FLUSH_INTERVAL секунд
+и при остановке бота. Так клики не превращаются в запись в БД на каждое нажатие.
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime
+
+import database
+import metrics
+from config import USERS_FLUSH_INTERVAL
+from lifecycle import on_startup, on_shutdown
+
+logger = logging.getLogger(__name__)
+
+# Пользователи, которые уже есть в БД или ждут записи
+_seen: set[int] = set()
+
+# Ожидающие записи изменения: user_id -> [username, время (time.time()), subscribed]
+_pending: dict[int, list] = {}
+
+_flush_task: asyncio.Task = None
+
+new_users_total = metrics.counter("bot_new_users_total", "Новые пользователи бота")
+users_flushed_total = metrics.counter("bot_users_flushed_total", "Записи пользователей, сброшенные в БД")
+
+
+def touch_user(user_id: int, username: str, subscribed: bool = None):
+    """
+    Отмечает активность пользователя (без обращения к БД).
+
+    Args:
+        user_id: ID пользователя Telegram
+        username: Username (может быть None)
+        subscribed: Результат проверки подписки (None - не менять)
+    """
+    entry = _pending.get(user_id)
+    if entry is None:
+        _pending[user_id] = [username, time.time(), subscribed]
+    else:
+        entry[0] = username
+        entry[1] = time.time()
+        if subscribed is not None:
+            entry[2] = subscribed
+
+    if user_id not in _seen:
+        _seen.add(user_id)
+        new_users_total.inc()
+
+
+def _take_pending() -> dict[int, list]:
+    """
+    Забирает накопленные изменения целиком: новые клики попадут уже в новый словарь.
+    Вызывается в потоке event loop, поэтому гонки с touch_user нет.
+    """
+    global _pending
+    pending, _pending = _pending, {}
+    return pending
+
+
+def _restore_pending(pending: dict[int, list]):
+    """
+    Возвращает незаписанные изменения в очередь (запись в БД не удалась).
+    Более новые записи, пришедшие за время сброса, важнее; из старой
+    берётся только известный статус подписки. Забытые пользователи не возвращаются.
+    """
+    for user_id, entry in pending.items():
+        if user_id not in _seen:
+            continue
+        newer = _pending.get(user_id)
+        if newer is None:
+            _pending[user_id] = entry
+        elif newer[2] is None:
+            newer[2] = entry[2]
+
+
+def _rows(pending: dict[int, list]) -> list[tuple]:
+    """Строки для database.upsert_users."""
+    return [
+        (
+            user_id,
+            username,
+            datetime.fromtimestamp(seen_at).strftime("%Y-%m-%d %H:%M:%S"),
+            None if subscribed is None else int(subscribed),
+        )
+        for user_id, (username, seen_at, subscribed) in pending.items()
+    ]
+
+
+async def flush_users() -> int:
+    """
+    Сбрасывает накопленные изменения в таблицу users одной транзакцией.
+    Запись в SQLite выполняется в отдельном потоке. Если запись не удалась,
+    изменения возвращаются в очередь до следующего сброса.
+
+    Returns:
+        Количество записанных пользователей
+    """
+    pending = _take_pending()
+    if not pending:
+        return 0
+
+    try:
+        written = await asyncio.to_thread(database.upsert_users, _rows(pending))
+    except BaseException:
+        _restore_pending(pending)
+        raise
+    if not written:
+        _restore_pending(pending)
+        logger.warning(f"⚠️ Пользователи не сохранены ({len(pending)}), повторим при следующем сбросе")
+        return 0
+
+    users_flushed_total.inc(written)
+    logger.debug(f"💾 Сохранено пользователей: {written}")
+    return written
+
+
+def forget_users(user_ids):
+    """
+    Забывает пользователей, удалённых из БД (например, заблокировавших бота).
+
+    Args:
+        user_ids: Список ID пользователей
+    """
+    for user_id in user_ids:
+        _seen.discard(user_id)
+        _pending.pop(user_id, None)
+
+
+async def _flush_loop():
+    """Фоновый сброс изменений в БД."""
+    while True:
+        await asyncio.sleep(USERS_FLUSH_INTERVAL)
+        try:
+            await flush_users()
+        except Exception as e:
+            logger.error(f"❌ Ошибка сброса пользователей: {e}", exc_info=True)
+
+
+# ============================================================================
+# ХУКИ ЗАПУСКА И ОСТАНОВКИ
+# ============================================================================
+
+@on_startup("users_seen", after=("db_migrations",), required=False)
+def _startup_load_seen(bot):
+    """Загружает множество известных пользователей."""
+    _seen.update(database.get_user_ids())
+    logger.info(f"✅ Известных пользователей: {len(_seen)}")
+
+
+@on_startup("users_flush_task")
+async def _startup_flush_task(bot):
+    """Запускает фоновый сброс last_seen."""
+    global _flush_task
+    _flush_task = asyncio.create_task(_flush_loop())
+
+
+@on_shutdown("users_flush")
+async def _shutdown_flush(bot):
+    """Останавливает фоновую задачу и сбрасывает последние изменения."""
+    if _flush_task is not None:
+        _flush_task.cancel()
+    written = await flush_users()
+    logger.info(f"💾 При остановке сохранено пользователей: {written}")
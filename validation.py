@@ -0,0 +1,162 @@
+"""
+Проверка данных заявки: ссылки на товар BUFF и суммы в юанях.
+
+Шаблоны компилируются один раз при импорте. Проверка выполняется
+до любых запросов к базе и Telegram: неверный ввод сразу возвращает
+пользователю подсказку, и он остаётся на том же шаге заявки.
+
+Причины отказов считаются в метрике bot_request_rejected_total
+(field: link/amount, reason: см. REASON_*).
+"""
+
+import re
+from typing import Optional
+
+import metrics
+from config import AMOUNT_MIN, AMOUNT_MAX
+
+# Причины отказа
+REASON_EMPTY = "empty"          # Не текст (стикер, фото) или пустое сообщение
+REASON_FORMAT = "format"        # Текст не похож на ссылку / сумму
+REASON_TOO_SMALL = "too_small"  # Сумма меньше AMOUNT_MIN
+REASON_TOO_LARGE = "too_large"  # Сумма больше AMOUNT_MAX
+
+# Страница товара BUFF: buff.163.com/goods/42542 (в т.ч. мобильная /m/goods/...),
+# с параметрами и якорем (?from=market#tab=selling). В хвосте - только символы URL
+# (RFC 3986): без <, > и кавычек, которые ломают HTML уведомлений
+LINK_PATTERN = re.compile(
+    r"(?:https?://)?(?:www\.)?buff\.163\.com/(?:m/)?(?:market/)?goods/(\d+)"
+    r"(?:[/?#][A-Za-z0-9\-._~%!$&'()*+,;=:@/?#]*)?",
+    re.IGNORECASE,
+)
+
+# Сумма: «150», «1 299,50», «1299.5 ¥»
+AMOUNT_PATTERN = re.compile(r"(\d{1,3}(?:[ \u00a0]\d{3})+|\d+)(?:[.,](\d{1,2}))?\s*(?:¥|cny|юаней)?", re.IGNORECASE)
+
+rejected_total = metrics.counter(
+    "bot_request_rejected_total", "Отклонённый ввод в заявке по полю и причине"
+)
+
+
+def _reject(field: str, reason: str):
+    rejected_total.inc(field=field, reason=reason)
+    return None, reason
+
+
+def validate_link(text: Optional[str]) -> tuple[Optional[str], Optional[str]]:
+    """
+    Проверяет ссылку на товар BUFF.
+
+    Args:
+        text: Текст сообщения (None для стикеров, фото и т.п.)
+
+    Returns:
+        (ссылка, None) если ссылка верная, иначе (None, причина)
+    """
+    if not text or not text.strip():
+        return _reject("link", REASON_EMPTY)
+
+    link = text.strip()
+    if LINK_PATTERN.fullmatch(link) is None:
+        return _reject("link", REASON_FORMAT)
+    return link, None
+
+
+def parse_amount(text: Optional[str]) -> Optional[float]:
+    """
+    Читает сумму в юанях («150», «1 299,50», «1299.5 ¥») без проверки границ.
+    Общий разбор для validate_amount и статистики (analytics), чтобы они
+    одинаково понимали сохранённые суммы.
+
+    Returns:
+        Сумма или None, если текст не похож на сумму
+    """
+    match = AMOUNT_PATTERN.fullmatch(str(text).strip()) if text is not None else None
+    if match is None:
+        return None
+    whole, fraction = match.groups()
+    return float(re.sub(r"\D", "", whole) + "." + (fraction or "0"))
+
+
+def validate_amount(text: Optional[str]) -> tuple[Optional[float], Optional[str]]:
+    """
+    Проверяет сумму в юанях и её границы (AMOUNT_MIN..AMOUNT_MAX).
+
+    Args:
+        text: Текст сообщения
+
+    Returns:
+        (сумма, None) если сумма верная, иначе (None, причина)
+    """
+    if not text or not text.strip():
+        return _reject("amount", REASON_EMPTY)
+
+    amount = parse_amount(text)
+    if amount is None:
+        return _reject("amount", REASON_FORMAT)
+
+    if amount < AMOUNT_MIN:
+        return _reject("amount", REASON_TOO_SMALL)
+    if amount > AMOUNT_MAX:
+        return _reject("amount", REASON_TOO_LARGE)
+    return amount, None
+
+
+def parse_cart_text(text: Optional[str], pending_link: str = None):
+    """
+    Разбирает товары корзины из сообщения.
+
+    Каждая строка - «ссылка сумма» или только ссылка (тогда сумма - в следующей
+    строке или в следующем сообщении, см. pending_link). Если сумма неверная,
+    ошибка указывает на строку со ссылкой, а ссылка остаётся ждать сумму.
+
+    Args:
+        text: Текст сообщения
+        pending_link: Ссылка без суммы из предыдущего сообщения
+
+    Returns:
+        (товары [(ссылка, сумма текстом, сумма)], ошибки [(номер строки, поле, причина)],
+         ссылка, которая ждёт сумму, или None). Номер строки 0 - ссылка из
+         предыдущего сообщения
+    """
+    items, errors = [], []
+    if not text or not text.strip():
+        _reject("link", REASON_EMPTY)
+        return items, [(0, "link", REASON_EMPTY)], pending_link
+
+    link_line = 0           # Строка, где стоит ждущая сумму ссылка
+    reported = None         # Ошибка суммы этой ссылки (пропадает, если сумма придёт позже)
+
+    for number, line in enumerate(text.splitlines(), start=1):
+        line = line.strip()
+        if not line:
+            continue
+
+        head, _, rest = line.partition(" ")
+        if LINK_PATTERN.fullmatch(head):
+            if pending_link is not None and reported is None:
+                errors.append((link_line, "amount", REASON_EMPTY))
+            pending_link, link_line, reported = head, number, None
+            if not rest.strip():
+                continue
+            amount_text = rest.strip()
+        elif pending_link is not None:
+            amount_text = line
+        else:
+            _reject("link", REASON_FORMAT)
+            errors.append((number, "link", REASON_FORMAT))
+            continue
+
+        amount, reason = validate_amount(amount_text)
+        if amount is None:
+            # Ссылку не теряем: ошибка - у её строки, сумму можно прислать заново
+            if reported is None:
+                reported = (link_line, "amount", reason)
+                errors.append(reported)
+            continue
+        if reported is not None:
+            errors.remove(reported)
+        items.append((pending_link, amount_text, amount))
+        pending_link, reported = None, None
+
+    return items, errors, pending_link